@@ -0,0 +1,42 @@
+"""
+Module contains Connection Scan Algorithm (CSA) implementation over the structured connection array.
+"""
+from Algorithms.CSA.csa_functions import *
+
+
+def array_csa(SOURCE: int, DESTINATION: int, D_TIME: int, connection_array, WALKING_FROM_SOURCE: int, footpath_dict: dict, PRINT_ITINERARY: int,
+              stop_count: int = None) -> tuple:
+    """
+    CSA over a connection array (see csa_functions.build_connection_array). Scan starts at the first connection departing at or after
+    D_TIME (binary search) and labels are kept in lists indexed by stop id and integer trip id. Connections are read in chunks of
+    SCAN_CHUNK, so only the part of the array scanned before target pruning is converted to python objects.
+
+    Args:
+        SOURCE (int): stop id of source stop.
+        DESTINATION (int): stop id of destination stop.
+        D_TIME (int): departure time in seconds since the service day.
+        connection_array (numpy.ndarray): structured array with dtype CONNECTION_DTYPE sorted by dep_time.
+        WALKING_FROM_SOURCE (int): 1 or 0. 1 indicates walking from SOURCE is allowed.
+        footpath_dict (dict): preprocessed dict with integer durations. Format {from_stop_id: [(to_stop_id, footpath_time)]}.
+        PRINT_ITINERARY (int): 1 or 0. 1 means print complete path.
+        stop_count (int): 1 + largest stop id. Computed from connection_array and footpath_dict if None.
+
+    Returns:
+        output (tuple): tuple containing the best arrival time.
+
+    Examples:
+        >>> output = array_csa(36, 52, 23400, connection_array, 1, footpath_dict, 1)
+        >>> print(f"Optimal arrival time is: {output}")
+
+    See Also:
+        std_csa
+    """
+    if stop_count is None:
+        stop_count = get_stop_count(connection_array, footpath_dict, SOURCE, DESTINATION)
+    stop_label, pi_label, trip_reached, first = initialize_array_csa(SOURCE, D_TIME, connection_array, WALKING_FROM_SOURCE, footpath_dict, stop_count)
+    pruned = scan_connection_array(connection_array, first, stop_label, pi_label, trip_reached, footpath_dict, [DESTINATION])
+    if pruned and PRINT_ITINERARY == 1:
+        print("Terminated due to time-based target pruning")
+    connections = connection_rows(connection_array, pi_label) if PRINT_ITINERARY == 1 else {}
+    output = post_process_csa(SOURCE, DESTINATION, pi_label, PRINT_ITINERARY, connections, stop_label, INF_SECONDS)
+    return output
@@ -1,8 +1,16 @@
 import pickle
 from collections import defaultdict
 
+import numpy as np
 import pandas as pd
 
+from gtfs_loader import INF_SECONDS, get_time_constants, format_clock, duration_seconds
+
+# Row of the connection array (see build_connection_array). Times are seconds since the service day, trip is the integer trip id
+# (see gtfs_loader.build_trip_offsets). Rows are sorted by dep_time, so the row number is the connection id.
+CONNECTION_DTYPE = np.dtype([("dep_time", np.int32), ("arr_time", np.int32), ("from_stop", np.int32), ("to_stop", np.int32), ("trip", np.int32)])
+SCAN_CHUNK = 4096  # connections converted to python lists at a time while scanning the connection array
+
 
 def initialize_csa(SOURCE: int, WALKING_FROM_SOURCE: int, footpath_dict: dict, D_TIME) -> tuple:
     """
@@ -12,7 +20,7 @@ def initialize_csa(SOURCE: int, WALKING_FROM_SOURCE: int, footpath_dict: dict, D
         SOURCE (int): stop id of source stop.
         WALKING_FROM_SOURCE (int): 1 or 0. 1 indicates walking from SOURCE is allowed.
         footpath_dict (dict): preprocessed dict. Format {from_stop_id: [(to_stop_id, footpath_time)]}.
-        D_TIME (pandas.datetime): departure time.
+        D_TIME (pandas.datetime or int): departure time. int means seconds since the service day (see gtfs_loader.load_stoptimes_array).
 
     Returns:
         stop_label(dict): dict to maintain best arrival label {stop id: pandas.datetime}.
@@ -22,7 +30,7 @@ def initialize_csa(SOURCE: int, WALKING_FROM_SOURCE: int, footpath_dict: dict, D
         inf_time (pandas.datetime): Variable indicating infinite time.
 
     """
-    inf_time = pd.to_datetime("today").round(freq='H') + pd.to_timedelta("365 day")
+    inf_time, _ = get_time_constants(D_TIME)
 
     stop_label = defaultdict(lambda: inf_time)
     trip_set = defaultdict(lambda: False)
@@ -57,6 +65,144 @@ def load_connections_dict(NETWORK_NAME: str) -> list:
     return connections_list
 
 
+def build_connection_array(connections_list: list, trip_offsets: tuple, service_day):
+    """
+    Converts the connection list (see load_CSA) to a structured numpy array with dtype CONNECTION_DTYPE.
+
+    Args:
+        connections_list (list): list of connections sorted by departure time. Format: [[connection id, from stop, to stop, from time, to time, trip id]].
+        trip_offsets (tuple): integer trip numbering. See gtfs_loader.build_trip_offsets.
+        service_day (pandas.datetime): midnight of the service day. See gtfs_loader.load_stoptimes_array.
+
+    Returns:
+        connection_array (numpy.ndarray): structured array with dtype CONNECTION_DTYPE.
+
+    Examples:
+        >>> connection_array = build_connection_array(load_CSA('anaheim'), trip_offsets, service_day)
+    """
+    route_first_trip = trip_offsets[0]
+    connection_array = np.empty(len(connections_list), dtype=CONNECTION_DTYPE)
+    for idx, (_, from_stop, to_stop, from_time, to_time, tid) in enumerate(connections_list):
+        route, trip_idx = tid.split("_")
+        connection_array[idx] = (int((from_time - service_day).total_seconds()), int((to_time - service_day).total_seconds()), from_stop, to_stop,
+                                 route_first_trip[int(route)] + int(trip_idx))
+    return connection_array
+
+
+def get_stop_count(connection_array, footpath_dict: dict, *stops) -> int:
+    """
+    Returns the size of label arrays (1 + largest stop id) needed by array based CSA. Stop ids of footpath_dict may be float (pickled
+    footpaths), so the result is cast to int.
+
+    Args:
+        connection_array (numpy.ndarray): structured array with dtype CONNECTION_DTYPE.
+        footpath_dict (dict): preprocessed dict. Format {from_stop_id: [(to_stop_id, footpath_time)]}.
+        stops (int): additional stop ids (e.g., SOURCE, DESTINATION).
+
+    Returns:
+        stop_count (int)
+    """
+    largest = max(stops, default=0)
+    if len(connection_array):
+        largest = max(largest, int(connection_array["from_stop"].max()), int(connection_array["to_stop"].max()))
+    for from_stop, footpaths in footpath_dict.items():
+        largest = max(largest, from_stop, *[to_stop for to_stop, _ in footpaths])
+    return int(largest) + 1
+
+
+def scan_connection_array(connection_array, first: int, stop_label: list, pi_label: list, trip_reached: bytearray, footpath_dict: dict,
+                          targets: list) -> bool:
+    """
+    Main scan of array based CSA. Connections are scanned from index first in chunks of SCAN_CHUNK. Scan stops when the departure
+    time of a connection is later than the labels of all target stops (time-based target pruning).
+
+    Args:
+        connection_array (numpy.ndarray): structured array with dtype CONNECTION_DTYPE sorted by dep_time.
+        first (int): index of first connection to scan.
+        stop_label (list): best arrival time of every stop. Updated in place.
+        pi_label (list): labels used for backtracking. Updated in place. label is ("walking", from stop, to_stop, footpath duration)
+            or ('connection', connection id).
+        trip_reached (bytearray): 1 if trip (integer trip id) has been reached. Updated in place.
+        footpath_dict (dict): preprocessed dict with integer stop ids and durations (see gtfs_loader.build_int_footpath_dict).
+            Format {from_stop_id: [(to_stop_id, footpath_time)]}.
+        targets (list): stop ids used for pruning. Empty list means all connections are scanned (one-to-all).
+
+    Returns:
+        pruned (bool): True if the scan was stopped by target pruning.
+    """
+    bound = max([stop_label[stop] for stop in targets]) if targets else float("inf")
+    for chunk_start in range(first, len(connection_array), SCAN_CHUNK):
+        chunk = connection_array[chunk_start: chunk_start + SCAN_CHUNK]
+        for idx, departure_time, arrival_time, departure_stop, arrival_stop, tid in zip(range(chunk_start, chunk_start + len(chunk)),
+                                                                                          chunk["dep_time"].tolist(), chunk["arr_time"].tolist(),
+                                                                                          chunk["from_stop"].tolist(), chunk["to_stop"].tolist(),
+                                                                                          chunk["trip"].tolist()):
+            if departure_time > bound:
+                # bound is only lowered lazily, so recompute it before pruning
+                bound = max([stop_label[stop] for stop in targets])
+                if departure_time > bound:
+                    return True
+            if trip_reached[tid] or stop_label[departure_stop] <= departure_time:
+                trip_reached[tid] = 1
+                if stop_label[arrival_stop] > arrival_time:
+                    stop_label[arrival_stop] = arrival_time
+                    pi_label[arrival_stop] = ('connection', idx)
+                    for footpath_stop, duration in footpath_dict.get(arrival_stop, []):
+                        if stop_label[footpath_stop] > arrival_time + duration:
+                            stop_label[footpath_stop] = arrival_time + duration
+                            pi_label[footpath_stop] = ("walking", arrival_stop, footpath_stop, duration)
+    return False
+
+
+def initialize_array_csa(SOURCE: int, D_TIME: int, connection_array, WALKING_FROM_SOURCE: int, footpath_dict: dict, stop_count: int) -> tuple:
+    """
+    Initialize values for array based CSA.
+
+    Args:
+        SOURCE (int): stop id of source stop.
+        D_TIME (int): departure time in seconds since the service day.
+        connection_array (numpy.ndarray): structured array with dtype CONNECTION_DTYPE sorted by dep_time.
+        WALKING_FROM_SOURCE (int): 1 or 0. 1 indicates walking from SOURCE is allowed.
+        footpath_dict (dict): preprocessed dict with integer durations. Format {from_stop_id: [(to_stop_id, footpath_time)]}.
+        stop_count (int): 1 + largest stop id. See get_stop_count.
+
+    Returns:
+        stop_label (list): best arrival time of every stop.
+        pi_label (list): labels used for backtracking.
+        trip_reached (bytearray): 1 if trip has been reached.
+        first (int): index of first connection departing at or after D_TIME.
+    """
+    stop_label = [INF_SECONDS] * stop_count
+    pi_label = [-1] * stop_count
+    trip_reached = bytearray(int(connection_array["trip"].max()) + 1 if len(connection_array) else 0)
+    stop_label[SOURCE] = D_TIME
+    if WALKING_FROM_SOURCE == 1:
+        for to_stop, duration in footpath_dict.get(SOURCE, []):
+            stop_label[int(to_stop)] = D_TIME + duration
+            pi_label[int(to_stop)] = ("walking", SOURCE, int(to_stop), duration)
+    first = int(np.searchsorted(connection_array["dep_time"], D_TIME, side="left"))
+    return stop_label, pi_label, trip_reached, first
+
+
+def connection_rows(connection_array, pi_label) -> dict:
+    """
+    Collects the connections used by the labels of pi_label in the format of connections_list (used by post_process_csa).
+
+    Args:
+        connection_array (numpy.ndarray): structured array with dtype CONNECTION_DTYPE.
+        pi_label (list): labels used for backtracking. See array_csa.
+
+    Returns:
+        connections (dict): Format {connection id: [connection id, from stop, to stop, from time, to time, trip id]}
+    """
+    connections = {}
+    for label in pi_label:
+        if label != -1 and label[0] == 'connection':
+            dep_time, arr_time, from_stop, to_stop, trip = connection_array[label[1]].tolist()
+            connections[label[1]] = [label[1], from_stop, to_stop, dep_time, arr_time, trip]
+    return connections
+
+
 def post_process_csa(SOURCE: int, DESTINATION: int, pi_label: dict, PRINT_ITINERARY: int, connections_list: list, stop_label: dict, inf_time) -> tuple:
     """
     Post processing functions for CSA. Currently supported functionality are
@@ -117,7 +263,7 @@ def _print_Journey_legs_csv(journey: list)-> None:
     """
     for leg in journey:
         if len(leg) == 5:
-            print(f"from {leg[0]} board at {leg[2].time()} and get down on {leg[1]} at {leg[3].time()} along {leg[4]}")
+            print(f"from {leg[0]} board at {format_clock(leg[2])} and get down on {leg[1]} at {format_clock(leg[3])} along {leg[4]}")
         else:
-            print(f"from {leg[0]} walk till {leg[1]} for {leg[2].total_seconds()} seconds")
+            print(f"from {leg[0]} walk till {leg[1]} for {duration_seconds(leg[2])} seconds")
     return None
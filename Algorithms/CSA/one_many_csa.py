@@ -0,0 +1,41 @@
+"""
+Module contains One-To-Many and One-To-All Connection Scan Algorithm (CSA) implementation.
+"""
+from Algorithms.CSA.csa_functions import *
+
+
+def onetomany_csa(SOURCE: int, DESTINATION_LIST: list, D_TIME: int, connection_array, WALKING_FROM_SOURCE: int, footpath_dict: dict,
+                  stop_count: int = None):
+    """
+    One-To-Many CSA over a connection array (see csa_functions.build_connection_array). A single scan computes earliest arrival
+    times of all stops. Scan stops once the departure time of a connection is later than the labels of all stops in DESTINATION_LIST.
+    If DESTINATION_LIST is None (One-To-All), the scan is not pruned.
+
+    Args:
+        SOURCE (int): stop id of source stop.
+        DESTINATION_LIST (list): list of stop ids of destination stops. None for One-To-All.
+        D_TIME (int): departure time in seconds since the service day.
+        connection_array (numpy.ndarray): structured array with dtype CONNECTION_DTYPE sorted by dep_time.
+        WALKING_FROM_SOURCE (int): 1 or 0. 1 indicates walking from SOURCE is allowed.
+        footpath_dict (dict): preprocessed dict with integer durations. Format {from_stop_id: [(to_stop_id, footpath_time)]}.
+        stop_count (int): 1 + largest stop id. Computed from connection_array and footpath_dict if None.
+
+    Returns:
+        stop_label (numpy.ndarray): earliest arrival time indexed by stop id. INF_SECONDS if stop is not reached. With DESTINATION_LIST,
+            only labels of stops in DESTINATION_LIST (and stops reached before them) are final.
+
+    Examples:
+        >>> output = onetomany_csa(36, [52, 43], 23400, connection_array, 1, footpath_dict)
+        >>> print(output[[52, 43]])
+        >>> output = onetomany_csa(36, None, 23400, connection_array, 1, footpath_dict)
+
+    See Also:
+        array_csa, One-To-Many rRAPTOR
+    """
+    targets = [] if DESTINATION_LIST is None else list(DESTINATION_LIST)
+    if stop_count is None:
+        stop_count = get_stop_count(connection_array, footpath_dict, SOURCE, *targets)
+    stop_label, pi_label, trip_reached, first = initialize_array_csa(SOURCE, D_TIME, connection_array, WALKING_FROM_SOURCE, footpath_dict, stop_count)
+    if DESTINATION_LIST is None or targets:
+        scan_connection_array(connection_array, first, stop_label, pi_label, trip_reached, footpath_dict, targets)
+    return np.array(stop_label, dtype=np.int32)
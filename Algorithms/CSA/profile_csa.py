@@ -0,0 +1,122 @@
+"""
+Module contains profile Connection Scan Algorithm (CSA) implementation. Computes, for one target stop, the pareto-optimal
+(departure time, arrival time) pairs of every stop in a single backward scan over the connection array.
+"""
+from bisect import bisect_right
+
+from Algorithms.CSA.csa_functions import *
+from gtfs_loader import INF_SECONDS
+
+
+def profile_csa(DESTINATION: int, connection_array, footpath_dict: dict, MAX_TRANSFER: int = None, START_TIME: int = 0) -> dict:
+    """
+    Profile CSA. Connections are scanned in decreasing order of departure time. For every stop, profile is kept as two lists sorted
+    by decreasing departure time: negated departure times and negated arrival times (both increasing, so both can be bisected).
+
+    Args:
+        DESTINATION (int): stop id of destination (target) stop.
+        connection_array (numpy.ndarray): structured array with dtype CONNECTION_DTYPE sorted by dep_time. See csa_functions.build_connection_array.
+        footpath_dict (dict): preprocessed dict with integer durations. Format {from_stop_id: [(to_stop_id, footpath_time)]}.
+        MAX_TRANSFER (int): maximum transfer limit. If None, number of transfers is not bounded.
+        START_TIME (int): only departures at or after START_TIME (seconds since the service day) are computed.
+
+    Returns:
+        profiles (dict): Format {stop id: [(departure time, arrival time)]} in increasing order of departure time.
+
+    Examples:
+        >>> profiles = profile_csa(52, connection_array, footpath_dict, 4)
+        >>> print(profiles[36])
+
+    See Also:
+        array_csa, rRAPTOR
+    """
+    levels = 1 if MAX_TRANSFER is None else MAX_TRANSFER + 1
+    walk_to_desti, footpaths_to_stop = initialize_profile_csa(DESTINATION, footpath_dict)
+    profile_deps = [defaultdict(list) for _ in range(levels)]
+    profile_arrs = [defaultdict(list) for _ in range(levels)]
+    trip_label = defaultdict(lambda: [INF_SECONDS] * levels)
+
+    first = int(np.searchsorted(connection_array["dep_time"], START_TIME, side="left"))
+    for chunk_end in range(len(connection_array), first, -SCAN_CHUNK):
+        chunk = connection_array[max(first, chunk_end - SCAN_CHUNK): chunk_end][::-1]
+        for departure_time, arrival_time, departure_stop, arrival_stop, tid in zip(chunk["dep_time"].tolist(), chunk["arr_time"].tolist(),
+                                                                                    chunk["from_stop"].tolist(), chunk["to_stop"].tolist(),
+                                                                                    chunk["trip"].tolist()):
+            walking_arrival = arrival_time + walk_to_desti[arrival_stop] if arrival_stop in walk_to_desti else INF_SECONDS
+            trip_arrival = trip_label[tid]
+            for level in range(levels):
+                best_arrival = min(walking_arrival, trip_arrival[level])
+                previous = level if MAX_TRANSFER is None else level - 1
+                if previous >= 0:
+                    best_arrival = min(best_arrival, evaluate_profile(profile_deps[previous][arrival_stop], profile_arrs[previous][arrival_stop],
+                                                                      arrival_time))
+                if best_arrival == INF_SECONDS:
+                    continue
+                trip_arrival[level] = best_arrival
+                for from_stop, duration in footpaths_to_stop.get(departure_stop, [(departure_stop, 0)]):
+                    add_profile_entry(profile_deps[level][from_stop], profile_arrs[level][from_stop], departure_time - duration, best_arrival)
+    return {stop: list(zip([-dep for dep in reversed(deps)], [-arr for arr in reversed(profile_arrs[-1][stop])]))
+            for stop, deps in profile_deps[-1].items() if deps}
+
+
+def initialize_profile_csa(DESTINATION: int, footpath_dict: dict) -> tuple:
+    """
+    Initialize values for profile CSA.
+
+    Args:
+        DESTINATION (int): stop id of destination stop.
+        footpath_dict (dict): preprocessed dict with integer durations. Format {from_stop_id: [(to_stop_id, footpath_time)]}.
+
+    Returns:
+        walk_to_desti (dict): walking time to DESTINATION. Format {stop id: walking time}.
+        footpaths_to_stop (dict): footpaths leading to a stop (including the stop itself with duration 0). Format {stop id: [(from stop id, duration)]}
+    """
+    walk_to_desti = {DESTINATION: 0}
+    footpaths_to_stop = defaultdict(list)
+    for from_stop, footpaths in footpath_dict.items():
+        for to_stop, duration in footpaths:
+            footpaths_to_stop[to_stop].append((from_stop, duration))
+            if to_stop == DESTINATION and from_stop != DESTINATION:
+                walk_to_desti[from_stop] = duration
+    for stop in footpaths_to_stop:
+        footpaths_to_stop[stop].append((stop, 0))
+    return walk_to_desti, dict(footpaths_to_stop)
+
+
+def evaluate_profile(neg_deps: list, neg_arrs: list, time: int) -> int:
+    """
+    Returns the earliest arrival time at the destination when departing from a stop at or after time.
+
+    Args:
+        neg_deps (list): negated departure times of the profile (increasing).
+        neg_arrs (list): negated arrival times of the profile (increasing).
+        time (int): earliest possible departure time.
+
+    Returns:
+        arrival time (int): INF_SECONDS if the destination cannot be reached.
+    """
+    idx = bisect_right(neg_deps, -time) - 1
+    return -neg_arrs[idx] if idx >= 0 else INF_SECONDS
+
+
+def add_profile_entry(neg_deps: list, neg_arrs: list, departure_time: int, arrival_time: int) -> None:
+    """
+    Adds (departure_time, arrival_time) to a stop profile if it is not dominated and removes the entries it dominates.
+
+    Args:
+        neg_deps (list): negated departure times of the profile (increasing).
+        neg_arrs (list): negated arrival times of the profile (increasing).
+        departure_time (int): departure time.
+        arrival_time (int): arrival time at destination.
+
+    Returns:
+        None
+    """
+    pos = bisect_right(neg_deps, -departure_time)
+    if pos > 0 and -neg_arrs[pos - 1] <= arrival_time:
+        return None
+    start = pos - 1 if pos > 0 and neg_deps[pos - 1] == -departure_time else pos
+    end = bisect_right(neg_arrs, -arrival_time, start)
+    neg_deps[start:end] = [-departure_time]
+    neg_arrs[start:end] = [-arrival_time]
+    return None
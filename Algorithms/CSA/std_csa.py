@@ -14,8 +14,9 @@ def std_csa(SOURCE: int, DESTINATION: int, D_TIME, connections_list: list, WALKI
     Args:
         SOURCE (int): stop id of source stop.
         DESTINATION (int): stop id of destination stop.
-        D_TIME (pandas.datetime): departure time.
-        connections_list:
+        D_TIME (pandas.datetime or int): departure time. int means seconds since the service day (see gtfs_loader.load_stoptimes_array).
+        connections_list (list): list of connections. Format: [[connection id, from stop, to stop, from time, to time, trip id]].
+            Times must use the same representation as D_TIME.
         WALKING_FROM_SOURCE (int): 1 or 0. 1 indicates walking from SOURCE is allowed.
         footpath_dict (dict): preprocessed dict. Format {from_stop_id: [(to_stop_id, footpath_time)]}.
         PRINT_ITINERARY (int): 1 or 0. 1 means print complete path.
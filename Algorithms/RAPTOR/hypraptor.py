@@ -6,14 +6,14 @@ from Algorithms.RAPTOR.raptor_functions import *
 
 def hypraptor(SOURCE: int, DESTINATION: int, D_TIME, MAX_TRANSFER: int, WALKING_FROM_SOURCE: int, CHANGE_TIME_SEC: int,
               PRINT_ITINERARY: int, stop_out: dict, route_groups: dict, routes_by_stop_dict: dict, stops_dict: dict, stoptimes_dict: dict,
-              footpath_dict: dict, idx_by_route_stop_dict: dict) -> list:
+              footpath_dict: dict, idx_by_route_stop_dict: dict, departures_dict: dict = None) -> list:
     """
     Standard HypRaptor implementation
 
     Args:
         SOURCE (int): stop id of source stop.
         DESTINATION (int): stop id of destination stop.
-        D_TIME (pandas.datetime): departure time.
+        D_TIME (pandas.datetime or int): departure time. int means seconds since the service day (see gtfs_loader.load_stoptimes_array).
         MAX_TRANSFER (int): maximum transfer limit.
         WALKING_FROM_SOURCE (int): 1 or 0. 1 means walking from SOURCE is allowed.
         CHANGE_TIME_SEC (int): change-time in seconds.
@@ -25,6 +25,8 @@ def hypraptor(SOURCE: int, DESTINATION: int, D_TIME, MAX_TRANSFER: int, WALKING_
         stoptimes_dict (dict): preprocessed dict. Format {route_id: [[trip_1], [trip_2]]}.
         footpath_dict (dict): preprocessed dict. Format {from_stop_id: [(to_stop_id, footpath_time)]}.
         idx_by_route_stop_dict (dict): preprocessed dict. Format {(route id, stop id): stop index in route}.
+        departures_dict (dict): preprocessed dict. Format {route_id: [[departure times of all trips at stop index 0], ...]}. See gtfs_loader.build_departures_dict.
+            If None, trips are searched linearly.
 
     Returns:
         out (list): list of pareto-optimal arrival Timestamps.
@@ -39,8 +41,8 @@ def hypraptor(SOURCE: int, DESTINATION: int, D_TIME, MAX_TRANSFER: int, WALKING_
     # Initialization
     reduced_routes = route_groups[tuple(sorted((stop_out[SOURCE], stop_out[DESTINATION])))]
 
-    marked_stop, marked_stop_dict, label, pi_label, star_label, inf_time = initialize_raptor(routes_by_stop_dict, SOURCE, MAX_TRANSFER)
-    change_time = pd.to_timedelta(CHANGE_TIME_SEC, unit='seconds')
+    marked_stop, marked_stop_dict, label, pi_label, star_label, inf_time = initialize_raptor(routes_by_stop_dict, SOURCE, MAX_TRANSFER, D_TIME)
+    _, change_time = get_time_constants(D_TIME, CHANGE_TIME_SEC)
     (label[0][SOURCE], star_label[SOURCE]) = (D_TIME, D_TIME)
     Q = {}
     if WALKING_FROM_SOURCE == 1:
@@ -89,7 +91,10 @@ def hypraptor(SOURCE: int, DESTINATION: int, D_TIME, MAX_TRANSFER: int, WALKING_
                         marked_stop_dict[p_i] = 1
                 if current_trip_t == -1 or label[k - 1][p_i] + change_time < current_trip_t[current_stopindex_by_route][
                     1]:  # assuming arrival_time=departure_time
-                    tid, current_trip_t = get_latest_trip_new(stoptimes_dict, route, label[k - 1][p_i], current_stopindex_by_route, change_time)
+                    if current_trip_t == -1:
+                        tid, current_trip_t = get_latest_trip_new(stoptimes_dict, route, label[k - 1][p_i], current_stopindex_by_route, change_time, departures_dict)
+                    else:
+                        tid, current_trip_t = get_earlier_trip(stoptimes_dict, route, label[k - 1][p_i], current_stopindex_by_route, change_time, tid)
                     if current_trip_t == -1:
                         boarding_time, boarding_point = -1, -1
                     else:
@@ -1,12 +1,15 @@
 """
 Module contains function related to RAPTOR, rRAPTOR, One-To-Many rRAPTOR, HypRAPTOR
 """
+from bisect import bisect_left
 from collections import deque as deque
 
 import pandas as pd
 
+from gtfs_loader import get_time_constants, format_clock, duration_seconds
 
-def initialize_raptor(routes_by_stop_dict: dict, SOURCE: int, MAX_TRANSFER: int) -> tuple:
+
+def initialize_raptor(routes_by_stop_dict: dict, SOURCE: int, MAX_TRANSFER: int, D_TIME=None) -> tuple:
     '''
     Initialize values for RAPTOR.
 
@@ -14,6 +17,7 @@ def initialize_raptor(routes_by_stop_dict: dict, SOURCE: int, MAX_TRANSFER: int)
         routes_by_stop_dict (dict): preprocessed dict. Format {stop_id: [id of routes passing through stop]}.
         SOURCE (int): stop id of source stop.
         MAX_TRANSFER (int): maximum transfer limit.
+        D_TIME (pandas.datetime or int): departure time. Only used to pick the time representation of inf_time.
 
     Returns:
         marked_stop (deque): deque to store marked stop.
@@ -27,7 +31,7 @@ def initialize_raptor(routes_by_stop_dict: dict, SOURCE: int, MAX_TRANSFER: int)
     Examples:
         >>> output = initialize_raptor(routes_by_stop_dict, 20775, 4)
     '''
-    inf_time = pd.to_datetime("today").round(freq='H') + pd.to_timedelta("365 day")
+    inf_time, _ = get_time_constants(D_TIME)
     #    inf_time = pd.to_datetime('2022-01-15 19:00:00')
 
     pi_label = {x: {stop: -1 for stop in routes_by_stop_dict.keys()} for x in range(0, MAX_TRANSFER + 1)}
@@ -63,16 +67,18 @@ def check_stop_validity(stops, SOURCE: int, DESTINATION: int) -> None:
     return None
 
 
-def get_latest_trip_new(stoptimes_dict: dict, route: int, arrival_time_at_pi, pi_index: int, change_time) -> tuple:
+def get_latest_trip_new(stoptimes_dict: dict, route: int, arrival_time_at_pi, pi_index: int, change_time, departures_dict: dict = None) -> tuple:
     '''
-    Get latest trip after a certain timestamp from the given stop of a route.
+    Get latest trip after a certain timestamp from the given stop of a route. If departures_dict is given, the trip is found
+    using binary search (O(log trips)). Else trips are scanned linearly from the first trip.
 
     Args:
         stoptimes_dict (dict): preprocessed dict. Format {route_id: [[trip_1], [trip_2]]}.
         route (int): id of route.
-        arrival_time_at_pi (pandas.datetime): arrival time at stop pi.
+        arrival_time_at_pi (pandas.datetime or int): arrival time at stop pi.
         pi_index (int): index of the stop from which route was boarded.
-        change_time (pandas.datetime): change time at stop (set to 0).
+        change_time (pandas.timedelta or int): change time at stop (set to 0).
+        departures_dict (dict): preprocessed dict. Format {route_id: [[departure times of all trips at stop index 0], ...]}. See gtfs_loader.build_departures_dict.
 
     Returns:
         If a trip exists:
@@ -82,8 +88,15 @@ def get_latest_trip_new(stoptimes_dict: dict, route: int, arrival_time_at_pi, pi
 
     Examples:
         >>> output = get_latest_trip_new(stoptimes_dict, 1000, pd.to_datetime('2019-06-10 17:40:00'), 0, pd.to_timedelta(0, unit='seconds'))
+        >>> output = get_latest_trip_new(stoptimes_dict, 1000, pd.to_datetime('2019-06-10 17:40:00'), 0, pd.to_timedelta(0, unit='seconds'), departures_dict)
     '''
     try:
+        if departures_dict is not None:
+            stop_departures = departures_dict[route][pi_index]
+            trip_idx = bisect_left(stop_departures, arrival_time_at_pi + change_time)
+            if trip_idx < len(stop_departures):
+                return f'{route}_{trip_idx}', stoptimes_dict[route][trip_idx]
+            return -1, -1
         for trip_idx, trip in enumerate(stoptimes_dict[route]):
             if trip[pi_index][1] >= arrival_time_at_pi + change_time:
                 return f'{route}_{trip_idx}', stoptimes_dict[route][trip_idx]
@@ -92,6 +105,33 @@ def get_latest_trip_new(stoptimes_dict: dict, route: int, arrival_time_at_pi, pi
         return -1, -1  # No trip exsist for this route. in this case check tripid from trip file for this route and then look waybill.ID. Likely that trip is across days thats why it is rejected in stoptimes builder while checking
 
 
+def get_earlier_trip(stoptimes_dict: dict, route: int, arrival_time_at_pi, pi_index: int, change_time, tid: str) -> tuple:
+    '''
+    Get the earliest trip that can still be boarded at stop pi, given that trip tid (currently boarded) can be boarded there.
+    Trips are FIFO, so only the trips before tid need to be checked and the search walks backwards from tid.
+
+    Args:
+        stoptimes_dict (dict): preprocessed dict. Format {route_id: [[trip_1], [trip_2]]}.
+        route (int): id of route.
+        arrival_time_at_pi (pandas.datetime or int): arrival time at stop pi.
+        pi_index (int): index of stop pi in the route.
+        change_time (pandas.timedelta or int): change time at stop (set to 0).
+        tid (str): id of currently boarded trip. Format route_tripindex.
+
+    Returns:
+        trip index, trip
+
+    Examples:
+        >>> output = get_earlier_trip(stoptimes_dict, 1000, pd.to_datetime('2019-06-10 17:40:00'), 0, pd.to_timedelta(0, unit='seconds'), '1000_5')
+    '''
+    route_trips = stoptimes_dict[route]
+    trip_idx = int(tid.split("_")[1])
+    earliest_departure = arrival_time_at_pi + change_time
+    while trip_idx > 0 and route_trips[trip_idx - 1][pi_index][1] >= earliest_departure:
+        trip_idx = trip_idx - 1
+    return f'{route}_{trip_idx}', route_trips[trip_idx]
+
+
 def post_processing(DESTINATION: int, pi_label: dict, PRINT_ITINERARY: int, label: dict) -> tuple:
     '''
     Post processing for std_RAPTOR. Currently supported functionality:
@@ -162,11 +202,11 @@ def _print_Journey_legs(pareto_journeys: list) -> None:
     for _, journey in pareto_journeys:
         for leg in journey:
             if leg[0] == 'walking':
-                print(f'from {leg[1]} walk till  {leg[2]} for {leg[3].total_seconds()} seconds')
+                print(f'from {leg[1]} walk till  {leg[2]} for {duration_seconds(leg[3])} seconds')
             #                print(f'from {leg[1]} walk till  {leg[2]} for {leg[3]} minutes and reach at {leg[4].time()}')
             else:
                 print(
-                    f'from {leg[1]} board at {leg[0].time()} and get down on {leg[2]} at {leg[3].time()} along {leg[-1]}')
+                    f'from {leg[1]} board at {format_clock(leg[0])} and get down on {leg[2]} at {format_clock(leg[3])} along {leg[-1]}')
         print("####################################")
     return None
 
@@ -0,0 +1,304 @@
+"""
+Module contains a reusable label workspace for RAPTOR and rRAPTOR.
+"""
+from collections import defaultdict, deque
+
+import numpy as np
+
+from Algorithms.RAPTOR.raptor_functions import get_latest_trip_new, get_earlier_trip, post_processing, post_processing_rraptor
+from gtfs_loader import INF_SECONDS
+
+
+class RaptorWorkspace:
+    """
+    Dense label storage for RAPTOR that can be reused across queries. Labels are numpy arrays indexed by stop id (stop ids are
+    contiguous integers, see GTFS_wrapper). label and pi_label are round-major, i.e., label[k] is the row of round k.
+
+    Every entry has a stamp and is valid only if its stamp equals the current stamp. Hence, starting a new query (or a new departure
+    time in rRAPTOR) is O(1): the stamp is incremented and old entries are ignored. Arrays are allocated once in __init__.
+
+    The workspace stores times as int64 and must be used with the integer-seconds timetable (see gtfs_loader.load_all_dict).
+
+    Args:
+        routes_by_stop_dict (dict): preprocessed dict. Format {stop_id: [id of routes passing through stop]}.
+        MAX_TRANSFER (int): maximum transfer limit supported by the workspace.
+
+    Examples:
+        >>> workspace = RaptorWorkspace(routes_by_stop_dict, 4)
+        >>> output = raptor(36, 52, 20460, 4, 1, 0, 0, routes_by_stop_dict, stops_dict, stoptimes_dict, footpath_dict, idx_by_route_stop_dict, departures_dict, workspace)
+    """
+
+    def __init__(self, routes_by_stop_dict: dict, MAX_TRANSFER: int):
+        self.MAX_TRANSFER = MAX_TRANSFER
+        self.inf_time = INF_SECONDS
+        stop_count = max(routes_by_stop_dict.keys()) + 1
+        rounds = MAX_TRANSFER + 1
+        self.label = np.full((rounds, stop_count), INF_SECONDS, dtype=np.int64)
+        self.label_stamp = np.zeros((rounds, stop_count), dtype=np.int64)
+        self.star_label = np.full(stop_count, INF_SECONDS, dtype=np.int64)
+        self.star_stamp = np.zeros(stop_count, dtype=np.int64)
+        self.pi_label = np.empty((rounds, stop_count), dtype=object)
+        self.pi_stamp = np.zeros((rounds, stop_count), dtype=np.int64)
+        self.marked_stamp = np.zeros(stop_count, dtype=np.int64)
+        self.query_stamp = 0
+        self.departure_stamp = 0
+        self.touched = []
+
+    def new_query(self) -> None:
+        """
+        Invalidates all labels. Called once per query.
+        """
+        self.query_stamp = self.query_stamp + 1
+        self.new_departure()
+
+    def new_departure(self) -> None:
+        """
+        Invalidates pi_label and marked stops but keeps label and star_label. Called once per departure time in rRAPTOR.
+        """
+        self.departure_stamp = self.departure_stamp + 1
+        self.touched.clear()
+
+    def get_label(self, k: int, stop: int) -> int:
+        if self.label_stamp[k, stop] == self.query_stamp:
+            return int(self.label[k, stop])
+        return INF_SECONDS
+
+    def set_label(self, k: int, stop: int, arrival_time: int) -> None:
+        self.label[k, stop] = arrival_time
+        self.label_stamp[k, stop] = self.query_stamp
+
+    def get_star(self, stop: int) -> int:
+        if self.star_stamp[stop] == self.query_stamp:
+            return int(self.star_label[stop])
+        return INF_SECONDS
+
+    def set_star(self, stop: int, arrival_time: int) -> None:
+        self.star_label[stop] = arrival_time
+        self.star_stamp[stop] = self.query_stamp
+
+    def set_pi(self, k: int, stop: int, pointer_label: tuple) -> None:
+        if self.pi_stamp[k, stop] != self.departure_stamp:
+            self.pi_stamp[k, stop] = self.departure_stamp
+            self.touched.append((k, stop))
+        self.pi_label[k, stop] = pointer_label
+
+    def is_marked(self, stop: int) -> bool:
+        return self.marked_stamp[stop] == self.departure_stamp
+
+    def mark(self, stop: int) -> None:
+        self.marked_stamp[stop] = self.departure_stamp
+
+    def unmark(self, stop: int) -> None:
+        self.marked_stamp[stop] = 0
+
+    def export_labels(self) -> tuple:
+        """
+        Builds label and pi_label dicts (same format as initialize_raptor) for the stops reached in the current departure. Only these
+        stops are needed for backtracking, so the size of the output is independent of the network size.
+
+        Returns:
+            label (dict): nested dict. Format {round : {stop_id: arrival time}}.
+            pi_label (dict): nested dict. Format {round : {stop_id: pointer_label}}. Missing stops map to -1.
+        """
+        label = {k: {} for k in range(self.MAX_TRANSFER + 1)}
+        pi_label = {k: defaultdict(lambda: -1) for k in range(self.MAX_TRANSFER + 1)}
+        for k, stop in self.touched:
+            label[k][stop] = self.get_label(k, stop)
+            pi_label[k][stop] = self.pi_label[k, stop]
+        return label, pi_label
+
+
+def _scan_rounds(workspace: RaptorWorkspace, marked_stop: deque, DESTINATION: int, MAX_TRANSFER: int, change_time: int, routes_by_stop_dict: dict,
+                 stops_dict: dict, stoptimes_dict: dict, footpath_dict: dict, idx_by_route_stop_dict: dict, departures_dict: dict,
+                 first_round_Q: dict = None) -> None:
+    """
+    Runs the RAPTOR rounds on the workspace. Parent function: raptor_ws, rraptor_ws
+
+    Args:
+        workspace (RaptorWorkspace): workspace with initialized labels.
+        marked_stop (deque): deque of marked stops.
+        DESTINATION (int): stop id of destination stop.
+        MAX_TRANSFER (int): maximum transfer limit.
+        change_time (int): change-time in seconds.
+        routes_by_stop_dict (dict): preprocessed dict. Format {stop_id: [id of routes passing through stop]}.
+        stops_dict (dict): preprocessed dict. Format {route_id: [ids of stops in the route]}.
+        stoptimes_dict (dict): preprocessed dict. Format {route_id: [[trip_1], [trip_2]]}.
+        footpath_dict (dict): preprocessed dict. Format {from_stop_id: [(to_stop_id, footpath_time)]}.
+        idx_by_route_stop_dict (dict): preprocessed dict. Format {(route id, stop id): stop index in route}.
+        departures_dict (dict): preprocessed dict. See gtfs_loader.build_departures_dict.
+        first_round_Q (dict): if given, used as Q in round 1 (rRAPTOR starts from a single trip). Format {route: stop index}
+
+    Returns:
+        None
+    """
+    Q = {}
+    for k in range(1, MAX_TRANSFER + 1):
+        Q.clear()
+        if k == 1 and first_round_Q is not None:
+            while marked_stop:
+                workspace.unmark(marked_stop.pop())
+            Q.update(first_round_Q)
+        while marked_stop:
+            p = marked_stop.pop()
+            workspace.unmark(p)
+            try:
+                for route in routes_by_stop_dict[p]:
+                    stp_idx = idx_by_route_stop_dict[(route, p)]
+                    try:
+                        Q[route] = min(stp_idx, Q[route])
+                    except KeyError:
+                        Q[route] = stp_idx
+            except KeyError:
+                continue
+
+        for route, current_stopindex_by_route in Q.items():
+            current_trip_t = -1
+            for p_i in stops_dict[route][current_stopindex_by_route:]:
+                if current_trip_t != -1:
+                    arr_by_t_at_pi = current_trip_t[current_stopindex_by_route][1]
+                    if arr_by_t_at_pi < min(workspace.get_star(p_i), workspace.get_star(DESTINATION)):
+                        workspace.set_label(k, p_i, arr_by_t_at_pi)
+                        workspace.set_star(p_i, arr_by_t_at_pi)
+                        workspace.set_pi(k, p_i, (boarding_time, boarding_point, p_i, arr_by_t_at_pi, tid))
+                        if not workspace.is_marked(p_i):
+                            marked_stop.append(p_i)
+                            workspace.mark(p_i)
+                previous_label = workspace.get_label(k - 1, p_i)
+                if current_trip_t == -1 or previous_label + change_time < current_trip_t[current_stopindex_by_route][1]:
+                    if current_trip_t == -1:
+                        tid, current_trip_t = get_latest_trip_new(stoptimes_dict, route, previous_label, current_stopindex_by_route, change_time,
+                                                                  departures_dict)
+                    else:
+                        tid, current_trip_t = get_earlier_trip(stoptimes_dict, route, previous_label, current_stopindex_by_route, change_time, tid)
+                    if current_trip_t == -1:
+                        boarding_time, boarding_point = -1, -1
+                    else:
+                        boarding_point = p_i
+                        boarding_time = current_trip_t[current_stopindex_by_route][1]
+                current_stopindex_by_route = current_stopindex_by_route + 1
+
+        for p in [*marked_stop]:
+            try:
+                trans_info = footpath_dict[p]
+            except KeyError:
+                continue
+            label_p = workspace.get_label(k, p)
+            for p_dash, to_pdash_time in trans_info:
+                new_p_dash_time = label_p + to_pdash_time
+                if workspace.get_label(k, p_dash) > new_p_dash_time and new_p_dash_time < min(workspace.get_star(p_dash), workspace.get_star(DESTINATION)):
+                    workspace.set_label(k, p_dash, new_p_dash_time)
+                    workspace.set_star(p_dash, new_p_dash_time)
+                    workspace.set_pi(k, p_dash, ('walking', p, p_dash, to_pdash_time, new_p_dash_time))
+                    if not workspace.is_marked(p_dash):
+                        marked_stop.append(p_dash)
+                        workspace.mark(p_dash)
+        if not marked_stop:
+            break
+    return None
+
+
+def raptor_ws(SOURCE: int, DESTINATION: int, D_TIME: int, MAX_TRANSFER: int, WALKING_FROM_SOURCE: int, CHANGE_TIME_SEC: int, PRINT_ITINERARY: int,
+              routes_by_stop_dict: dict, stops_dict: dict, stoptimes_dict: dict, footpath_dict: dict, idx_by_route_stop_dict: dict,
+              departures_dict: dict, workspace: RaptorWorkspace) -> list:
+    """
+    RAPTOR on a reusable workspace. Output is same as std_raptor.raptor.
+
+    Args:
+        SOURCE (int): stop id of source stop.
+        DESTINATION (int): stop id of destination stop.
+        D_TIME (int): departure time in seconds since the service day.
+        MAX_TRANSFER (int): maximum transfer limit. Must not exceed workspace.MAX_TRANSFER.
+        WALKING_FROM_SOURCE (int): 1 or 0. 1 indicates walking from SOURCE is allowed.
+        CHANGE_TIME_SEC (int): change-time in seconds.
+        PRINT_ITINERARY (int): 1 or 0. 1 means print complete path.
+        routes_by_stop_dict (dict): preprocessed dict. Format {stop_id: [id of routes passing through stop]}.
+        stops_dict (dict): preprocessed dict. Format {route_id: [ids of stops in the route]}.
+        stoptimes_dict (dict): preprocessed dict (integer seconds). Format {route_id: [[trip_1], [trip_2]]}.
+        footpath_dict (dict): preprocessed dict (integer seconds). Format {from_stop_id: [(to_stop_id, footpath_time)]}.
+        idx_by_route_stop_dict (dict): preprocessed dict. Format {(route id, stop id): stop index in route}.
+        departures_dict (dict): preprocessed dict. See gtfs_loader.build_departures_dict.
+        workspace (RaptorWorkspace): reusable workspace.
+
+    Returns:
+        out (list): list of pareto-optimal arrival times.
+
+    Examples:
+        >>> output = raptor_ws(36, 52, 20460, 4, 1, 0, 0, routes_by_stop_dict, stops_dict, stoptimes_dict, footpath_dict, idx_by_route_stop_dict, departures_dict, workspace)
+    """
+    workspace.new_query()
+    marked_stop = deque()
+    workspace.set_label(0, SOURCE, D_TIME)
+    workspace.set_star(SOURCE, D_TIME)
+    marked_stop.append(SOURCE)
+    workspace.mark(SOURCE)
+    if WALKING_FROM_SOURCE == 1:
+        for p_dash, to_pdash_time in footpath_dict.get(SOURCE, []):
+            workspace.set_label(0, p_dash, D_TIME + to_pdash_time)
+            workspace.set_star(p_dash, D_TIME + to_pdash_time)
+            workspace.set_pi(0, p_dash, ('walking', SOURCE, p_dash, to_pdash_time, D_TIME + to_pdash_time))
+            if not workspace.is_marked(p_dash):
+                marked_stop.append(p_dash)
+                workspace.mark(p_dash)
+    _scan_rounds(workspace, marked_stop, DESTINATION, MAX_TRANSFER, int(CHANGE_TIME_SEC), routes_by_stop_dict, stops_dict, stoptimes_dict,
+                 footpath_dict, idx_by_route_stop_dict, departures_dict)
+    label, pi_label = workspace.export_labels()
+    _, _, rap_out = post_processing(DESTINATION, pi_label, PRINT_ITINERARY, label)
+    return [rap_out]
+
+
+def rraptor_ws(SOURCE: int, DESTINATION: int, d_time_list: list, MAX_TRANSFER: int, CHANGE_TIME_SEC: int, PRINT_ITINERARY: int, OPTIMIZED: int,
+               routes_by_stop_dict: dict, stops_dict: dict, stoptimes_dict: dict, footpath_dict: dict, idx_by_route_stop_dict: dict,
+               departures_dict: dict, workspace: RaptorWorkspace) -> list:
+    """
+    rRAPTOR on a reusable workspace. label and star_label are kept across departure times (as in rraptor) while pi_label and marked
+    stops are reset in O(1) per departure time. Output is same as rraptor.rraptor.
+
+    Args:
+        SOURCE (int): stop id of source stop.
+        DESTINATION (int): stop id of destination stop.
+        d_time_list (list): departures from source sorted in decreasing order of time. Format [[trip_id, departure time, stop index]].
+        MAX_TRANSFER (int): maximum transfer limit. Must not exceed workspace.MAX_TRANSFER.
+        CHANGE_TIME_SEC (int): change-time in seconds.
+        PRINT_ITINERARY (int): 1 or 0. 1 means print complete path.
+        OPTIMIZED (int): 1 or 0. 1 means collect trips and 0 means collect routes.
+        routes_by_stop_dict (dict): preprocessed dict. Format {stop_id: [id of routes passing through stop]}.
+        stops_dict (dict): preprocessed dict. Format {route_id: [ids of stops in the route]}.
+        stoptimes_dict (dict): preprocessed dict (integer seconds). Format {route_id: [[trip_1], [trip_2]]}.
+        footpath_dict (dict): preprocessed dict (integer seconds). Format {from_stop_id: [(to_stop_id, footpath_time)]}.
+        idx_by_route_stop_dict (dict): preprocessed dict. Format {(route id, stop id): stop index in route}.
+        departures_dict (dict): preprocessed dict. See gtfs_loader.build_departures_dict.
+        workspace (RaptorWorkspace): reusable workspace.
+
+    Returns:
+        if OPTIMIZED==1:
+            out (list):  list of trips required to cover all optimal journeys Format: [trip_id]
+        elif OPTIMIZED==0:
+            out (list):  list of routes required to cover all optimal journeys. Format: [route_id]
+    """
+    out = []
+    change_time = int(CHANGE_TIME_SEC)
+    workspace.new_query()
+    for start_tid, d_time, s_idx in d_time_list:
+        workspace.new_departure()
+        marked_stop = deque()
+        start_route = int(start_tid.split("_")[0])
+        first_stop = stops_dict[start_route][s_idx]
+        if first_stop != SOURCE:
+            to_pdash_time = [foot_connect[1] for foot_connect in footpath_dict[SOURCE] if foot_connect[0] == first_stop][0]
+            workspace.set_label(0, first_stop, d_time - change_time)
+            workspace.set_star(first_stop, d_time - change_time)
+            workspace.set_pi(0, first_stop, ('walking', SOURCE, first_stop, to_pdash_time, d_time - change_time))
+        else:
+            workspace.set_label(0, SOURCE, d_time)
+            workspace.set_star(SOURCE, d_time)
+        marked_stop.append(first_stop)
+        workspace.mark(first_stop)
+        if PRINT_ITINERARY == 1:
+            print(f"SOURCE, DESTINATION, d_time: {SOURCE, DESTINATION, d_time}")
+        _scan_rounds(workspace, marked_stop, DESTINATION, MAX_TRANSFER, change_time, routes_by_stop_dict, stops_dict, stoptimes_dict,
+                     footpath_dict, idx_by_route_stop_dict, departures_dict, {start_route: s_idx})
+        label, pi_label = workspace.export_labels()
+        out.extend(post_processing_rraptor(DESTINATION, pi_label, PRINT_ITINERARY, label, OPTIMIZED))
+        if PRINT_ITINERARY == 1:
+            print('------------------------------------')
+    return out
@@ -2,10 +2,12 @@
 Module contains rRAPTOR implementation
 """
 from Algorithms.RAPTOR.raptor_functions import *
+from Algorithms.RAPTOR.raptor_workspace import rraptor_ws
 
 
 def rraptor(SOURCE: int, DESTINATION: int, d_time_groups, MAX_TRANSFER: int, WALKING_FROM_SOURCE: int, CHANGE_TIME_SEC: int, PRINT_ITINERARY: int,
-            OPTIMIZED: int, routes_by_stop_dict: dict, stops_dict: dict, stoptimes_dict: dict, footpath_dict: dict, idx_by_route_stop_dict: dict) -> list:
+            OPTIMIZED: int, routes_by_stop_dict: dict, stops_dict: dict, stoptimes_dict: dict, footpath_dict: dict, idx_by_route_stop_dict: dict,
+            departures_dict: dict = None, workspace=None) -> list:
     '''
     Standard rRaptor implementation
 
@@ -23,6 +25,10 @@ def rraptor(SOURCE: int, DESTINATION: int, d_time_groups, MAX_TRANSFER: int, WAL
         stoptimes_dict (dict): preprocessed dict. Format {route_id: [[trip_1], [trip_2]]}.
         footpath_dict (dict): preprocessed dict. Format {from_stop_id: [(to_stop_id, footpath_time)]}.
         idx_by_route_stop_dict (dict): preprocessed dict. Format {(route id, stop id): stop index in route}.
+        departures_dict (dict): preprocessed dict. Format {route_id: [[departure times of all trips at stop index 0], ...]}. See gtfs_loader.build_departures_dict.
+            If None, trips are searched linearly.
+        workspace (RaptorWorkspace): reusable label storage (see raptor_workspace). If given, labels are kept in the workspace
+            instead of being allocated for this query. Requires the integer-seconds timetable.
 
     Returns:
         if OPTIMIZED==1:
@@ -49,9 +55,13 @@ def rraptor(SOURCE: int, DESTINATION: int, d_time_groups, MAX_TRANSFER: int, WAL
         except KeyError:
             pass
     d_time_list.sort(key=lambda x: x[1], reverse=True)
+    if workspace is not None:
+        return rraptor_ws(SOURCE, DESTINATION, d_time_list, MAX_TRANSFER, CHANGE_TIME_SEC, PRINT_ITINERARY, OPTIMIZED, routes_by_stop_dict,
+                          stops_dict, stoptimes_dict, footpath_dict, idx_by_route_stop_dict, departures_dict, workspace)
 
-    _, _, label, _, star_label, inf_time = initialize_raptor(routes_by_stop_dict, SOURCE, MAX_TRANSFER)
-    change_time = pd.to_timedelta(CHANGE_TIME_SEC, unit='seconds')
+    time_sample = d_time_list[0][1] if d_time_list else None
+    _, _, label, _, star_label, inf_time = initialize_raptor(routes_by_stop_dict, SOURCE, MAX_TRANSFER, time_sample)
+    _, change_time = get_time_constants(time_sample, CHANGE_TIME_SEC)
 
     for dep_details in d_time_list:
         pi_label = {x: {stop: -1 for stop in routes_by_stop_dict.keys()} for x in range(0, MAX_TRANSFER + 1)}
@@ -106,7 +116,10 @@ def rraptor(SOURCE: int, DESTINATION: int, d_time_groups, MAX_TRANSFER: int, WAL
                             marked_stop.append(p_i)
                             marked_stop_dict[p_i] = 1
                     if current_trip_t == -1 or label[k - 1][p_i] + change_time < current_trip_t[current_stopindex_by_route][1]: # assuming arrival_time = departure_time
-                        tid, current_trip_t = get_latest_trip_new(stoptimes_dict, route, label[k - 1][p_i], current_stopindex_by_route, change_time)
+                        if current_trip_t == -1:
+                            tid, current_trip_t = get_latest_trip_new(stoptimes_dict, route, label[k - 1][p_i], current_stopindex_by_route, change_time, departures_dict)
+                        else:
+                            tid, current_trip_t = get_earlier_trip(stoptimes_dict, route, label[k - 1][p_i], current_stopindex_by_route, change_time, tid)
                         if current_trip_t == -1:
                             boarding_time, boarding_point = -1, -1
                         else:
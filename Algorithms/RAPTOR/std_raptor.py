@@ -3,16 +3,18 @@ Module contains RAPTOR implementation.
 """
 
 from Algorithms.RAPTOR.raptor_functions import *
+from Algorithms.RAPTOR.raptor_workspace import raptor_ws
 
 def raptor(SOURCE: int, DESTINATION: int, D_TIME, MAX_TRANSFER: int, WALKING_FROM_SOURCE: int, CHANGE_TIME_SEC: int, PRINT_ITINERARY: int,
-           routes_by_stop_dict: dict, stops_dict: dict, stoptimes_dict: dict, footpath_dict: dict, idx_by_route_stop_dict: dict) -> list:
+           routes_by_stop_dict: dict, stops_dict: dict, stoptimes_dict: dict, footpath_dict: dict, idx_by_route_stop_dict: dict,
+           departures_dict: dict = None, workspace=None) -> list:
     '''
     Standard Raptor implementation
 
     Args:
         SOURCE (int): stop id of source stop.
         DESTINATION (int): stop id of destination stop.
-        D_TIME (pandas.datetime): departure time.
+        D_TIME (pandas.datetime or int): departure time. int means seconds since the service day (see gtfs_loader.load_stoptimes_array).
         MAX_TRANSFER (int): maximum transfer limit.
         WALKING_FROM_SOURCE (int): 1 or 0. 1 indicates walking from SOURCE is allowed.
         CHANGE_TIME_SEC (int): change-time in seconds.
@@ -22,6 +24,10 @@ def raptor(SOURCE: int, DESTINATION: int, D_TIME, MAX_TRANSFER: int, WALKING_FRO
         stoptimes_dict (dict): preprocessed dict. Format {route_id: [[trip_1], [trip_2]]}.
         footpath_dict (dict): preprocessed dict. Format {from_stop_id: [(to_stop_id, footpath_time)]}.
         idx_by_route_stop_dict (dict): preprocessed dict. Format {(route id, stop id): stop index in route}.
+        departures_dict (dict): preprocessed dict. Format {route_id: [[departure times of all trips at stop index 0], ...]}. See gtfs_loader.build_departures_dict.
+            If None, trips are searched linearly.
+        workspace (RaptorWorkspace): reusable label storage (see raptor_workspace). If given, labels are kept in the workspace
+            instead of being allocated for this query. Requires the integer-seconds timetable.
 
     Returns:
         out (list): list of pareto-optimal arrival timestamps.
@@ -34,10 +40,13 @@ def raptor(SOURCE: int, DESTINATION: int, D_TIME, MAX_TRANSFER: int, WALKING_FRO
         HypRAPTOR, Tip-based Public Transit Routing (TBTR)
     '''
 
+    if workspace is not None:
+        return raptor_ws(SOURCE, DESTINATION, D_TIME, MAX_TRANSFER, WALKING_FROM_SOURCE, CHANGE_TIME_SEC, PRINT_ITINERARY, routes_by_stop_dict,
+                         stops_dict, stoptimes_dict, footpath_dict, idx_by_route_stop_dict, departures_dict, workspace)
     out = []
     # Initialization
-    marked_stop, marked_stop_dict, label, pi_label, star_label, inf_time = initialize_raptor(routes_by_stop_dict, SOURCE, MAX_TRANSFER)
-    change_time = pd.to_timedelta(CHANGE_TIME_SEC, unit='seconds')
+    marked_stop, marked_stop_dict, label, pi_label, star_label, inf_time = initialize_raptor(routes_by_stop_dict, SOURCE, MAX_TRANSFER, D_TIME)
+    _, change_time = get_time_constants(D_TIME, CHANGE_TIME_SEC)
     (label[0][SOURCE], star_label[SOURCE]) = (D_TIME, D_TIME)
     Q = {}  # Format of Q is {route:stop index}
     if WALKING_FROM_SOURCE == 1:
@@ -85,7 +94,10 @@ def raptor(SOURCE: int, DESTINATION: int, D_TIME, MAX_TRANSFER: int, WALKING_FRO
                         marked_stop_dict[p_i] = 1
                 if current_trip_t == -1 or label[k - 1][p_i] + change_time < current_trip_t[current_stopindex_by_route][
                     1]:  # assuming arrival_time = departure_time
-                    tid, current_trip_t = get_latest_trip_new(stoptimes_dict, route, label[k - 1][p_i], current_stopindex_by_route, change_time)
+                    if current_trip_t == -1:
+                        tid, current_trip_t = get_latest_trip_new(stoptimes_dict, route, label[k - 1][p_i], current_stopindex_by_route, change_time, departures_dict)
+                    else:
+                        tid, current_trip_t = get_earlier_trip(stoptimes_dict, route, label[k - 1][p_i], current_stopindex_by_route, change_time, tid)
                     if current_trip_t == -1:
                         boarding_time, boarding_point = -1, -1
                     else:
@@ -3,13 +3,24 @@ Module contains function related to TBTR, rTBTR, One-To-Many rTBTR, HypTBTR
 """
 from collections import defaultdict
 
+import numpy as np
 import pandas as pd
 
+from Algorithms.TBTR.trip_transfer_csr import TripTransferCSR
+from gtfs_loader import get_time_constants, format_clock, duration_seconds
 
-def initialize_tbtr(MAX_TRANSFER: int) -> dict:
+# First reached stop of trips not reached yet (R_t). Larger than any stop index.
+UNREACHED = np.iinfo(np.int32).max
+
+
+def initialize_tbtr(MAX_TRANSFER: int, D_TIME=None) -> dict:
     '''
     Initialize values for TBTR.
 
+    Args:
+        MAX_TRANSFER (int): maximum transfer limit.
+        D_TIME (pandas.datetime or int): departure time. Only used to pick the time representation of inf_time.
+
     Returns:
         J (dict): dict to store arrival timestamps. Keys: number of transfer, Values: arrival time. 
         inf_time (pandas.datetime): Variable indicating infinite time.
@@ -18,19 +29,20 @@ def initialize_tbtr(MAX_TRANSFER: int) -> dict:
         >>> output = initialize_tbtr(4)
         >>> print(output)
     '''
-    inf_time = pd.to_datetime("today").round(freq='H') + pd.to_timedelta("365 day")
+    inf_time, _ = get_time_constants(D_TIME)
     #    inf_time = pd.to_datetime("2023-01-26 20:00:00")
     J = {x: [inf_time, 0] for x in range(MAX_TRANSFER + 1)}
     return J
 
 
-def initialize_onemany(MAX_TRANSFER: int, DESTINATION_LIST: list) -> tuple:
+def initialize_onemany(MAX_TRANSFER: int, DESTINATION_LIST: list, D_TIME=None) -> tuple:
     '''
     Initialize values for one-to-many TBTR.
 
     Args:
         MAX_TRANSFER (int): maximum transfer limit.
         DESTINATION_LIST (list): list of stop ids of destination stop.
+        D_TIME (pandas.datetime or int): departure time. Only used to pick the time representation of inf_time.
 
     Returns:
         J (dict): dict to store arrival timestamps. Keys: number of transfer, Values: arrival time.
@@ -40,13 +52,14 @@ def initialize_onemany(MAX_TRANSFER: int, DESTINATION_LIST: list) -> tuple:
         >>> output = initialize_onemany(4, [1482])
         >>> print(output)
     '''
-    inf_time = pd.to_datetime("today").round(freq='H') + pd.to_timedelta("365 day")
+    inf_time, _ = get_time_constants(D_TIME)
     #    inf_time = pd.to_datetime("2023-01-26 20:00:00")
     J = {desti: {x: [inf_time, 0] for x in range(MAX_TRANSFER + 1)} for desti in DESTINATION_LIST}
     return J, inf_time
 
 
-def initialize_from_desti(routes_by_stop_dict: dict, stops_dict: dict, DESTINATION: int, footpath_dict: dict, idx_by_route_stop_dict: dict) -> dict:
+def initialize_from_desti(routes_by_stop_dict: dict, stops_dict: dict, DESTINATION: int, footpath_dict: dict, idx_by_route_stop_dict: dict,
+                          D_TIME=None) -> dict:
     '''
     Initialize routes/footpath to leading to destination stop.
 
@@ -56,6 +69,7 @@ def initialize_from_desti(routes_by_stop_dict: dict, stops_dict: dict, DESTINATI
         DESTINATION (int): stop id of destination stop.
         footpath_dict (dict): preprocessed dict. Format {from_stop_id: [(to_stop_id, footpath_time)]}.
         idx_by_route_stop_dict (dict): preprocessed dict. Format {(route id, stop id): stop index in route}.
+        D_TIME (pandas.datetime or int): departure time. Only used to pick the time representation of travel time.
 
     Returns:
         L (dict): A dict to track routes/leading to destination stop. Format {route_id: (from_stop_idx, travel time, stop id)}
@@ -76,14 +90,14 @@ def initialize_from_desti(routes_by_stop_dict: dict, stops_dict: dict, DESTINATI
                 pass
     except KeyError:
         pass
-    delta_tau = pd.to_timedelta(0, unit="seconds")
+    _, delta_tau = get_time_constants(D_TIME)
     for route in routes_by_stop_dict[DESTINATION]:
         L_dict[route].append((idx_by_route_stop_dict[(route, DESTINATION)], delta_tau, DESTINATION))
     return dict(L_dict)
 
 
 def initialize_from_desti_onemany(routes_by_stop_dict: dict, stops_dict: dict, DESTINATION_LIST: list, footpath_dict: dict,
-                                  idx_by_route_stop_dict: dict) -> dict:
+                                  idx_by_route_stop_dict: dict, D_TIME=None) -> dict:
     '''
     Initialize routes/footpath to leading to destination stop in case of one-to-many rTBTR
 
@@ -93,6 +107,7 @@ def initialize_from_desti_onemany(routes_by_stop_dict: dict, stops_dict: dict, D
         DESTINATION_LIST (list): list of stop ids of destination stop.
         footpath_dict (dict): preprocessed dict. Format {from_stop_id: [(to_stop_id, footpath_time)]}.
         idx_by_route_stop_dict (dict): preprocessed dict. Format {(route id, stop id): stop index in route}.
+        D_TIME (pandas.datetime or int): departure time. Only used to pick the time representation of travel time.
 
     Returns:
         L (nested dict): A dict to track routes/leading to destination stops. Key: route_id, value: {destination_stop_id: [(from_stop_idx, travel time, stop id)]}
@@ -115,7 +130,7 @@ def initialize_from_desti_onemany(routes_by_stop_dict: dict, stops_dict: dict, D
                     pass
         except KeyError:
             pass
-        delta_tau = pd.to_timedelta(0, unit="seconds")
+        _, delta_tau = get_time_constants(D_TIME)
         for route in routes_by_stop_dict[destination]:
             L_dict[route].append((idx_by_route_stop_dict[(route, destination)], delta_tau, destination))
         L_dict_final[destination] = dict(L_dict)
@@ -123,7 +138,7 @@ def initialize_from_desti_onemany(routes_by_stop_dict: dict, stops_dict: dict, D
 
 
 def initialize_from_source(footpath_dict: dict, SOURCE: int, routes_by_stop_dict: dict, stops_dict: dict, stoptimes_dict: dict,
-                           D_TIME, MAX_TRANSFER: int, WALKING_FROM_SOURCE: int, idx_by_route_stop_dict: dict) -> tuple:
+                           D_TIME, MAX_TRANSFER: int, WALKING_FROM_SOURCE: int, idx_by_route_stop_dict: dict, trip_offsets: tuple) -> tuple:
     '''
     Initialize trips segments from source stop.
 
@@ -137,18 +152,18 @@ def initialize_from_source(footpath_dict: dict, SOURCE: int, routes_by_stop_dict
         MAX_TRANSFER (int): maximum transfer limit.
         WALKING_FROM_SOURCE (int): 1 or 0. 1 means walking from SOURCE is allowed.
         idx_by_route_stop_dict (dict): preprocessed dict. Format {(route id, stop id): stop index in route}.
+        trip_offsets (tuple): integer trip numbering. See gtfs_loader.build_trip_offsets.
 
     Returns:
-        R_t (dict): dict to store first reached stop of every trip. Format {trip_id: first reached stop}
+        R_t (numpy.ndarray): first reached stop of every trip, indexed by integer trip id. See initialize_R_t.
         Q (list): list of trips segments
 
     Examples:
-        >>> output = initialize_from_source(footpath_dict, 20775, routes_by_stop_dict, stops_dict, stoptimes_dict, pd.to_datetime('2019-06-10 00:00:00'), 4, 1, idx_by_route_stop_dict)
+        >>> output = initialize_from_source(footpath_dict, 20775, routes_by_stop_dict, stops_dict, stoptimes_dict, pd.to_datetime('2019-06-10 00:00:00'), 4, 1, idx_by_route_stop_dict, trip_offsets)
         >>> print(output)
     '''
     Q = [[] for x in range(MAX_TRANSFER + 2)]
-    #    R_t = {f"{r}_{tid}": 1000 for r, r_trips in stoptimes_dict.items() for tid in range(len(r_trips))}
-    R_t = defaultdict(lambda: 1000)  # assuming maximum route length is 1000
+    R_t = initialize_R_t(trip_offsets)
     connection_list = []
     if WALKING_FROM_SOURCE == 1:
         try:
@@ -161,7 +176,7 @@ def initialize_from_source(footpath_dict: dict, SOURCE: int, routes_by_stop_dict
                     route_trip = stoptimes_dict[route]
                     for trip_idx, trip in enumerate(route_trip):
                         if D_TIME + footpath_time <= trip[stop_index][1]:
-                            connection_list.append((f'{route}_{trip_idx}', stop_index))
+                            connection_list.append((trip_offsets[0][route] + trip_idx, stop_index))
                             break
         except KeyError:
             pass
@@ -171,36 +186,149 @@ def initialize_from_source(footpath_dict: dict, SOURCE: int, routes_by_stop_dict
         route_trip = stoptimes_dict[route]
         for trip_idx, trip in enumerate(route_trip):
             if D_TIME <= trip[stop_index][1]:
-                connection_list.append((f'{route}_{trip_idx}', stop_index))
+                connection_list.append((trip_offsets[0][route] + trip_idx, stop_index))
                 break
-    enqueue(connection_list, 1, (0, 0), R_t, Q, stoptimes_dict)
+    enqueue(connection_list, 1, (-1, 0), R_t, Q, trip_offsets)
     return R_t, Q
 
 
-def enqueue(connection_list: list, nextround: int, predecessor_label: tuple, R_t: dict, Q: list, stoptimes_dict: dict) -> None:
+def initialize_R_t(trip_offsets: tuple, MAX_TRANSFER: int = None):
+    '''
+    Initialize first reached stop of every trip. Unreached trips have first reached stop = UNREACHED (larger than any stop index).
+
+    Args:
+        trip_offsets (tuple): integer trip numbering. See gtfs_loader.build_trip_offsets.
+        MAX_TRANSFER (int): maximum transfer limit. If given, one row is kept per round (used in range queries).
+
+    Returns:
+        R_t (numpy.ndarray): Format R_t[integer trip id] or R_t[round, integer trip id] if MAX_TRANSFER is given.
+
+    Examples:
+        >>> R_t = initialize_R_t(trip_offsets)
+    '''
+    trip_count = len(trip_offsets[2])
+    shape = trip_count if MAX_TRANSFER is None else (MAX_TRANSFER + 2, trip_count)
+    return np.full(shape, UNREACHED, dtype=np.int32)
+
+
+def int_tid(tid: str, trip_offsets: tuple) -> int:
+    """
+    Converts trip id of format "route_trip" (as in stop_times.txt) to integer trip id.
+
+    Args:
+        tid (str): trip id.
+        trip_offsets (tuple): integer trip numbering. See gtfs_loader.build_trip_offsets.
+
+    Returns:
+        int
+    """
+    route, trip_idx = tid.split("_")
+    return trip_offsets[0][int(route)] + int(trip_idx)
+
+
+def str_tid(tid: int, trip_offsets: tuple) -> str:
+    """
+    Converts integer trip id to trip id of format "route_trip". Used only when producing outputs.
+
+    Args:
+        tid (int): integer trip id.
+        trip_offsets (tuple): integer trip numbering. See gtfs_loader.build_trip_offsets.
+
+    Returns:
+        str
+    """
+    return f"{trip_offsets[2][tid]}_{trip_offsets[3][tid]}"
+
+
+def str_trip_transfer_dict(trip_transfer_dict: dict, trip_offsets: tuple) -> dict:
+    """
+    Converts the trip-transfer dict from integer trip ids to trip ids of format "route_trip" (format used by Transfer Patterns).
+
+    Args:
+        trip_transfer_dict (nested dict): Format {integer trip id: {stop index: [(to integer trip id, to stop index)]}}.
+        trip_offsets (tuple): integer trip numbering. See gtfs_loader.build_trip_offsets.
+
+    Returns:
+        trip_transfer_dict (nested dict): Format {trip_id: {stop index: [(to trip id, to stop index)]}}.
+    """
+    return {str_tid(tid, trip_offsets): {s_idx: [(str_tid(to_tid, trip_offsets), to_idx) for to_tid, to_idx in transfers]
+                                         for s_idx, transfers in stop_transfers.items()} for tid, stop_transfers in trip_transfer_dict.items()}
+
+
+def int_trip_transfer_dict(trip_transfer_dict: dict, trip_offsets: tuple) -> dict:
+    """
+    Converts the trip-transfer dict from trip ids of format "route_trip" (saved by older builds) to integer trip ids.
+
+    Args:
+        trip_transfer_dict (nested dict): Format {trip_id: {stop index: [(to trip id, to stop index)]}}.
+        trip_offsets (tuple): integer trip numbering. See gtfs_loader.build_trip_offsets.
+
+    Returns:
+        trip_transfer_dict (nested dict): Format {integer trip id: {stop index: [(to integer trip id, to stop index)]}}.
+    """
+    return {int_tid(tid, trip_offsets): {s_idx: [(int_tid(to_tid, trip_offsets), to_idx) for to_tid, to_idx in transfers]
+                                         for s_idx, transfers in stop_transfers.items()} for tid, stop_transfers in trip_transfer_dict.items()}
+
+
+def _str_segments(Q: list, trip_offsets: tuple) -> list:
+    """
+    Returns a copy of trip segments (and their predecessor labels) with trip ids of format "route_trip". Used for printing itineraries.
+    """
+    return [[(segment[0], str_tid(segment[1], trip_offsets), segment[2], segment[3], segment[4],
+              (str_tid(segment[5][0], trip_offsets) if segment[5][0] != -1 else 0,) + tuple(segment[5][1:])) for segment in Q_round] for Q_round in Q]
+
+
+def _str_labels(J: dict, trip_offsets: tuple) -> dict:
+    """
+    Returns a copy of destination labels with trip ids of format "route_trip". Used for printing itineraries.
+    """
+    return {n: [label[0], label[1] if label[1] == 0 else (str_tid(label[1][0], trip_offsets),) + tuple(label[1][1:])] for n, label in J.items()}
+
+
+def get_transfers(trip_transfer_dict, tid: int, from_idx: int, to_idx: int) -> list:
+    """
+    Collects trip-transfers from stop indices from_idx, from_idx + 1, ..., to_idx - 1 of trip tid.
+
+    Args:
+        trip_transfer_dict (nested dict or TripTransferCSR): trip-transfers. Format {trip id: {stop index: [(to trip id, to stop index)]}}
+            (integer trip ids).
+        tid (int): integer trip id.
+        from_idx (int): first stop index (inclusive).
+        to_idx (int): last stop index (exclusive).
+
+    Returns:
+        connection_list (list): Format [(to trip id, to stop index)].
+
+    Examples:
+        >>> connection_list = get_transfers(trip_transfer_dict, 0, 1, 5)
+    """
+    if isinstance(trip_transfer_dict, TripTransferCSR):
+        return trip_transfer_dict.transfers_between(tid, from_idx, to_idx)
+    return [connection for from_stop_idx in range(from_idx, to_idx) for connection in trip_transfer_dict[tid][from_stop_idx]]
+
+
+def enqueue(connection_list: list, nextround: int, predecessor_label: tuple, R_t: dict, Q: list, trip_offsets: tuple) -> None:
     '''
     Main enqueue function used in TBTR to add trips segments to next round and update first reached stop of each trip.
 
     Args:
-        connection_list (list): list of connections to be added. Format: [(to_trip_id, to_trip_id_stop_index)].
+        connection_list (list): list of connections to be added. Format: [(to_trip_id, to_trip_id_stop_index)] with integer trip ids.
         nextround (int): next round/transfer number to which trip-segments are added.
         predecessor_label (tuple): used for backtracking journey ( To be developed ).
-        R_t (dict): dict with keys as trip id. Format {trip_id : first reached stop}.
+        R_t (numpy.ndarray): first reached stop of every trip, indexed by integer trip id. See initialize_R_t.
         Q (list): list of trips segments.
-        stoptimes_dict (dict): preprocessed dict. Format {route_id: [[trip_1], [trip_2]]}.
+        trip_offsets (tuple): integer trip numbering. See gtfs_loader.build_trip_offsets.
 
     Returns:
         None
     '''
+    _, route_last_trip, trip_route, trip_idx = trip_offsets
     for to_trip_id, to_trip_id_stop in connection_list:
         if to_trip_id_stop < R_t[to_trip_id]:
-            route, tid = [int(x) for x in to_trip_id.split("_")]
-            Q[nextround].append((to_trip_id_stop, to_trip_id, R_t[to_trip_id], route, tid, predecessor_label))
-            for x in range(tid, len(stoptimes_dict[route])):
-                new_tid = f"{route}_{x}"
-                # R_t[new_tid] = min(R_t[new_tid], to_trip_id_stop)
-                if R_t[new_tid] > to_trip_id_stop:
-                    R_t[new_tid] = to_trip_id_stop
+            route = trip_route[to_trip_id]
+            Q[nextround].append((to_trip_id_stop, to_trip_id, int(R_t[to_trip_id]), route, trip_idx[to_trip_id], predecessor_label))
+            later_trips = R_t[to_trip_id: route_last_trip[route]]
+            np.minimum(later_trips, to_trip_id_stop, out=later_trips)
 
 
 def update_label(label, no_of_transfer: int, predecessor_label: tuple, J: dict, MAX_TRANSFER: int) -> dict:
@@ -225,7 +353,8 @@ def update_label(label, no_of_transfer: int, predecessor_label: tuple, J: dict,
 
 
 def post_process_range(J: dict, Q: list, rounds_desti_reached: list, PRINT_ITINERARY: int, DESTINATION: int, SOURCE: int,
-                       footpath_dict: dict, stops_dict: dict, stoptimes_dict: dict, d_time, MAX_TRANSFER: int, trip_transfer_dict: dict) -> set:
+                       footpath_dict: dict, stops_dict: dict, stoptimes_dict: dict, d_time, MAX_TRANSFER: int, trip_transfer_dict: dict,
+                       trip_offsets: tuple) -> set:
     '''
     Contains all the post-processing features for rTBTR.
     Currently supported functionality:
@@ -244,20 +373,21 @@ def post_process_range(J: dict, Q: list, rounds_desti_reached: list, PRINT_ITINE
         D_TIME (pandas.datetime): departure time.
         MAX_TRANSFER (int): maximum transfer limit.
         trip_transfer_dict (nested dict): keys: id of trip we are transferring from, value: {stop number: list of tuples
+        trip_offsets (tuple): integer trip numbering. See gtfs_loader.build_trip_offsets.
 
     Returns:
-        necessory_trips (set): trips needed to cover pareto-optimal journeys.
+        necessory_trips (set): integer ids of trips needed to cover pareto-optimal journeys.
     '''
     rounds_desti_reached = list(set(rounds_desti_reached))
     if PRINT_ITINERARY == 1:
         _print_tbtr_journey(J, Q, DESTINATION, SOURCE, footpath_dict, stops_dict, stoptimes_dict, d_time, MAX_TRANSFER, trip_transfer_dict,
-                            rounds_desti_reached)
+                            rounds_desti_reached, trip_offsets)
     necessory_trips = []
     for transfer_needed in reversed(rounds_desti_reached):
         no_of_transfer = transfer_needed
         current_trip = J[transfer_needed][1][0]
         journey = []
-        while current_trip != 0:
+        while current_trip != -1:
             journey.append(current_trip)
             current_trip = [x for x in Q[no_of_transfer] if x[1] == current_trip][-1][-1][0]
             no_of_transfer = no_of_transfer - 1
@@ -265,58 +395,54 @@ def post_process_range(J: dict, Q: list, rounds_desti_reached: list, PRINT_ITINE
     return set(necessory_trips)
 
 
-def initialize_from_source_range(dep_details: list, MAX_TRANSFER: int, stoptimes_dict: dict, R_t: dict) -> list:
+def initialize_from_source_range(dep_details: list, MAX_TRANSFER: int, trip_offsets: tuple, R_t: dict) -> list:
     '''
     Initialize trips segments from source in rTBTR
 
     Args:
         dep_details (list): list of format [trip id, departure time, source index]
         MAX_TRANSFER (int): maximum transfer limit.
-        stoptimes_dict (dict): preprocessed dict. Format {route_id: [[trip_1], [trip_2]]}.
-        R_t (nested dict): Nested_Dict with primary keys as trip id and secondary keys as number of transfers. Format {trip_id: {[round]: first reached stop}}
+        trip_offsets (tuple): integer trip numbering. See gtfs_loader.build_trip_offsets.
+        R_t (numpy.ndarray): first reached stop of every trip in every round. Format R_t[round, integer trip id]. See initialize_R_t.
 
     Returns:
         Q (list): list of trips segments
     '''
     Q = [[] for x in range(MAX_TRANSFER + 2)]
-    route, trip_idx = [int(x) for x in dep_details[0].split("_")]
     stop_index = dep_details[2]
-    # _enqueue_range1(f'{route}_{trip_idx}', stop_index, n, (0, 0), R_t, Q, stoptimes_dict, MAX_TRANSFER)
-    connection_list = [(f'{route}_{trip_idx}', stop_index)]
-    enqueue_range(connection_list, 1, (0, 0), R_t, Q, stoptimes_dict, MAX_TRANSFER)
+    connection_list = [(int_tid(dep_details[0], trip_offsets), stop_index)]
+    enqueue_range(connection_list, 1, (-1, 0), R_t, Q, trip_offsets, MAX_TRANSFER)
     return Q
 
 
 def enqueue_range(connection_list: list, nextround: int, predecessor_label: tuple, R_t: dict, Q: list,
-                  stoptimes_dict: dict, MAX_TRANSFER: int) -> None:
+                  trip_offsets: tuple, MAX_TRANSFER: int) -> None:
     '''
     Adds trips-segments to next round and update R_t. Used in range queries
 
     Args:
-        connection_list (list): list of connections to be added. Format: [(to_trip_id, to_trip_id_stop_index)].
+        connection_list (list): list of connections to be added. Format: [(to_trip_id, to_trip_id_stop_index)] with integer trip ids.
         nextround (int): next round/transfer number to which trip-segments are added
         predecessor_label (tuple): predecessor_label for backtracking journey ( To be developed ).
-        R_t (nested dict): Nested_Dict with primary keys as trip id and secondary keys as number of transfers. Format {trip_id: {[round]: first reached stop}}
+        R_t (numpy.ndarray): first reached stop of every trip in every round. Format R_t[round, integer trip id]. See initialize_R_t.
         Q (list): list of trips segments
-        stoptimes_dict (dict): preprocessed dict. Format {route_id: [[trip_1], [trip_2]]}.
+        trip_offsets (tuple): integer trip numbering. See gtfs_loader.build_trip_offsets.
         MAX_TRANSFER (int): maximum transfer limit.
 
     Returns: None
     '''
+    _, route_last_trip, trip_route, trip_idx = trip_offsets
     for to_trip_id, to_trip_id_stop in connection_list:
-        if to_trip_id_stop < R_t[nextround][to_trip_id]:
-            route, tid = [int(x) for x in to_trip_id.split("_")]
-            Q[nextround].append((to_trip_id_stop, to_trip_id, R_t[nextround][to_trip_id], route, tid, predecessor_label))
-            for x in range(tid, len(stoptimes_dict[route]) + 1):
-                for r in range(nextround, MAX_TRANSFER + 1):
-                    new_tid = f"{route}_{x}"
-                    if R_t[r][new_tid] > to_trip_id_stop:
-                        R_t[r][new_tid] = to_trip_id_stop
+        if to_trip_id_stop < R_t[nextround, to_trip_id]:
+            route = trip_route[to_trip_id]
+            Q[nextround].append((to_trip_id_stop, to_trip_id, int(R_t[nextround, to_trip_id]), route, trip_idx[to_trip_id], predecessor_label))
+            later_trips = R_t[nextround: MAX_TRANSFER + 1, to_trip_id: route_last_trip[route]]
+            np.minimum(later_trips, to_trip_id_stop, out=later_trips)
 
 
 def post_process_range_onemany(J: dict, Q: list, rounds_desti_reached: list, PRINT_ITINERARY: int, desti: int,
                                SOURCE: int, footpath_dict: dict, stops_dict: dict, stoptimes_dict: dict, d_time,
-                               MAX_TRANSFER: int, trip_transfer_dict: dict) -> set:
+                               MAX_TRANSFER: int, trip_transfer_dict: dict, trip_offsets: tuple) -> set:
     '''
     Contains all the post-processing features for One-To-Many rTBTR.
     Currently supported functionality:
@@ -335,20 +461,22 @@ def post_process_range_onemany(J: dict, Q: list, rounds_desti_reached: list, PRI
         d_time (pandas.datetime): departure time.
         MAX_TRANSFER (int): maximum transfer limit.
         trip_transfer_dict (nested dict): keys: id of trip we are transferring from, value: {stop number: list of tuples
+        trip_offsets (tuple): integer trip numbering. See gtfs_loader.build_trip_offsets.
 
     Returns:
-        TBTR_out (set): Trips needed to cover pareto-optimal journeys.
+        TBTR_out (set): integer ids of trips needed to cover pareto-optimal journeys.
 
     '''
     rounds_desti_reached = list(set(rounds_desti_reached))
     if PRINT_ITINERARY == 1:
-        _print_tbtr_journey_otm(J, Q, desti, SOURCE, footpath_dict, stops_dict, stoptimes_dict, d_time, MAX_TRANSFER, trip_transfer_dict, rounds_desti_reached)
+        _print_tbtr_journey_otm(J, Q, desti, SOURCE, footpath_dict, stops_dict, stoptimes_dict, d_time, MAX_TRANSFER, trip_transfer_dict, rounds_desti_reached,
+                                trip_offsets)
     TBTR_out = []
     for transfer_needed in reversed(rounds_desti_reached):
         no_of_transfer = transfer_needed
         current_trip = J[desti][transfer_needed][1][0]
         journey = []
-        while current_trip != 0:
+        while current_trip != -1:
             journey.append(current_trip)
             current_trip = [x for x in Q[no_of_transfer] if x[1] == current_trip][-1][-1][0]
             no_of_transfer = no_of_transfer - 1
@@ -357,7 +485,7 @@ def post_process_range_onemany(J: dict, Q: list, rounds_desti_reached: list, PRI
 
 
 def post_process(J: dict, Q: list, DESTINATION: int, SOURCE: int, footpath_dict: dict, stops_dict: dict, stoptimes_dict: dict,
-                 PRINT_ITINERARY: int, D_TIME, MAX_TRANSFER: int, trip_transfer_dict: dict) -> list:
+                 PRINT_ITINERARY: int, D_TIME, MAX_TRANSFER: int, trip_transfer_dict: dict, trip_offsets: tuple) -> list:
     '''
     Contains post-processing features for TBTR.
     Currently supported functionality:
@@ -375,6 +503,7 @@ def post_process(J: dict, Q: list, DESTINATION: int, SOURCE: int, footpath_dict:
         D_TIME (pandas.datetime): departure time.
         MAX_TRANSFER (int): maximum transfer limit.
         trip_transfer_dict (nested dict): keys: id of trip we are transferring from, value: {stop number: list of tuples
+        trip_offsets (tuple): integer trip numbering. See gtfs_loader.build_trip_offsets.
 
     Returns:
         TBTR_out (list): pareto-optimal arrival timestamps.
@@ -387,7 +516,7 @@ def post_process(J: dict, Q: list, DESTINATION: int, SOURCE: int, footpath_dict:
     else:
         if PRINT_ITINERARY == 1:
             _print_tbtr_journey(J, Q, DESTINATION, SOURCE, footpath_dict, stops_dict, stoptimes_dict, D_TIME, MAX_TRANSFER, trip_transfer_dict,
-                                rounds_desti_reached)
+                                rounds_desti_reached, trip_offsets)
         TBTR_out = []
         for x in reversed(rounds_desti_reached):
             TBTR_out.append(J[x][0])
@@ -395,7 +524,7 @@ def post_process(J: dict, Q: list, DESTINATION: int, SOURCE: int, footpath_dict:
 
 
 def _print_tbtr_journey(J: dict, Q: list, DESTINATION: int, SOURCE: int, footpath_dict: dict, stops_dict: dict, stoptimes_dict: dict,
-                        D_TIME, MAX_TRANSFER: int, trip_transfer_dict: dict, rounds_desti_reached: list) -> None:
+                        D_TIME, MAX_TRANSFER: int, trip_transfer_dict: dict, rounds_desti_reached: list, trip_offsets: tuple) -> None:
     """
     Prints the output of TBTR
 
@@ -411,16 +540,18 @@ def _print_tbtr_journey(J: dict, Q: list, DESTINATION: int, SOURCE: int, footpat
         MAX_TRANSFER (int): maximum transfer limit.
         trip_transfer_dict (nested dict): keys: id of trip we are transferring from, value: {stop number: list of tuples
         rounds_desti_reached (list): Rounds in which DESTINATION is reached.
+        trip_offsets (tuple): integer trip numbering. See gtfs_loader.build_trip_offsets.
 
     Returns:
         None
 
     Examples:
-        >>> _print_tbtr_journey(J, Q, DESTINATION, SOURCE, footpath_dict, stops_dict, stoptimes_dict, D_TIME, MAX_TRANSFER, trip_transfer_dict, rounds_desti_reached)
+        >>> _print_tbtr_journey(J, Q, DESTINATION, SOURCE, footpath_dict, stops_dict, stoptimes_dict, D_TIME, MAX_TRANSFER, trip_transfer_dict, rounds_desti_reached, trip_offsets)
 
     TODO:
         Build a better backtracking system for TBTR
     """
+    J, Q = _str_labels(J, trip_offsets), _str_segments(Q, trip_offsets)
     for x in reversed(rounds_desti_reached):
         round_no = x
         journey = []
@@ -433,11 +564,11 @@ def _print_tbtr_journey(J: dict, Q: list, DESTINATION: int, SOURCE: int, footpat
         from_stop_list = []
         for id, t_transfer in enumerate(journey[:-1]):
             from_Stop_onwards = journey[id + 1][2]
-            for from_stop, trasnsfer_list in trip_transfer_dict[t_transfer[0]].items():
+            for from_stop, trasnsfer_list in trip_transfer_dict[int_tid(t_transfer[0], trip_offsets)].items():
                 if from_stop < from_Stop_onwards:
                     continue
                 else:
-                    if (t_transfer[1], t_transfer[2]) in trasnsfer_list:
+                    if (int_tid(t_transfer[1], trip_offsets), t_transfer[2]) in trasnsfer_list:
                         from_stop_list.append(from_stop)
         journey_final = [(journey[counter][0], x, journey[counter][1], journey[counter][2]) for counter, x in enumerate(from_stop_list)]
         # from source
@@ -559,15 +690,15 @@ def _print_tbtr_journey(J: dict, Q: list, DESTINATION: int, SOURCE: int, footpat
                             [leg[2], stoptimes_dict[trip_route][numb][fromstopidx], stoptimes_dict[trip_route][numb][journey_final_copy[c + 1][1]]])
         for leg in journey_final:
             if leg[0] == "walk":
-                print(f"from {leg[1]} walk till  {leg[2]} for {leg[3].total_seconds()} seconds")
+                print(f"from {leg[1]} walk till  {leg[2]} for {duration_seconds(leg[3])} seconds")
             else:
-                print(f"from {leg[1][0]} board at {leg[1][1].time()} and get down on {leg[2][0]} at {leg[2][1].time()} along {leg[0]}")
+                print(f"from {leg[1][0]} board at {format_clock(leg[1][1])} and get down on {leg[2][0]} at {format_clock(leg[2][1])} along {leg[0]}")
         print("####################################")
     return None
 
 
 def _print_tbtr_journey_otm(J: dict, Q: list, DESTINATION: int, SOURCE: int, footpath_dict: dict, stops_dict: dict, stoptimes_dict: dict,
-                            D_TIME, MAX_TRANSFER: int, trip_transfer_dict: dict, rounds_desti_reached: list) -> None:
+                            D_TIME, MAX_TRANSFER: int, trip_transfer_dict: dict, rounds_desti_reached: list, trip_offsets: tuple) -> None:
     """
     Prints the output of TBTR
 
@@ -583,16 +714,18 @@ def _print_tbtr_journey_otm(J: dict, Q: list, DESTINATION: int, SOURCE: int, foo
         MAX_TRANSFER (int): maximum transfer limit.
         trip_transfer_dict (nested dict): keys: id of trip we are transferring from, value: {stop number: list of tuples
         rounds_desti_reached (list): Rounds in which DESTINATION is reached.
+        trip_offsets (tuple): integer trip numbering. See gtfs_loader.build_trip_offsets.
 
     Returns:
         None
 
     Examples:
-        >>> _print_tbtr_journey(J, Q, DESTINATION, SOURCE, footpath_dict, stops_dict, stoptimes_dict, D_TIME, MAX_TRANSFER, trip_transfer_dict, rounds_desti_reached)
+        >>> _print_tbtr_journey(J, Q, DESTINATION, SOURCE, footpath_dict, stops_dict, stoptimes_dict, D_TIME, MAX_TRANSFER, trip_transfer_dict, rounds_desti_reached, trip_offsets)
 
     TODO:
         Build a better backtracking system for TBTR
     """
+    J, Q = {DESTINATION: _str_labels(J[DESTINATION], trip_offsets)}, _str_segments(Q, trip_offsets)
     for x in reversed(rounds_desti_reached):
         round_no = x
         journey = []
@@ -605,11 +738,11 @@ def _print_tbtr_journey_otm(J: dict, Q: list, DESTINATION: int, SOURCE: int, foo
         from_stop_list = []
         for id, t_transfer in enumerate(journey[:-1]):
             from_Stop_onwards = journey[id + 1][2]
-            for from_stop, trasnsfer_list in trip_transfer_dict[t_transfer[0]].items():
+            for from_stop, trasnsfer_list in trip_transfer_dict[int_tid(t_transfer[0], trip_offsets)].items():
                 if from_stop < from_Stop_onwards:
                     continue
                 else:
-                    if (t_transfer[1], t_transfer[2]) in trasnsfer_list:
+                    if (int_tid(t_transfer[1], trip_offsets), t_transfer[2]) in trasnsfer_list:
                         from_stop_list.append(from_stop)
         journey_final = [(journey[counter][0], x, journey[counter][1], journey[counter][2]) for counter, x in enumerate(from_stop_list)]
         # from source
@@ -731,8 +864,8 @@ def _print_tbtr_journey_otm(J: dict, Q: list, DESTINATION: int, SOURCE: int, foo
                             [leg[2], stoptimes_dict[trip_route][numb][fromstopidx], stoptimes_dict[trip_route][numb][journey_final_copy[c + 1][1]]])
         for leg in journey_final:
             if leg[0] == "walk":
-                print(f"from {leg[1]} walk till  {leg[2]} for {leg[3].total_seconds()} seconds")
+                print(f"from {leg[1]} walk till  {leg[2]} for {duration_seconds(leg[3])} seconds")
             else:
-                print(f"from {leg[1][0]} board at {leg[1][1].time()} and get down on {leg[2][0]} at {leg[2][1].time()} along {leg[0]}")
+                print(f"from {leg[1][0]} board at {format_clock(leg[1][1])} and get down on {leg[2][0]} at {format_clock(leg[2][1])} along {leg[0]}")
         print("####################################")
     return None
@@ -2,18 +2,19 @@
 Module contains TBTR implementation
 """
 from Algorithms.TBTR.TBTR_functions import *
+from gtfs_loader import build_trip_offsets
 
 
 def tbtr(SOURCE: int, DESTINATION: int, D_TIME, MAX_TRANSFER: int, WALKING_FROM_SOURCE: int, PRINT_ITINERARY: int,
          routes_by_stop_dict: dict, stops_dict: dict, stoptimes_dict: dict, footpath_dict: dict, idx_by_route_stop_dict: dict,
-         trip_transfer_dict: dict, trip_set: set) -> list:
+         trip_transfer_dict: dict, trip_set: set, trip_offsets: tuple = None) -> list:
     """
     Standard TBTR implementation.
 
     Args:
         SOURCE (int): stop id of source stop.
         DESTINATION (int): stop id of destination stop.
-        D_TIME (pandas.datetime): departure time.
+        D_TIME (pandas.datetime or int): departure time. int means seconds since the service day (see gtfs_loader.load_stoptimes_array).
         MAX_TRANSFER (int): maximum transfer limit.
         WALKING_FROM_SOURCE (int): 1 or 0. 1 means walking from SOURCE is allowed.
         PRINT_ITINERARY (int): 1 or 0. 1 means print complete path.
@@ -22,9 +23,10 @@ def tbtr(SOURCE: int, DESTINATION: int, D_TIME, MAX_TRANSFER: int, WALKING_FROM_
         stoptimes_dict (dict): preprocessed dict. Format {route_id: [[trip_1], [trip_2]]}.
         footpath_dict (dict): preprocessed dict. Format {from_stop_id: [(to_stop_id, footpath_time)]}.
         idx_by_route_stop_dict (dict): preprocessed dict. Format {(route id, stop id): stop index in route}.
-        trip_transfer_dict (nested dict): keys: id of trip we are transferring from, value: {stop number: list of tuples
-        of form (id of trip we are transferring to, stop number)}
-        trip_set (set): set of trip ids from which trip-transfers are available.
+        trip_transfer_dict (nested dict): keys: integer id of trip we are transferring from, value: {stop number: list of tuples
+        of form (integer id of trip we are transferring to, stop number)}. Can also be a TripTransferCSR (see load_TBTR with USE_CSR=1).
+        trip_set (set): set of integer trip ids from which trip-transfers are available. With TripTransferCSR, pass the same object.
+        trip_offsets (tuple): integer trip numbering (see gtfs_loader.build_trip_offsets). Built from stoptimes_dict if None.
 
     Returns:
         out (list): List of pareto-optimal arrival Timestamps
@@ -37,39 +39,38 @@ def tbtr(SOURCE: int, DESTINATION: int, D_TIME, MAX_TRANSFER: int, WALKING_FROM_
         RAPTOR, HypTBTR
 
     """
+    if trip_offsets is None:
+        trip_offsets = build_trip_offsets(stoptimes_dict)
     out = []
-    J = initialize_tbtr(MAX_TRANSFER)
-    L = initialize_from_desti(routes_by_stop_dict, stops_dict, DESTINATION, footpath_dict, idx_by_route_stop_dict)
+    _, zero_time = get_time_constants(D_TIME)
+    J = initialize_tbtr(MAX_TRANSFER, D_TIME)
+    L = initialize_from_desti(routes_by_stop_dict, stops_dict, DESTINATION, footpath_dict, idx_by_route_stop_dict, D_TIME)
     R_t, Q = initialize_from_source(footpath_dict, SOURCE, routes_by_stop_dict, stops_dict, stoptimes_dict, D_TIME,
-                                        MAX_TRANSFER, WALKING_FROM_SOURCE, idx_by_route_stop_dict)
+                                        MAX_TRANSFER, WALKING_FROM_SOURCE, idx_by_route_stop_dict, trip_offsets)
     n = 1
     while n <= MAX_TRANSFER:
         for counter, trip_segment in enumerate(Q[n]):
             from_stop, tid, to_stop, trip_route, tid_idx = trip_segment[0: 5]
-            trip = stoptimes_dict[trip_route][tid_idx][from_stop:to_stop]
+            route_trip = stoptimes_dict[trip_route][tid_idx]
+            trip = route_trip[from_stop:to_stop]
             try:
-                L[trip_route]
-                stop_list, _ = zip(*trip)
                 for last_leg in L[trip_route]:
-                    idx = [x[0] for x in enumerate(stop_list) if x[1] == last_leg[2]]
-                    if idx and from_stop < last_leg[0] and trip[idx[0]][1] + last_leg[1] < J[n][0]:
-                        if last_leg[1] == pd.to_timedelta(0, unit="seconds"):
+                    if from_stop < last_leg[0] < to_stop and route_trip[last_leg[0]][1] + last_leg[1] < J[n][0]:
+                        if last_leg[1] == zero_time:
                             walking = (0, 0)
                         else:
                             walking = (1, stops_dict[trip_route][last_leg[0]])
-                        J = update_label(trip[idx[0]][1] + last_leg[1], n, (tid, walking, counter), J, MAX_TRANSFER)
+                        J = update_label(route_trip[last_leg[0]][1] + last_leg[1], n, (tid, walking, counter), J, MAX_TRANSFER)
             except KeyError:
                 pass
             try:
                 if tid in trip_set and trip[1][1] < J[n][0]:
-                    connection_list = [connection for from_stop_idx, transfer_stop_id in
-                                       enumerate(trip[1:], from_stop + 1)
-                                       for connection in trip_transfer_dict[tid][from_stop_idx]]
-                    enqueue(connection_list, n + 1, (tid, counter, 0), R_t, Q, stoptimes_dict)
+                    connection_list = get_transfers(trip_transfer_dict, tid, from_stop + 1, from_stop + len(trip))
+                    enqueue(connection_list, n + 1, (tid, counter, 0), R_t, Q, trip_offsets)
             except IndexError:
                 pass
         n = n + 1
     TBTR_out = post_process(J, Q, DESTINATION, SOURCE, footpath_dict, stops_dict, stoptimes_dict, PRINT_ITINERARY, D_TIME,
-                            MAX_TRANSFER, trip_transfer_dict)
+                            MAX_TRANSFER, trip_transfer_dict, trip_offsets)
     out.append(TBTR_out)
     return out
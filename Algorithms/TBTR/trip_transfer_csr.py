@@ -0,0 +1,78 @@
+"""
+Module contains a memory-mapped (CSR) version of the TBTR trip-transfer dict.
+"""
+
+
+class TripTransferCSR:
+    """
+    Read-only view on the trip-transfers saved by dict_builder_functions.build_save_trip_transfer_csr. Arrays are memory-mapped, so
+    nothing is deserialized when loading and processes on one host share the page cache.
+
+    Integer trip id t is the t-th trip when routes are sorted by id (see dict_builder_functions.build_trip_index and
+    gtfs_loader.build_trip_offsets). Transfers from stop index i of trip t are stored in slot trip_time_offsets[t] + i. Slots of a trip
+    are contiguous, so transfers from a range of stops of a trip are a single slice of transfer_trip/transfer_stop_idx.
+
+    The object supports the same lookups as the trip-transfer dict and trip_set: tid in trip_transfer_csr, trip_transfer_csr[tid][stop
+    index] and trip_transfer_csr[tid].items(), with integer trip ids.
+
+    Args:
+        arrays (dict): arrays of the CSR file. See gtfs_loader.load_array_file.
+
+    Examples:
+        >>> trip_transfer_dict, trip_set = load_TBTR('anaheim', USE_CSR=1)
+    """
+
+    def __init__(self, arrays: dict):
+        self.trip_time_offsets = arrays["trip_time_offsets"]
+        self.transfer_offsets = arrays["transfer_offsets"]
+        self.transfer_trip = arrays["transfer_trip"]
+        self.transfer_stop_idx = arrays["transfer_stop_idx"]
+        self.trip_count = len(self.trip_time_offsets) - 1
+
+    def transfers_between(self, tid: int, from_idx: int, to_idx: int) -> list:
+        """
+        Returns all transfers from stop indices from_idx, from_idx + 1, ..., to_idx - 1 of trip tid.
+
+        Args:
+            tid (int): integer trip id.
+            from_idx (int): first stop index (inclusive).
+            to_idx (int): last stop index (exclusive).
+
+        Returns:
+            connection_list (list): Format [(to integer trip id, to stop index)].
+        """
+        base = int(self.trip_time_offsets[tid])
+        start, end = self.transfer_offsets[base + from_idx], self.transfer_offsets[base + to_idx]
+        return list(zip(self.transfer_trip[start:end].tolist(), self.transfer_stop_idx[start:end].tolist()))
+
+    def __contains__(self, tid: int) -> bool:
+        if not 0 <= tid < self.trip_count:
+            return False
+        return bool(self.transfer_offsets[self.trip_time_offsets[tid]] != self.transfer_offsets[self.trip_time_offsets[tid + 1]])
+
+    def __getitem__(self, tid: int):
+        if not 0 <= tid < self.trip_count:
+            raise KeyError(tid)
+        return _TripTransfers(self, tid)
+
+
+class _TripTransfers:
+    """
+    Transfers of a single trip. Behaves like trip_transfer_dict[tid], i.e., {stop index: [(to integer trip id, to stop index)]}.
+    """
+
+    def __init__(self, trip_transfer_csr: TripTransferCSR, tid: int):
+        self.trip_transfer_csr = trip_transfer_csr
+        self.tid = tid
+        self.stop_count = int(trip_transfer_csr.trip_time_offsets[tid + 1] - trip_transfer_csr.trip_time_offsets[tid])
+
+    def __getitem__(self, stop_idx: int) -> list:
+        if not 0 <= stop_idx < self.stop_count:
+            raise KeyError(stop_idx)
+        return self.trip_transfer_csr.transfers_between(self.tid, stop_idx, stop_idx + 1)
+
+    def keys(self):
+        return range(self.stop_count)
+
+    def items(self):
+        return ((stop_idx, self[stop_idx]) for stop_idx in range(self.stop_count))
@@ -5,31 +5,36 @@ Implementation of Dijkstra's algorithm on a Time expanded Graph.
 from Algorithms.TIME_EXPANDED_DIJKSTRA.TE_DIJ_functions import *
 
 
-def custom_dij(SOURCE: int, DESTINATION: int, D_TIME, G, stops_group, stopevent_mapping: dict, stop_times_file) -> tuple:
+def custom_dij(SOURCE: int, DESTINATION: int, D_TIME, G, stop_events: dict) -> tuple:
     """
-    Custom dijkstra's algorithm. This functions builds on top of networkx implementation of Dijkstra's algorithm.
+    Custom dijkstra's algorithm. On the CSR graph (see load_TE_graph), csr_dijkstra_multitarget is used. On a networkx graph
+    (fallback), it builds on top of networkx implementation of Dijkstra's algorithm.
 
     Args:
         SOURCE (int): stop id of source stop.
         DESTINATION (int): stop id of destination stop.
         D_TIME (pandas.datetime): departure time.
-        G: Time expanded graph. Foramt: Networkx Digraph.
-        stops_group: stoptimes file group by stopid
-        stop_times_file (pandas.dataframe): stop_times.txt file in GTFS.
-        stopevent_mapping (dict): Format: {sequence_no: (stop_id, stop event)}
+        G (dict): Time expanded graph in CSR format. Keys: indptr, indices, weights. A Networkx Digraph is also accepted.
+        stop_events (dict): per-stop sorted event arrays. See miscellaneous_func.build_stop_events.
 
     Returns:
         tuple
 
     Examples:
-        >>> output = custom_dij(36, 52, pd.to_datetime('2022-06-30 05:41:00'), G, stops_group, stopevent_mapping, stop_times_file)
+        >>> output = custom_dij(36, 52, pd.to_datetime('2022-06-30 05:41:00'), G, stop_events)
 
     """
-    source_node = get_sourcenode(stops_group, SOURCE, D_TIME, stopevent_mapping)
-    idx, target_list = get_possible_targets(stops_group, DESTINATION, D_TIME, stopevent_mapping)
-
-    weight = weight_function(G, 'weight')
-    out_dist = edited_dijkstra_multitarget(G, source_node, target_list, weight)
-
-    stop_reached, time_reached = post_process_TE_DIJ(out_dist, target_list, stop_times_file, D_TIME, idx)
+    source_node = get_sourcenode(stop_events, SOURCE, D_TIME)
+    target_times, target_list = get_possible_targets(stop_events, DESTINATION, D_TIME)
+    if source_node is None or not target_list:
+        print("No path exists")
+        return None, None
+
+    if isinstance(G, dict):
+        out_dist = csr_dijkstra_multitarget(G, source_node, target_list)
+    else:
+        weight = weight_function(G, 'weight')
+        out_dist = edited_dijkstra_multitarget(G, source_node, target_list, weight)
+
+    stop_reached, time_reached = post_process_TE_DIJ(out_dist, target_list, DESTINATION, D_TIME, target_times)
     return stop_reached, time_reached
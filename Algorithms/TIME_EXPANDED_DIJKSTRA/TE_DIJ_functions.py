@@ -1,57 +1,76 @@
 """
 This module contains functions related to Time-expanded Dijkstra's algorithm
 """
+import heapq
 from itertools import count
 
 import pandas as pd
 
 
-def get_sourcenode(stops_group, SOURCE: int, D_TIME, stopevent_mapping: dict) -> int:
+def get_stop_events(stop_events: dict, stop: int, D_TIME) -> tuple:
+    """
+    Binary search on the sorted event arrays of a stop. Returns the events of stop after D_TIME.
+
+    Args:
+        stop_events (dict): per-stop sorted event arrays. See miscellaneous_func.build_stop_events.
+        stop (int): stop id.
+        D_TIME (pandas.datetime): departure time.
+
+    Returns:
+        event_node (numpy.ndarray): node ids (in TE graph) of the events after D_TIME, sorted by arrival time.
+        event_time (numpy.ndarray): arrival times (nanoseconds since epoch) of these events.
+
+    Examples:
+        >>> event_node, event_time = get_stop_events(stop_events, 36, pd.to_datetime('2019-06-10 00:00:00'))
+    """
+    stop_offsets = stop_events["stop_offsets"]
+    if not 0 <= stop < len(stop_offsets) - 1:
+        return stop_events["event_node"][:0], stop_events["event_time"][:0]
+    start, end = int(stop_offsets[stop]), int(stop_offsets[stop + 1])
+    start = start + int(stop_events["event_time"][start:end].searchsorted(pd.Timestamp(D_TIME).value, side="right"))
+    return stop_events["event_node"][start:end], stop_events["event_time"][start:end]
+
+
+def get_sourcenode(stop_events: dict, SOURCE: int, D_TIME) -> int:
     """
     Using the earliest arrival event from the source node (after D_TIME), find the ID of the node in TE graph.
     This serves as source stop for Dijkstra's algorithm.
 
     Args:
-        stops_group: pandas group object on stoptimes file using stop id column.
+        stop_events (dict): per-stop sorted event arrays. See miscellaneous_func.build_stop_events.
         SOURCE (int): stop id of source stop.
         D_TIME (pandas.datetime): departure time.
-        stopevent_mapping (dict): mapping dictionary. Format: {(stop id, arrival time): new node id}
 
     Returns:
-        source_node (int): Source node Id corresponding to TE graph
+        source_node (int): Source node Id corresponding to TE graph. None if there is no event after D_TIME.
 
     Examples:
-        >>> source_node = get_sourcenode(stops_group, 36, pd.to_datetime('2019-06-10 00:00:00'), stopevent_mapping)
+        >>> source_node = get_sourcenode(stop_events, 36, pd.to_datetime('2019-06-10 00:00:00'))
 
     """
-    source_node_db = stops_group.get_group(SOURCE).sort_values(by='arrival_time')
-    source_node = tuple(source_node_db[source_node_db.arrival_time > D_TIME][['stop_id', 'arrival_time']].iloc[0])
-    source_node = stopevent_mapping[source_node]
-    return source_node
+    event_node, _ = get_stop_events(stop_events, SOURCE, D_TIME)
+    return int(event_node[0]) if len(event_node) else None
 
 
-def get_possible_targets(stops_group, DESTINATION: int, D_TIME, stopevent_mapping: dict) -> tuple:
+def get_possible_targets(stop_events: dict, DESTINATION: int, D_TIME) -> tuple:
     """
     Get the list of events from DESTINATION stop Id after D_TIME. These serve as possible target nodes for Dijkstra's algorithm
 
     Args:
-        stops_group: pandas group object on stoptimes file using stop id column.
+        stop_events (dict): per-stop sorted event arrays. See miscellaneous_func.build_stop_events.
         DESTINATION (int): stop id of destination stop.
         D_TIME (pandas.datetime): departure time.
-        stopevent_mapping (dict): mapping dictionary. Format: {(stop id, arrival time): new node id}
 
     Returns:
-        idx (tuple): tuple containing Indexes of the reachable event of target node in stoptimes file
+        target_times (tuple): tuple containing arrival times (nanoseconds since epoch) of the reachable events of target node
         target_list (tuple): tuple containing node Id corresponding reachable target nodes of to TE graph
 
     Examples:
-        >>> idx, target_list = get_possible_targets(stops_group, 52, pd.to_datetime('2019-06-10 00:00:00'), stopevent_mapping)
+        >>> target_times, target_list = get_possible_targets(stop_events, 52, pd.to_datetime('2019-06-10 00:00:00'))
 
     """
-    desti_nodes = stops_group.get_group(DESTINATION).sort_values(by='arrival_time')
-    desti_nodes1 = desti_nodes[desti_nodes.arrival_time > D_TIME][['stop_id', 'arrival_time']].drop_duplicates()
-    idx, target_list = zip(*[(idx, stopevent_mapping[tuple(x)]) for idx, x in desti_nodes1.iterrows()])
-    return idx, target_list
+    event_node, event_time = get_stop_events(stop_events, DESTINATION, D_TIME)
+    return tuple(event_time.tolist()), tuple(event_node.tolist())
 
 
 def _siftdown(heap, startpos, pos):
@@ -167,6 +186,43 @@ def edited_dijkstra_multitarget(G, SOURCE: int, target_list: tuple, weight) -> d
     return dist
 
 
+def csr_dijkstra_multitarget(G: dict, SOURCE: int, target_list: tuple) -> dict:
+    """
+    Dijkstra's algorithm on the CSR time expanded graph (see build_time_expanded.build_csr_graph) with a binary heap (heapq).
+    Search is halted when the first node of target_list is settled.
+
+    Args:
+        G (dict): CSR graph. Keys: indptr, indices, weights. Out-edges of node v are indices[indptr[v]: indptr[v + 1]] with matching weights.
+        SOURCE (int): source node id.
+        target_list (tuple): node ids of possible target nodes.
+
+    Returns:
+        dist (dict): Format {node id: distance from SOURCE} for all settled nodes.
+
+    Examples:
+        >>> dist = csr_dijkstra_multitarget(G, source_node, target_list)
+    """
+    indptr, indices, weights = G["indptr"], G["indices"], G["weights"]
+    targets = set(target_list)
+    dist = {}
+    seen = {SOURCE: 0}
+    fringe = [(0, SOURCE)]
+    while fringe:
+        d, v = heapq.heappop(fringe)
+        if v in dist:
+            continue
+        dist[v] = d
+        if v in targets:
+            break
+        start, end = int(indptr[v]), int(indptr[v + 1])
+        for u, cost in zip(indices[start:end].tolist(), weights[start:end].tolist()):
+            vu_dist = d + cost
+            if u not in dist and (u not in seen or vu_dist < seen[u]):
+                seen[u] = vu_dist
+                heapq.heappush(fringe, (vu_dist, u))
+    return dist
+
+
 def weight_function(G, weight):
     """
     (Borrowed from NetworkX)
@@ -209,7 +265,7 @@ def weight_function(G, weight):
     return lambda u, v, data: data.get(weight, 1)
 
 
-def post_process_TE_DIJ(out_dist: dict, target_list: tuple, stop_times_file, D_TIME, idx: tuple) -> tuple:
+def post_process_TE_DIJ(out_dist: dict, target_list: tuple, DESTINATION: int, D_TIME, target_times: tuple) -> tuple:
     """
     Post processing for TE_DIJ
 
@@ -217,16 +273,16 @@ def post_process_TE_DIJ(out_dist: dict, target_list: tuple, stop_times_file, D_T
 
         out_dist (dict): Distance dictionary of format {node id : arrival time}
         target_list (tuple): tuple containing node Id corresponding reachable target nodes of to TE graph
-        stop_times_file (pandas.dataframe): stop_times.txt file in GTFS.
+        DESTINATION (int): stop id of destination stop.
         D_TIME (pandas.datetime): departure time.
-        idx (tuple): tuple containing Indexes of the reachable event of target node in stoptimes file
+        target_times (tuple): tuple containing arrival times (nanoseconds since epoch) of the nodes in target_list
 
     Returns:
         stop_reached (tuple): Stop event that is reached
         time_reached (pandas.timestamp): arrival time at the stop event
 
     Examples:
-        >>> stop_reached, time_reached = post_process_TE_DIJ(out_dist, target_list, stop_times_file, pd.to_datetime('2019-06-10 00:00:00'), idx)
+        >>> stop_reached, time_reached = post_process_TE_DIJ(out_dist, target_list, 52, pd.to_datetime('2019-06-10 00:00:00'), target_times)
 
     """
     out_dist1 = [(node, out_dist[node]) for node in target_list if node in out_dist.keys()]
@@ -235,8 +291,7 @@ def post_process_TE_DIJ(out_dist: dict, target_list: tuple, stop_times_file, D_T
         return None, None
     elif len(out_dist1) == 1:
         final_result = out_dist1[0]
-        stop_reached = tuple(stop_times_file.iloc[idx[target_list.index(final_result[0])]][['stop_id', 'arrival_time']])
-        #    [x[0] for x in nodes_dict.items() if x[1]==final_result[0]]
+        stop_reached = (DESTINATION, pd.Timestamp(target_times[target_list.index(final_result[0])]))
         time_reached = D_TIME + pd.to_timedelta(final_result[1], unit='seconds')
         print(f"Stop Event {stop_reached} was reached at {time_reached} ")
         return stop_reached, time_reached
@@ -6,7 +6,7 @@ from Algorithms.TRANSFER_PATTERNS.transferpattern_func import *
 
 
 def std_tp(SOURCE: int, DESTINATION: int, D_TIME, footpath_dict: dict, NETWORK_NAME: str, routesindx_by_stop_dict, stoptimes_dict: dict, hub_count: int = 0,
-           hubstops: set = set) -> list:
+           hubstops: set = set, direct_connection_table: tuple = None, tp_store: dict = None, HUB_METHOD: str = "brute") -> list:
     """
     Standard implementation of trasnfer patterns algorithms. Following functionality is supported regarding hubs:
     1. Build hubs using brute force method. See transferpattern_func
@@ -21,6 +21,9 @@ def std_tp(SOURCE: int, DESTINATION: int, D_TIME, footpath_dict: dict, NETWORK_N
         stops_dict (dict): preprocessed dict. Format {route_id: [ids of stops in the route]}.
         hub_count (int):  Number of hub stops
         hubstops (set): set containing id's of stop that are hubs
+        direct_connection_table (tuple): see transferpattern_func.build_direct_connection_table. Built from stoptimes_dict if None.
+        tp_store (dict): see transferpattern_func.load_transfer_pattern_store. Loaded if None.
+        HUB_METHOD (str): hub selection method of hubstops. Example: brute, sampled
 
     Returns:
         pareto optimal journeys
@@ -31,10 +34,45 @@ def std_tp(SOURCE: int, DESTINATION: int, D_TIME, footpath_dict: dict, NETWORK_N
     TODO: Add backtracking
     """
     try:
-        TP_output = multicriteria_dij(SOURCE, DESTINATION, D_TIME, footpath_dict, NETWORK_NAME, routesindx_by_stop_dict, stoptimes_dict, hub_count, hubstops)
+        TP_output = multicriteria_dij(SOURCE, DESTINATION, D_TIME, footpath_dict, NETWORK_NAME, routesindx_by_stop_dict, stoptimes_dict, hub_count, hubstops,
+                                     direct_connection_table, tp_store, HUB_METHOD)
         pareto_journeys = [(item[0], item[1]) for item in TP_output[DESTINATION][2]]
         # print(f"Pareto optimal points: {pareto_journeys}")
         return pareto_journeys
     except FileNotFoundError:
         print("transfer pattern preprocessing incomplete not found")
         return [None]
+
+
+def std_stp(SOURCE: int, DESTINATION: int, D_TIME, footpath_dict: dict, NETWORK_NAME: str, routesindx_by_stop_dict, stoptimes_dict: dict, cluster_info: dict,
+            direct_connection_table: tuple = None, tp_store: dict = None, WEIGHING_SCHEME: str = None) -> list:
+    """
+    Scalable transfer patterns. Query graph is built from the local and global patterns of build_transfer_patterns (STP mode).
+
+    Args:
+        SOURCE (int): stop id of source stop.
+        DESTINATION (int): stop id of destination stop.
+        D_TIME (pandas.datetime): departure time.
+        footpath_dict (dict): preprocessed dict. Format {from_stop_id: [(to_stop_id, footpath_time)]}.
+        NETWORK_NAME (str): name of the network
+        routesindx_by_stop_dict (dict): Keys: stop id, value: [(route_id, stop index), (route_id, stop index)]
+        stoptimes_dict (dict): preprocessed dict. Format {route_id: [[trip_1], [trip_2]]}.
+        cluster_info (dict): cells of the partition. See miscellaneous_func.read_cluster_info.
+        direct_connection_table (tuple): see transferpattern_func.build_direct_connection_table. Built from stoptimes_dict if None.
+        tp_store (dict): see transferpattern_func.load_stp_store. Loaded if None.
+        WEIGHING_SCHEME (str): weighing scheme of the partition. Used only to load tp_store.
+
+    Returns:
+        pareto optimal journeys
+
+    Examples:
+        >>> output = std_stp(36, 52, pd.to_datetime('2022-06-30 05:41:00'), footpath_dict, './anaheim', routesindx_by_stop_dict, stoptimes_dict, cluster_info)
+    """
+    try:
+        TP_output = multicriteria_dij_forSTP(SOURCE, DESTINATION, D_TIME, footpath_dict, NETWORK_NAME, routesindx_by_stop_dict, stoptimes_dict, cluster_info,
+                                             direct_connection_table, tp_store, WEIGHING_SCHEME)
+        pareto_journeys = [(item[0], item[1]) for item in TP_output[DESTINATION][2]]
+        return pareto_journeys
+    except FileNotFoundError:
+        print("scalable transfer pattern preprocessing incomplete not found")
+        return [None]
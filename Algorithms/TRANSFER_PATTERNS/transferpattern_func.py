@@ -1,14 +1,20 @@
 """
 Module contains function related to transfer patterns, scalable transfer patterns
 """
+import glob
+import heapq
 import itertools
+import os
 import pickle
+from bisect import bisect_left, bisect_right
 from collections import Counter, defaultdict, deque
 
-import networkx as nx
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
+from gtfs_loader import build_departures_dict, load_array_file, save_array_file
+
 
 def initialize_onemany_tbtr(MAX_TRANSFER, DESTINATION_LIST) -> tuple:
     '''
@@ -424,81 +430,292 @@ def onetomany_rtbtr_forhubs(SOURCE: int, DESTINATION_LIST: list, d_time_groups,
     return TP_list
 
 
-def build_query_graph(SOURCE, NETWORK_NAME, hub_count, hubstops) -> dict:
+def build_pattern_dag(stored_transferpattern: list) -> tuple:
+    """
+    Merges the transfer patterns of a source stop into a DAG with one node per distinct prefix. Patterns sharing a prefix (e.g.,
+    all patterns starting with the same first leg) share the nodes of that prefix.
+
+    Args:
+        stored_transferpattern (list): list of stop sequences. Format [[stop id, stop id, ...]]
+
+    Returns:
+        node_stop (list): stop id of every node.
+        node_parent (list): index of the parent node (the prefix one stop shorter). -1 for the first stop of a pattern.
+
+    Examples:
+        >>> node_stop, node_parent = build_pattern_dag([[36, 40, 52], [36, 40, 43]])
+        >>> print(node_stop, node_parent)
+        [36, 40, 52, 43] [-1, 0, 1, 1]
+    """
+    node_stop, node_parent, prefix_node = [], [], {}
+    for pattern in stored_transferpattern:
+        parent = -1
+        for stop in pattern:
+            node = prefix_node.get((parent, stop))
+            if node is None:
+                node = prefix_node[(parent, stop)] = len(node_stop)
+                node_stop.append(stop)
+                node_parent.append(parent)
+            parent = node
+    return node_stop, node_parent
+
+
+def read_transfer_pattern_shards(folder: str):
+    """
+    Reads the shard files (shard_*.pkl) written by the transfer patterns builder. Every shard is a sequence of pickled
+    (SOURCE, transfer patterns) records. A record truncated by a crash ends the shard.
+
+    Args:
+        folder (str): directory containing the shard files.
+
+    Returns:
+        generator of (SOURCE, stored_transferpattern) tuples.
+
+    Examples:
+        >>> for SOURCE, stored_transferpattern in read_transfer_pattern_shards('./Data/Transfer_Patterns/anaheim_0'):
+        ...     print(SOURCE, len(stored_transferpattern))
+    """
+    for shard in sorted(glob.glob(f"{folder}/shard_*.pkl")):
+        with open(shard, "rb") as fp:
+            while True:
+                try:
+                    yield pickle.load(fp)
+                except (EOFError, pickle.UnpicklingError):
+                    break
+
+
+def read_legacy_transfer_patterns(folder: str):
+    """
+    Reads transfer patterns saved by older builds as one pickle per source (file name is the source stop id).
+
+    Args:
+        folder (str): directory containing the per-source files.
+
+    Returns:
+        generator of (SOURCE, stored_transferpattern) tuples.
+
+    Examples:
+        >>> for SOURCE, stored_transferpattern in read_legacy_transfer_patterns('./Data/Transfer_Patterns/anaheim_0'):
+        ...     print(SOURCE, len(stored_transferpattern))
+    """
+    for file_name in sorted(os.listdir(folder), key=lambda name: (len(name), name)):
+        if file_name.isdigit():
+            with open(f"{folder}/{file_name}", "rb") as fp:
+                yield int(file_name), pickle.load(fp)
+
+
+def pack_transfer_pattern_shards(folder: str, store_path: str, meta: dict = None) -> None:
+    """
+    Packs the transfer pattern shards of folder (see read_transfer_pattern_shards) into a single memory-mappable store (see
+    gtfs_loader.save_array_file). The DAG of source s (see build_pattern_dag) is node_stop[source_offsets[s]: source_offsets[s + 1]]
+    and node_parent[...]. Parent indexes are relative to the start of the DAG. If a source appears in several shards (recomputed
+    after a crash), the last record is used. Per-source files of older builds (see read_legacy_transfer_patterns) are packed too.
+
+    Args:
+        folder (str): directory containing the shard files.
+        store_path (str): path of the store.
+        meta (dict): json serializable information saved in the header.
+
+    Returns:
+        None
+
+    Examples:
+        >>> pack_transfer_pattern_shards('./Data/Transfer_Patterns/anaheim_0', './Data/Transfer_Patterns/anaheim_0.bin')
+    """
+    source_dag = {}
+    for SOURCE, stored_transferpattern in itertools.chain(read_legacy_transfer_patterns(folder), read_transfer_pattern_shards(folder)):
+        source_dag[SOURCE] = build_pattern_dag(stored_transferpattern)
+    source_offsets = np.zeros(max(source_dag, default=-1) + 2, dtype=np.int64)
+    for SOURCE, (node_stop, _) in source_dag.items():
+        source_offsets[SOURCE + 1] = len(node_stop)
+    np.cumsum(source_offsets, out=source_offsets)
+    order = sorted(source_dag)
+    arrays = {"source_offsets": source_offsets,
+              "node_stop": np.fromiter(itertools.chain.from_iterable(source_dag[s][0] for s in order), dtype=np.int32, count=int(source_offsets[-1])),
+              "node_parent": np.fromiter(itertools.chain.from_iterable(source_dag[s][1] for s in order), dtype=np.int32, count=int(source_offsets[-1]))}
+    save_array_file(store_path, arrays, meta)
+    return None
+
+
+def get_tp_store_name(NETWORK_NAME: str, hub_count: int, HUB_METHOD: str = "brute") -> str:
+    """
+    Directory of the transfer pattern shards (the store is the same path with .bin). Patterns built with hubs are kept per hub
+    selection method, so brute force and sampled hubs never share a directory.
+
+    Args:
+        NETWORK_NAME (str): name of the network
+        hub_count (int):  Number of hub stops
+        HUB_METHOD (str): hub selection method. Example: brute, sampled
+
+    Returns:
+        tp_folder (str): Example ./Data/Transfer_Patterns/anaheim_0, ./Data/Transfer_Patterns/anaheim_sampled_50
+
+    Examples:
+        >>> tp_folder = get_tp_store_name('anaheim', 50, "sampled")
+    """
+    if hub_count == 0:
+        return f"./Data/Transfer_Patterns/{NETWORK_NAME}_0"
+    return f"./Data/Transfer_Patterns/{NETWORK_NAME}_{HUB_METHOD}_{hub_count}"
+
+
+def build_save_transfer_pattern_store(NETWORK_NAME: str, HUB_COUNT: int, HUB_METHOD: str = "brute") -> None:
+    """
+    Packs the transfer pattern shards (get_tp_store_name/shard_*.pkl) into the store get_tp_store_name.bin. See pack_transfer_pattern_shards.
+    The hub parameters are read from the saved hub_dict (see load_hub_dict).
+
+    Args:
+        NETWORK_NAME (str): name of the network
+        HUB_COUNT (int): Number of hub stops
+        HUB_METHOD (str): hub selection method. Example: brute, sampled
+
+    Returns:
+        None
+
+    Examples:
+        >>> build_save_transfer_pattern_store('anaheim', 0)
+    """
+    meta = {"network": NETWORK_NAME, "hub_count": HUB_COUNT, "hub_method": None, "hub_params": None}
+    if HUB_COUNT != 0:
+        meta["hub_method"], meta["hub_params"] = HUB_METHOD, load_hub_dict(NETWORK_NAME, HUB_METHOD)[1]
+    tp_folder = get_tp_store_name(NETWORK_NAME, HUB_COUNT, HUB_METHOD)
+    pack_transfer_pattern_shards(tp_folder, f"{tp_folder}.bin", meta)
+    return None
+
+
+def load_transfer_pattern_store(NETWORK_NAME: str, hub_count: int, HUB_METHOD: str = "brute", hub_params: dict = None) -> dict:
+    """
+    Memory-maps the transfer pattern store built by build_save_transfer_pattern_store. If the store is missing but the pattern
+    directory exists (e.g., per-source files of older builds), the store is packed first. For hub_count != 0, a ValueError is raised
+    if the store was built with another hub method or (if given) other hub_params.
+
+    Args:
+        NETWORK_NAME (str): name of the network
+        hub_count (int):  Number of hub stops
+        HUB_METHOD (str): hub selection method. Example: brute, sampled
+        hub_params (dict): parameters of the hubs in use. See load_hub_dict. Not checked if None.
+
+    Returns:
+        tp_store (dict): Format {"source_offsets": numpy.memmap, "node_stop": numpy.memmap, "node_parent": numpy.memmap}
+
+    Examples:
+        >>> tp_store = load_transfer_pattern_store('anaheim', 0)
+    """
+    tp_folder = get_tp_store_name(NETWORK_NAME, hub_count, HUB_METHOD)
+    if not os.path.exists(f"{tp_folder}.bin") and os.path.isdir(tp_folder):
+        build_save_transfer_pattern_store(NETWORK_NAME, hub_count, HUB_METHOD)
+    tp_store, meta = load_array_file(f"{tp_folder}.bin")
+    if hub_count != 0 and (meta.get("hub_method") != HUB_METHOD or (hub_params is not None and meta.get("hub_params") != hub_params)):
+        raise ValueError(f"{tp_folder}.bin was built with {meta.get('hub_method')} hubs {meta.get('hub_params')}. Rebuild transfer patterns.")
+    return tp_store
+
+
+def load_stp_store(NETWORK_NAME: str, cluster_count: int, WEIGHING_SCHEME: str) -> dict:
+    """
+    Memory-maps the scalable transfer pattern store (./Data/Transfer_Patterns/stp/{NETWORK_NAME}_{WEIGHING_SCHEME}_{cluster_count}.bin)
+    built by build_transfer_patterns. Format is same as load_transfer_pattern_store. The partition saved in the header must match.
+
+    Args:
+        NETWORK_NAME (str): name of the network
+        cluster_count (int): number of partitions (cells).
+        WEIGHING_SCHEME (str): weighing scheme of the partitions.
+
+    Returns:
+        tp_store (dict): Format {"source_offsets": numpy.memmap, "node_stop": numpy.memmap, "node_parent": numpy.memmap}
+
+    Examples:
+        >>> stp_store = load_stp_store('anaheim', 4, 'S2')
     """
-    Builds the query graph for transfer patterns.
+    store_path = f"./Data/Transfer_Patterns/stp/{NETWORK_NAME}_{WEIGHING_SCHEME}_{cluster_count}.bin"
+    tp_store, meta = load_array_file(store_path)
+    if meta.get("partitions") != cluster_count or meta.get("scheme") != WEIGHING_SCHEME:
+        raise ValueError(f"{store_path} was built for {meta.get('partitions')} partitions with scheme {meta.get('scheme')}. "
+                         f"Rebuild scalable transfer patterns.")
+    return tp_store
+
+
+def query_graph_from_store(tp_store: dict, stop_list) -> dict:
+    """
+    Builds the query graph (union of the DAGs of the stops in stop_list) from a transfer pattern store.
+
+    Args:
+        tp_store (dict): see load_transfer_pattern_store.
+        stop_list (iterable): stop ids whose DAGs are used.
+
+    Returns:
+        adj_list (dist): adjacency list for the query graph. Format {stop id: [[adjacent stop ids], [], []]}
+    """
+    source_offsets, node_stop, node_parent = tp_store["source_offsets"], tp_store["node_stop"], tp_store["node_parent"]
+    adjacent = defaultdict(set)
+    for stop in stop_list:
+        if not 0 <= stop < len(source_offsets) - 1:
+            continue
+        start, end = int(source_offsets[stop]), int(source_offsets[stop + 1])
+        stops, parents = node_stop[start:end], node_parent[start:end]
+        has_parent = parents >= 0
+        for from_stop, to_stop in zip(stops[parents[has_parent]].tolist(), stops[has_parent].tolist()):
+            adjacent[from_stop].add(to_stop)
+            adjacent.setdefault(to_stop, set())
+    adj_list = {stop: [list(to_stops), [], []] for stop, to_stops in adjacent.items()}
+    return adj_list
+
+
+def build_query_graph(SOURCE, NETWORK_NAME, hub_count, hubstops, tp_store: dict = None, HUB_METHOD: str = "brute") -> dict:
+    """
+    Builds the query graph for transfer patterns from the DAGs of SOURCE and the hub stops.
 
     Args:
         SOURCE (int): stop id of source stop.
         NETWORK_NAME (str): name of the network
         hub_count (int):  Number of hub stops
         hubstops (set): set containing id's of stop that are hubs
+        tp_store (dict): see load_transfer_pattern_store. Loaded if None.
+        HUB_METHOD (str): hub selection method of hubstops. Example: brute, sampled
 
     Returns:
         adj_list (dist): adjacency list for the query graph
 
     """
-    with open(f"./TRANSFER_PATTERNS/{NETWORK_NAME}_{hub_count}/{SOURCE}", "rb") as fp:  # Unpickling
-        stored_transferpattern = pickle.load(fp)
-    for hub in hubstops:
-        with open(f"./TRANSFER_PATTERNS/{NETWORK_NAME}_{hub_count}/{hub}", "rb") as fp:  # Unpickling
-            stored_transferpattern.extend(pickle.load(fp))
-
-    edge_list = [(edge[x], edge[x + 1]) for edge in stored_transferpattern for x in range(len(edge) - 1)]
-    G = nx.DiGraph()
-    G.add_edges_from(edge_list)
-    adj_list = {int(x.split(',')[0]): [[int(x) for x in x.split(',')[1:]], [], []] for x in list(nx.generate_adjlist(G, delimiter=','))}
-    return adj_list
+    if tp_store is None:
+        tp_store = load_transfer_pattern_store(NETWORK_NAME, hub_count, HUB_METHOD)
+    return query_graph_from_store(tp_store, [SOURCE, *hubstops])
 
 
-def build_query_graph_forSTP(SOURCE, DESTINATION, NETWORK_NAME, cluster_info) -> dict:
+def build_query_graph_forSTP(SOURCE, DESTINATION, NETWORK_NAME, cluster_info, tp_store: dict = None, WEIGHING_SCHEME: str = None) -> dict:
     """
-    Builds the query graph for scalable transfer patterns.
+    Builds the query graph for scalable transfer patterns. If SOURCE and DESTINATION are in the same cell (or both are border stops),
+    the DAG of SOURCE is used. Else, DAGs of the border stops of both cells are added: the global patterns (between border stops) of
+    the source cell border stops and the local patterns (from border stops into the cell) of the destination cell border stops.
+    Raises ValueError if DESTINATION is not in any cell.
 
     Args:
         SOURCE (int): stop id of source stop.
         DESTINATION (int): stop id of destination stop.
-                NETWORK_NAME (str): name of the network
-        cluster_info:
+        NETWORK_NAME (str): name of the network
+        cluster_info (dict): Format {cell id: set of stop ids of the cell (including its border stops), -1: set of border stops}.
+            See miscellaneous_func.read_cluster_info.
+        tp_store (dict): see load_stp_store. Loaded if None.
+        WEIGHING_SCHEME (str): weighing scheme of the partition. Used only to load tp_store.
 
     Returns:
         adj_list (dist): adjacency list for the query graph
 
     """
     cluster_count = len(cluster_info.keys()) - 1
-    is_source_border, is_desti_border = False, False
-    for cid in range(0, cluster_count):
-        if SOURCE in cluster_info[cid]:
-            s_cid = cid
-    if SOURCE in cluster_info[-1]:
-        is_source_border = True
-    for cid in range(0, cluster_count):
-        if DESTINATION in cluster_info[cid]:
-            d_cid = cid
-    if DESTINATION in cluster_info[-1]:
-        is_desti_border = True
-    if s_cid == d_cid or is_desti_border == is_source_border == True:
-        with open(f"./TRANSFER_PATTERNS/stp/{NETWORK_NAME}_{cluster_count}/{SOURCE}", "rb") as fp:
-            stored_transferpattern = pickle.load(fp)
-        edge_list = list(set([(edge[x], edge[x + 1]) for edge in stored_transferpattern for x in range(len(edge) - 1)]))
-    if s_cid != d_cid:
-        with open(f"./TRANSFER_PATTERNS/stp/{NETWORK_NAME}_{cluster_count}/{SOURCE}", "rb") as fp:
-            stored_transferpattern = pickle.load(fp)
-        edge_list = list(set([(edge[x], edge[x + 1]) for edge in stored_transferpattern for x in range(len(edge) - 1)]))
-        border_stops_of_source = cluster_info[s_cid].intersection(cluster_info[-1])
-        for bordernode in border_stops_of_source:
-            with open(f"./TRANSFER_PATTERNS/stp/{NETWORK_NAME}_{cluster_count}/{bordernode}", "rb") as fp:
-                temp = list(set([(edge[x], edge[x + 1]) for edge in pickle.load(fp) for x in range(len(edge) - 1)]))
-                edge_list.extend(temp)
-        border_stops_of_destination = cluster_info[d_cid].intersection(cluster_info[-1])
-        for bordernode in border_stops_of_destination:
-            with open(f"./TRANSFER_PATTERNS/stp/{NETWORK_NAME}_{cluster_count}/{bordernode}", "rb") as fp:
-                temp = list(set([(edge[x], edge[x + 1]) for edge in pickle.load(fp) for x in range(len(edge) - 1)]))
-                edge_list.extend(temp)
-    G = nx.DiGraph()
-    G.add_edges_from(edge_list)
-    adj_list = {int(x.split(',')[0]): [[int(x) for x in x.split(',')[1:]], [], []] for x in list(nx.generate_adjlist(G, delimiter=','))}
-    return adj_list
+    if tp_store is None:
+        tp_store = load_stp_store(NETWORK_NAME, cluster_count, WEIGHING_SCHEME)
+    source_cells = [cid for cid in range(0, cluster_count) if SOURCE in cluster_info[cid]]
+    desti_cells = [cid for cid in range(0, cluster_count) if DESTINATION in cluster_info[cid]]
+    if not desti_cells:
+        raise ValueError(f"Destination stop {DESTINATION} is not in any cell of the partition")
+    # A source outside all cells was preprocessed like a border stop (see build_transfer_patterns.get_search_space)
+    is_source_border, is_desti_border = SOURCE in cluster_info[-1] or not source_cells, DESTINATION in cluster_info[-1]
+    s_cid, d_cid = source_cells[-1] if source_cells else None, desti_cells[-1]
+    stop_list = [SOURCE]
+    if s_cid != d_cid and not (is_desti_border and is_source_border):
+        if s_cid is not None:
+            stop_list.extend(cluster_info[s_cid].intersection(cluster_info[-1]))
+        stop_list.extend(cluster_info[d_cid].intersection(cluster_info[-1]))
+    return query_graph_from_store(tp_store, stop_list)
 
 
 def check_dominance(t_l, adjlist_dict, DESTINATION) -> bool:
@@ -549,7 +766,7 @@ def new_label_is_dominated(new_label, adjlist_dict, DESTINATION) -> bool:
 def multicriteria_dij_alternate(SOURCE: int, DESTINATION: int, D_TIME, footpath_dict: dict, NETWORK_NAME: str, routesindx_by_stop_dict: dict,
                                 stoptimes_dict: dict, hub_count: int, hubstops: set) -> dict:
     """
-    Multicriteria Dijkstra's algorithm to be used in transfer patterns query phase. The implementation has been borrowed from NetworkX.
+    Multicriteria Dijkstra's algorithm to be used in transfer patterns query phase. See multicriteria_label_setting.
     This is untested-varient of Martin's algorithm
 
     Args:
@@ -642,9 +859,9 @@ def multicriteria_dij_alternate(SOURCE: int, DESTINATION: int, D_TIME, footpath_
 
 
 def multicriteria_dij(SOURCE: int, DESTINATION: int, D_TIME, footpath_dict: dict, NETWORK_NAME: str, routesindx_by_stop_dict: dict, stoptimes_dict: dict,
-                      hub_count: int, hubstops: set) -> dict:
+                      hub_count: int, hubstops: set, direct_connection_table: tuple = None, tp_store: dict = None, HUB_METHOD: str = "brute") -> dict:
     """
-    Multicriteria Dijkstra's algorithm to be used in transfer patterns query phase. The implementation has been borrowed from NetworkX.
+    Multicriteria Dijkstra's algorithm to be used in transfer patterns query phase. See multicriteria_label_setting.
 
     Args:
         SOURCE (int): stop id of source stop.
@@ -656,88 +873,24 @@ def multicriteria_dij(SOURCE: int, DESTINATION: int, D_TIME, footpath_dict: dict
         stoptimes_dict (dict): preprocessed dict. Format {route_id: [[trip_1], [trip_2]]}.
         hub_count (int):  Number of hub stops
         hubstops (set): set containing id's of stop that are hubs
+        direct_connection_table (tuple): see build_direct_connection_table. Built from stoptimes_dict if None.
+        tp_store (dict): see load_transfer_pattern_store. Loaded if None.
+        HUB_METHOD (str): hub selection method of hubstops. Example: brute, sampled
 
     Returns:
         adj_list (dist): adjacency list for the query graph
 
     """
-    adjlist_dict = build_query_graph(SOURCE, NETWORK_NAME, hub_count, hubstops)
-    t_l = []
-    init_label = [D_TIME, 0, 0, 0, SOURCE]  # criteria1, criteria2, pred_node_id, idx_predece_label, self.node_id
-
-    t_l.append(init_label)
-    adjlist_dict[SOURCE][1].append(init_label)
-
-    # while (t_l and check_dominance(t_l, adjlist_dict, DESTINATION)):
-    while (t_l):
-
-        l_q = min(t_l)
-        q = l_q[4]
-
-        # Move l_q from temporary to permanent
-        t_l.remove(l_q)
-        adjlist_dict[q][1].remove(l_q)
-        adjlist_dict[q][2].append(l_q)
-        if new_label_is_dominated(l_q, adjlist_dict, DESTINATION):
-            continue
-        h = adjlist_dict[q][2].index(l_q)  # Store the position of label l_q from l_pq
-        for j in adjlist_dict[q][0]:
-            # Compute l_j the current label of vertex j
-            try:
-                arr_time = arrivaltme_query(q, j, l_q[0], routesindx_by_stop_dict, stoptimes_dict)
-            except ValueError:
-                continue  # No trip avaliable after l_q[0]
-            l_j = list((arr_time, l_q[1] + 1, q, h, j))
-
-            # Verify there is no label of j dominated by l_j
-            dominated = False
-            for label in adjlist_dict[j][1] + adjlist_dict[j][2]:
-                if label[0] <= l_j[0] and label[1] <= l_j[1]:
-                    dominated = True
-                    break
-
-            if dominated == False:
-                # Store l_j as temporary label of j
-                adjlist_dict[j][1].append(l_j)
-                t_l.append(l_j)
-                # Delete all temporary labels of j dominated by l_j
-                for label in adjlist_dict[j][1]:
-                    if l_j[0] == label[0] and l_j[1] == label[1]:
-                        continue
-                    if l_j[0] <= label[0] and l_j[1] <= label[1]:
-                        adjlist_dict[j][1].remove(label)
-                        t_l.remove(label)
-        try:
-            for j, footpath_time in footpath_dict[q]:
-                l_j = list((l_q[0] + footpath_time, l_q[1], q, h, j))
-
-                # Verify there is no label of j dominated by l_j
-                dominated = False
-                for label in adjlist_dict[j][1] + adjlist_dict[j][2]:
-                    if label[0] <= l_j[0] and label[1] <= l_j[1]:
-                        dominated = True
-                        break
-
-                if dominated == False:
-                    # Store l_j as temporary label of j
-                    adjlist_dict[j][1].append(l_j)
-                    t_l.append(l_j)
-                    # Delete all temporary labels of j dominated by l_j
-                    for label in adjlist_dict[j][1]:
-                        if l_j[0] == label[0] and l_j[1] == label[1]:
-                            continue
-                        if l_j[0] <= label[0] and l_j[1] <= label[1]:
-                            adjlist_dict[j][1].remove(label)
-                            t_l.remove(label)
-        except KeyError:
-            pass
-    return adjlist_dict
+    if direct_connection_table is None:
+        direct_connection_table = build_direct_connection_table(stoptimes_dict)
+    adjlist_dict = build_query_graph(SOURCE, NETWORK_NAME, hub_count, hubstops, tp_store, HUB_METHOD)
+    return multicriteria_label_setting(SOURCE, DESTINATION, D_TIME, adjlist_dict, footpath_dict, direct_connection_table)
 
 
 def multicriteria_dij_forSTP(SOURCE: int, DESTINATION: int, D_TIME, footpath_dict: dict, NETWORK_NAME: str, routesindx_by_stop_dict: dict, stoptimes_dict: dict,
-                             cluster_info) -> dict:
+                             cluster_info, direct_connection_table: tuple = None, tp_store: dict = None, WEIGHING_SCHEME: str = None) -> dict:
     """
-    Multicriteria Dijkstra's algorithm to be used in scalable transfer patterns query phase. The implementation has been borrowed from NetworkX.
+    Multicriteria Dijkstra's algorithm to be used in scalable transfer patterns query phase. See multicriteria_label_setting.
 
     Args:
         SOURCE (int): stop id of source stop.
@@ -747,81 +900,128 @@ def multicriteria_dij_forSTP(SOURCE: int, DESTINATION: int, D_TIME, footpath_dic
                 NETWORK_NAME (str): name of the network
         routesindx_by_stop_dict (dict): Keys: stop id, value: [(route_id, stop index), (route_id, stop index)]
         stoptimes_dict (dict): preprocessed dict. Format {route_id: [[trip_1], [trip_2]]}.
-        cluster_info:
+        cluster_info (dict): see build_query_graph_forSTP.
+        direct_connection_table (tuple): see build_direct_connection_table. Built from stoptimes_dict if None.
+        tp_store (dict): see load_stp_store. Loaded if None.
+        WEIGHING_SCHEME (str): weighing scheme of the partition. Used only to load tp_store.
 
     Returns:
         adj_list (dist): adjacency list for the query graph
 
     """
+    if direct_connection_table is None:
+        direct_connection_table = build_direct_connection_table(stoptimes_dict)
+    adjlist_dict = build_query_graph_forSTP(SOURCE, DESTINATION, NETWORK_NAME, cluster_info, tp_store, WEIGHING_SCHEME)
+    return multicriteria_label_setting(SOURCE, DESTINATION, D_TIME, adjlist_dict, footpath_dict, direct_connection_table)
 
-    adjlist_dict = build_query_graph_forSTP(SOURCE, DESTINATION, NETWORK_NAME, cluster_info)
-    t_l = []
+
+def multicriteria_label_setting(SOURCE: int, DESTINATION: int, D_TIME, adjlist_dict: dict, footpath_dict: dict, direct_connection_table: tuple) -> dict:
+    """
+    Label-setting (Martins') algorithm on the query graph with criteria (arrival time, number of transfers). Temporary labels are kept
+    in a heap with lazy deletion: a label removed from its node is left in the heap and skipped when popped.
+
+    Every node keeps two pareto bags:
+    adjlist_dict[node][1]: temporary labels sorted by increasing number of transfers (and so decreasing arrival time). Dominance check
+        is a binary search. Transfers of these labels are mirrored in temp_transfers[node].
+    adjlist_dict[node][2]: permanent labels. These are settled in increasing order of arrival time, so the last one has the fewest
+        transfers and dominance check is O(1).
+
+    Labels dominated by the labels of DESTINATION are neither added nor expanded (target pruning).
+
+    Args:
+        SOURCE (int): stop id of source stop.
+        DESTINATION (int): stop id of destination stop.
+        D_TIME (pandas.datetime): departure time.
+        adjlist_dict (dict): adjacency list for the query graph. Format {stop id: [[adjacent stop ids], [], []]}
+        footpath_dict (dict): preprocessed dict. Format {from_stop_id: [(to_stop_id, footpath_time)]}.
+        direct_connection_table (tuple): see build_direct_connection_table.
+
+    Returns:
+        adj_list (dist): adjacency list for the query graph. Permanent labels of a stop are in adj_list[stop][2].
+            Label format: [arrival time, number of transfer, predecessor node id, index of label updated from, self node_id]
+
+    Examples:
+        >>> adjlist_dict = multicriteria_label_setting(36, 52, pd.to_datetime('2022-06-30 05:41:00'), adjlist_dict, footpath_dict, direct_connection_table)
+    """
+    adjlist_dict.setdefault(SOURCE, [[], [], []])
+    adjlist_dict.setdefault(DESTINATION, [[], [], []])
+    temp_transfers = defaultdict(list)
+    heap, counter = [], itertools.count()
     init_label = [D_TIME, 0, 0, 0, SOURCE]  # criteria1, criteria2, pred_node_id, idx_predece_label, self.node_id
+    _add_temporary_label(init_label, adjlist_dict, temp_transfers, heap, counter, DESTINATION)
 
-    t_l.append(init_label)
-    adjlist_dict[SOURCE][1].append(init_label)
-    # adjlist_dict[33991]
-    while t_l:
-        l_q = min(t_l)
+    while heap:
+        l_q = heapq.heappop(heap)[3]
         q = l_q[4]
+        temporary, transfers = adjlist_dict[q][1], temp_transfers[q]
+        pos = bisect_left(transfers, l_q[1])
+        if pos == len(temporary) or temporary[pos] is not l_q:
+            continue  # Label was deleted (dominated) after being pushed
 
         # Move l_q from temporary to permanent
-        t_l.remove(l_q)
-        adjlist_dict[q][1].remove(l_q)
+        del temporary[pos], transfers[pos]
         adjlist_dict[q][2].append(l_q)
-
-        h = adjlist_dict[q][2].index(l_q)  # Store the position of label l_q from l_pq
+        if q == DESTINATION or _label_is_dominated(l_q, adjlist_dict[DESTINATION], temp_transfers[DESTINATION]):
+            continue
+        h = len(adjlist_dict[q][2]) - 1  # Store the position of label l_q from l_pq
         for j in adjlist_dict[q][0]:
-            # Compute l_j the current label of vertex j
-            try:
-                arr_time = arrivaltme_query(q, j, l_q[0], routesindx_by_stop_dict, stoptimes_dict)
-            except ValueError:
+            arr_time = direct_arrival_time(q, j, l_q[0], direct_connection_table)
+            if arr_time is None:
                 continue  # No trip avaliable after l_q[0]
-            l_j = list((arr_time, l_q[1] + 1, q, h, j))
+            _add_temporary_label([arr_time, l_q[1] + 1, q, h, j], adjlist_dict, temp_transfers, heap, counter, DESTINATION)
+        for j, footpath_time in footpath_dict.get(q, []):
+            if j in adjlist_dict:
+                _add_temporary_label([l_q[0] + footpath_time, l_q[1], q, h, j], adjlist_dict, temp_transfers, heap, counter, DESTINATION)
+    return adjlist_dict
 
-            # Verify there is no label of j dominated by l_j
-            dominated = False
-            for label in adjlist_dict[j][1] + adjlist_dict[j][2]:
-                if label[0] <= l_j[0] and label[1] <= l_j[1]:
-                    dominated = True
-                    break
 
-            if dominated == False:
-                # Store l_j as temporary label of j
-                adjlist_dict[j][1].append(l_j)
-                t_l.append(l_j)
-                # Delete all temporary labels of j dominated by l_j
-                for label in adjlist_dict[j][1]:
-                    if l_j[0] == label[0] and l_j[1] == label[1]:
-                        continue
-                    if l_j[0] <= label[0] and l_j[1] <= label[1]:
-                        adjlist_dict[j][1].remove(label)
-                        t_l.remove(label)
-        try:
-            for j, footpath_time in footpath_dict[q]:
-                l_j = list((l_q[0] + footpath_time, l_q[1], q, h, j))
+def _label_is_dominated(label: list, node_labels: list, temp_transfers: list) -> bool:
+    """
+    Check if label is dominated by (or equal to) a permanent or temporary label of a node. Permanent labels are compared only on number
+    of transfers, as every permanent label arrives no later than a label that is being added or settled.
 
-                # Verify there is no label of j dominated by l_j
-                dominated = False
-                for label in adjlist_dict[j][1] + adjlist_dict[j][2]:
-                    if label[0] <= l_j[0] and label[1] <= l_j[1]:
-                        dominated = True
-                        break
+    Args:
+        label (list): Format [arrival time, number of transfer, predecessor node id, index of label updated from, self node_id]
+        node_labels (list): adjlist_dict entry of the node. See multicriteria_label_setting.
+        temp_transfers (list): number of transfers of the temporary labels of the node.
+
+    Returns:
+        True or False (boolean)
+    """
+    permanent, temporary = node_labels[2], node_labels[1]
+    if permanent and permanent[-1][1] <= label[1]:
+        return True
+    pos = bisect_right(temp_transfers, label[1])
+    return pos > 0 and temporary[pos - 1][0] <= label[0]
 
-                if dominated == False:
-                    # Store l_j as temporary label of j
-                    adjlist_dict[j][1].append(l_j)
-                    t_l.append(l_j)
-                    # Delete all temporary labels of j dominated by l_j
-                    for label in adjlist_dict[j][1]:
-                        if l_j[0] == label[0] and l_j[1] == label[1]:
-                            continue
-                        if l_j[0] <= label[0] and l_j[1] <= label[1]:
-                            adjlist_dict[j][1].remove(label)
-                            t_l.remove(label)
-        except KeyError:
-            pass
-    return adjlist_dict
+
+def _add_temporary_label(label: list, adjlist_dict: dict, temp_transfers: dict, heap: list, counter, DESTINATION: int) -> None:
+    """
+    Adds label to the temporary bag of its node (and the heap) unless it is dominated, and deletes the temporary labels it dominates.
+
+    Args:
+        label (list): Format [arrival time, number of transfer, predecessor node id, index of label updated from, self node_id]
+        adjlist_dict (dict): adjacency list for the query graph. See multicriteria_label_setting.
+        temp_transfers (dict): Format {stop id: [number of transfers of temporary labels]}
+        heap (list): heap of temporary labels. Format [(arrival time, number of transfer, counter, label)]
+        counter: itertools.count object used to break ties in the heap.
+        DESTINATION (int): stop id of destination stop.
+
+    Returns:
+        None
+    """
+    j = label[4]
+    if _label_is_dominated(label, adjlist_dict[j], temp_transfers[j]) or _label_is_dominated(label, adjlist_dict[DESTINATION],
+                                                                                                 temp_transfers[DESTINATION]):
+        return None
+    temporary, transfers = adjlist_dict[j][1], temp_transfers[j]
+    start = end = bisect_left(transfers, label[1])
+    while end < len(temporary) and temporary[end][0] >= label[0]:
+        end = end + 1
+    temporary[start:end] = [label]
+    transfers[start:end] = [label[1]]
+    heapq.heappush(heap, (label[0], label[1], next(counter), label))
+    return None
 
 
 def arrivaltme_query(stop1: int, stop2: int, deptime, routesindx_by_stop_dict: dict, stoptimes_dict: dict):
@@ -850,10 +1050,120 @@ def arrivaltme_query(stop1: int, stop2: int, deptime, routesindx_by_stop_dict: d
     return min(arrival_times)
 
 
+def build_direct_connection_table(stoptimes_dict: dict) -> tuple:
+    """
+    Builds the direct-connection table used to find the earliest arrival from one stop to another without transfers. Trips of a route
+    do not overtake, so the times of all trips at a stop index are sorted and can be bisected.
+
+    Args:
+        stoptimes_dict (dict): preprocessed dict. Format {route_id: [[trip_1], [trip_2]]}.
+
+    Returns:
+        stop_positions (dict): Format {stop id: {route id: [stop indexes of stop in route]}}
+        route_times (dict): Format {route id: [[time of trip_1, time of trip_2, ...] at stop index 0, ... at stop index 1, ...]}.
+            See gtfs_loader.build_departures_dict.
+
+    Examples:
+        >>> direct_connection_table = build_direct_connection_table(stoptimes_dict)
+    """
+    stop_positions = defaultdict(dict)
+    for route, trips in stoptimes_dict.items():
+        for stop_idx, (stop, _) in enumerate(trips[0]):
+            stop_positions[stop].setdefault(route, []).append(stop_idx)
+    return dict(stop_positions), build_departures_dict(stoptimes_dict)
+
+
+def direct_arrival_time(stop1: int, stop2: int, deptime, direct_connection_table: tuple):
+    """
+    Find the earliest arrival at stop2 using a single trip departing from stop1 at or after deptime.
+
+    Args:
+        stop1 (int): Stop id
+        stop2 (int): Stop id
+        deptime (pandas.datetime): earliest departure time from stop1.
+        direct_connection_table (tuple): see build_direct_connection_table.
+
+    Returns:
+        arrival time (pandas.datetime). None if there is no direct connection.
+
+    Examples:
+        >>> arr_time = direct_arrival_time(36, 52, pd.to_datetime('2022-06-30 05:41:00'), direct_connection_table)
+    """
+    stop_positions, route_times = direct_connection_table
+    routes1, routes2 = stop_positions.get(stop1, {}), stop_positions.get(stop2, {})
+    if len(routes2) < len(routes1):
+        common_routes = [route for route in routes2 if route in routes1]
+    else:
+        common_routes = [route for route in routes1 if route in routes2]
+    best_arrival = None
+    for route in common_routes:
+        times = route_times[route]
+        for idx1 in routes1[route]:
+            trip_idx = bisect_left(times[idx1], deptime)
+            if trip_idx == len(times[idx1]):
+                continue
+            for idx2 in routes2[route]:
+                if idx1 < idx2 and (best_arrival is None or times[idx2][trip_idx] < best_arrival):
+                    best_arrival = times[idx2][trip_idx]
+    return best_arrival
+
+
+HUB_COUNTS = [25, 50, 100, 200, 400, 800, 1600, 3200, 6400, 12800]
+
+
+def save_hub_dict(ranking: list, NETWORK_NAME: str, method: str, hub_params: dict = None) -> dict:
+    """
+    Saves the top stops of ranking as hub_dict to ./Data/Transfer_Patterns/{NETWORK_NAME}_hub_{method}.pkl together with the
+    parameters used to select them (see load_hub_dict).
+
+    Args:
+        ranking (list): list of tuples of format: (stop_id, score) in decreasing order of score.
+        NETWORK_NAME (str): name of the network
+        method (str): hub selection method. Example: brute, sampled
+        hub_params (dict): parameters of the hub selection. Example: {"sample_size": 500}
+
+    Returns:
+        hub_dict (dict): Format {number of hubs: [stop ids of hubs]}. Keys: 0 and HUB_COUNTS.
+
+    """
+    hub_dict = {hubs: [x for x, y in ranking[:hubs]] for hubs in HUB_COUNTS}
+    hub_dict[0] = []
+    with open(f'./Data/Transfer_Patterns/{NETWORK_NAME}_hub_{method}.pkl', 'wb') as pickle_file:
+        pickle.dump({"params": {"method": method, **(hub_params or {})}, "hubs": hub_dict}, pickle_file)
+    return hub_dict
+
+
+def load_hub_dict(NETWORK_NAME: str, method: str, hub_params: dict = None) -> tuple:
+    """
+    Loads the hub_dict saved by save_hub_dict. Files of older builds (plain hub_dict) are read with params {"method": method}.
+    If hub_params is given and differs from the saved parameters, a ValueError is raised.
+
+    Args:
+        NETWORK_NAME (str): name of the network
+        method (str): hub selection method. Example: brute, sampled
+        hub_params (dict): expected parameters of the hub selection (without method). Not checked if None.
+
+    Returns:
+        hub_dict (dict): Format {number of hubs: [stop ids of hubs]}. Keys: 0 and HUB_COUNTS.
+        params (dict): parameters of the hub selection. Format {"method": method, **hub_params}
+
+    Examples:
+        >>> hub_dict, params = load_hub_dict('anaheim', "sampled", {"sample_size": 500})
+    """
+    with open(f'./Data/Transfer_Patterns/{NETWORK_NAME}_hub_{method}.pkl', 'rb') as file:
+        saved = pickle.load(file)
+    if "hubs" not in saved:
+        saved = {"params": {"method": method}, "hubs": saved}
+    if hub_params is not None and saved["params"] != {"method": method, **hub_params}:
+        raise ValueError(f"{NETWORK_NAME}_hub_{method}.pkl was built with {saved['params']}. Select the hubs again.")
+    saved["hubs"][0] = []
+    return saved["hubs"], saved["params"]
+
+
 def get_brutehubs(routes_by_stop_dict, NETWORK_NAME) -> list:
     """
     Select hubs using brute force. This is Naive implementation that can be used to test the effectiveness of the hubs. The idea is to generate
-    full transfer patterns (without hubs) and then use optimal paths to find hub stops.
+    full transfer patterns (without hubs) and then use optimal paths to find hub stops. See get_sampledhubs for a cheaper alternative.
 
     Args:
         routes_by_stop_dict (dict): preprocessed dict. Format {stop_id: [id of routes passing through stop]}.
@@ -864,21 +1174,50 @@ def get_brutehubs(routes_by_stop_dict, NETWORK_NAME) -> list:
 
     """
     global_count = Counter({x: 0 for x in routes_by_stop_dict.keys()})
-    for stop_id in tqdm(routes_by_stop_dict.keys()):
-        with open(f"./TRANSFER_PATTERNS/{NETWORK_NAME}_0/{stop_id}", "rb") as fp:  # Unpickling
-            temp = Counter([item for sublist in pickle.load(fp) for item in sublist])
-        global_count = global_count + temp
+    for _, stored_transferpattern in tqdm(read_transfer_pattern_shards(f"./Data/Transfer_Patterns/{NETWORK_NAME}_0")):
+        global_count.update(item for sublist in stored_transferpattern for item in sublist)
     global_count = sorted(dict(global_count).items(), key=lambda x: x[1], reverse=True)
-    hub_dict = {hubs: [x for x, y in global_count[:hubs]] for hubs in [25, 50, 100, 200, 400, 800, 1600, 3200, 6400, 12800]}
-    hub_dict[0] = []
-    with open(f'./TRANSFER_PATTERNS/{NETWORK_NAME}_hub_brute.pkl', 'wb') as pickle_file:
-        pickle.dump(hub_dict, pickle_file)
+    save_hub_dict(global_count, NETWORK_NAME, "brute")
     return global_count
 
 
+def get_sampledhubs(routes_by_stop_dict, NETWORK_NAME, sampled_transferpatterns: list, cut_stops: set = frozenset(),
+                    ROUTE_DEGREE_WEIGHT: float = 0.0, CUT_STOP_WEIGHT: float = 0.0, hub_params: dict = None) -> list:
+    """
+    Select hubs without building full transfer patterns. Importance of a stop is estimated from the transfer patterns of a random
+    sample of sources (one-to-all profile queries, see onetoall_rraptor_forhubs and onetomany_rtbtr_forhubs):
+        score = (number of sampled patterns containing stop) / (number of sampled sources)
+                + ROUTE_DEGREE_WEIGHT * (number of routes through stop) + CUT_STOP_WEIGHT * (1 if stop is a cut stop)
+
+    Args:
+        routes_by_stop_dict (dict): preprocessed dict. Format {stop_id: [id of routes passing through stop]}.
+        NETWORK_NAME (str): name of the network
+        sampled_transferpatterns (list): transfer patterns of every sampled source. Format [[stop sequence transfer patterns]]
+        cut_stops (set): stop ids of cut stops. See miscellaneous_func.read_cut_stops.
+        ROUTE_DEGREE_WEIGHT (float): weight of the route degree of a stop.
+        CUT_STOP_WEIGHT (float): bonus of a cut stop.
+        hub_params (dict): parameters of the selection saved with the hubs. See save_hub_dict.
+
+    Returns:
+        ranking (list): list of tuples of format: (stop_id, score) in decreasing order of score.
+
+    Examples:
+        >>> ranking = get_sampledhubs(routes_by_stop_dict, 'anaheim', sampled_transferpatterns, read_cut_stops('anaheim', 4, 'S2'), 0.01, 1)
+    """
+    pattern_count = Counter()
+    for stored_transferpattern in sampled_transferpatterns:
+        pattern_count.update(stop for pattern in stored_transferpattern for stop in set(pattern))
+    sample_size = max(len(sampled_transferpatterns), 1)
+    score = {stop: pattern_count[stop] / sample_size + ROUTE_DEGREE_WEIGHT * len(routes) + CUT_STOP_WEIGHT * (stop in cut_stops)
+             for stop, routes in routes_by_stop_dict.items()}
+    ranking = sorted(score.items(), key=lambda x: x[1], reverse=True)
+    save_hub_dict(ranking, NETWORK_NAME, "sampled", hub_params)
+    return ranking
+
+
 def onetoall_rraptor_forhubs(SOURCE: int, DESTINATION_LIST: list, d_time_groups, MAX_TRANSFER: int, WALKING_FROM_SOURCE: int, CHANGE_TIME_SEC: int,
                              PRINT_ITINERARY: int, OPTIMIZED: int, routes_by_stop_dict: dict, stops_dict: dict, stoptimes_dict: dict,
-                             footpath_dict: dict, idx_by_route_stop_dict: dict, hubstops: set) -> list:
+                             footpath_dict: dict, idx_by_route_stop_dict: dict, hubstops: set, departures_dict: dict = None) -> list:
     """
     One-To-Many rRAPTOR implementation. Trips are not scanned from the stops in hubstops set.
 
@@ -897,6 +1236,8 @@ def onetoall_rraptor_forhubs(SOURCE: int, DESTINATION_LIST: list, d_time_groups,
         footpath_dict (dict): preprocessed dict. Format {from_stop_id: [(to_stop_id, footpath_time)]}.
         idx_by_route_stop_dict (dict): preprocessed dict. Format {(route id, stop id): stop index in route}.
         hubstops (set): set containing id's of stop that are hubs
+        departures_dict (dict): preprocessed dict. Format {route_id: [[departure times of all trips at stop index 0], ...]}. See gtfs_loader.build_departures_dict.
+            If None, trips are searched linearly.
 
     Returns:
         if OPTIMIZED==1:
@@ -979,7 +1320,10 @@ def onetoall_rraptor_forhubs(SOURCE: int, DESTINATION_LIST: list, d_time_groups,
                                 marked_stop_dict[p_i] = 1
                     if current_trip_t == -1 or label[k - 1][p_i] + change_time < current_trip_t[current_stopindex_by_route][
                         1]:  # assuming arrival_time = departure_time
-                        tid, current_trip_t = get_latest_trip_new(stoptimes_dict, route, label[k - 1][p_i], current_stopindex_by_route, change_time)
+                        if current_trip_t == -1:
+                            tid, current_trip_t = get_latest_trip_new(stoptimes_dict, route, label[k - 1][p_i], current_stopindex_by_route, change_time, departures_dict)
+                        else:
+                            tid, current_trip_t = get_earlier_trip(stoptimes_dict, route, label[k - 1][p_i], current_stopindex_by_route, change_time, tid)
                         if current_trip_t == -1:
                             boarding_time, boarding_point = -1, -1
                         else:
@@ -1013,9 +1357,10 @@ def onetoall_rraptor_forhubs(SOURCE: int, DESTINATION_LIST: list, d_time_groups,
     return output
 
 
-def get_latest_trip_new(stoptimes_dict: dict, route: int, arrival_time_at_pi, pi_index: int, change_time) -> tuple:
+def get_latest_trip_new(stoptimes_dict: dict, route: int, arrival_time_at_pi, pi_index: int, change_time, departures_dict: dict = None) -> tuple:
     '''
-    Get latest trip after a certain timestamp from the given stop of a route.
+    Get latest trip after a certain timestamp from the given stop of a route. If departures_dict is given, the trip is found
+    using binary search (O(log trips)). Else trips are scanned linearly from the first trip.
 
     Args:
         stoptimes_dict (dict): preprocessed dict. Format {route_id: [[trip_1], [trip_2]]}.
@@ -1023,6 +1368,7 @@ def get_latest_trip_new(stoptimes_dict: dict, route: int, arrival_time_at_pi, pi
         arrival_time_at_pi (pandas.datetime): arrival time at stop pi.
         pi_index (int): index of the stop from which route was boarded.
         change_time (pandas.datetime): change time at stop (set to 0).
+        departures_dict (dict): preprocessed dict. Format {route_id: [[departure times of all trips at stop index 0], ...]}. See gtfs_loader.build_departures_dict.
 
     Returns:
         If a trip exists:
@@ -1032,8 +1378,15 @@ def get_latest_trip_new(stoptimes_dict: dict, route: int, arrival_time_at_pi, pi
 
     Examples:
         >>> output = get_latest_trip_new(stoptimes_dict, 1000, pd.to_datetime('2019-06-10 17:40:00'), 0, pd.to_timedelta(0, unit='seconds'))
+        >>> output = get_latest_trip_new(stoptimes_dict, 1000, pd.to_datetime('2019-06-10 17:40:00'), 0, pd.to_timedelta(0, unit='seconds'), departures_dict)
     '''
     try:
+        if departures_dict is not None:
+            stop_departures = departures_dict[route][pi_index]
+            trip_idx = bisect_left(stop_departures, arrival_time_at_pi + change_time)
+            if trip_idx < len(stop_departures):
+                return f'{route}_{trip_idx}', stoptimes_dict[route][trip_idx]
+            return -1, -1
         for trip_idx, trip in enumerate(stoptimes_dict[route]):
             if trip[pi_index][1] >= arrival_time_at_pi + change_time:
                 return f'{route}_{trip_idx}', stoptimes_dict[route][trip_idx]
@@ -1042,6 +1395,33 @@ def get_latest_trip_new(stoptimes_dict: dict, route: int, arrival_time_at_pi, pi
         return -1, -1  # No trip exsist for this route. in this case check tripid from trip file for this route and then look waybill.ID. Likely that trip is across days thats why it is rejected in stoptimes builder while checking
 
 
+def get_earlier_trip(stoptimes_dict: dict, route: int, arrival_time_at_pi, pi_index: int, change_time, tid: str) -> tuple:
+    '''
+    Get the earliest trip that can still be boarded at stop pi, given that trip tid (currently boarded) can be boarded there.
+    Trips are FIFO, so only the trips before tid need to be checked and the search walks backwards from tid.
+
+    Args:
+        stoptimes_dict (dict): preprocessed dict. Format {route_id: [[trip_1], [trip_2]]}.
+        route (int): id of route.
+        arrival_time_at_pi (pandas.datetime): arrival time at stop pi.
+        pi_index (int): index of stop pi in the route.
+        change_time (pandas.datetime): change time at stop (set to 0).
+        tid (str): id of currently boarded trip. Format route_tripindex.
+
+    Returns:
+        trip index, trip
+
+    Examples:
+        >>> output = get_earlier_trip(stoptimes_dict, 1000, pd.to_datetime('2019-06-10 17:40:00'), 0, pd.to_timedelta(0, unit='seconds'), '1000_5')
+    '''
+    route_trips = stoptimes_dict[route]
+    trip_idx = int(tid.split("_")[1])
+    earliest_departure = arrival_time_at_pi + change_time
+    while trip_idx > 0 and route_trips[trip_idx - 1][pi_index][1] >= earliest_departure:
+        trip_idx = trip_idx - 1
+    return f'{route}_{trip_idx}', route_trips[trip_idx]
+
+
 def initialize_raptor(routes_by_stop_dict: dict, SOURCE: int, MAX_TRANSFER: int) -> tuple:
     '''
     Initialize values for RAPTOR.
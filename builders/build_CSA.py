@@ -2,14 +2,22 @@
 Builds structures related to transfer patterns
 """
 import multiprocessing
+import shutil
 from multiprocessing import Pool
 from time import time
 import sys
 
+import numpy as np
 from tqdm import tqdm
 
+from Algorithms.CSA.csa_functions import CONNECTION_DTYPE
+from dict_builder.dict_builder_functions import build_save_stoptimes_array
+from gtfs_loader import build_trip_offsets, load_stoptimes_array
 from miscellaneous_func import *
 
+RUN_SIZE = 2_000_000  # maximum number of connections sorted in memory at once
+MERGE_BLOCK = 65_536  # connections read from every sorted run at a time while merging
+
 
 def initialize() -> tuple:
     """
@@ -103,6 +111,154 @@ def process_csa_array(connections_list) -> list:
     return connections_list
 
 
+def extract_connection_array(route_array, route_stops: list, first_trip: int):
+    """
+    For a given route, extracts all connections of its trips as a structured array (CONNECTION_DTYPE) sorted by departure time and trip.
+    Connections with from stop == to stop or departure time >= arrival time are removed.
+
+    Args:
+        route_array (numpy.ndarray): arrival times of the route. Shape (trips, stops). See gtfs_loader.load_stoptimes_array.
+        route_stops (list): ids of stops in the route.
+        first_trip (int): integer trip id of first trip of the route. See gtfs_loader.build_trip_offsets.
+
+    Returns:
+        route_connections (numpy.ndarray): structured array with dtype CONNECTION_DTYPE.
+
+    Examples:
+        >>> route_connections = extract_connection_array(stoptimes_array[1000], stops_dict[1000], 0)
+    """
+    trip_count, stop_count = route_array.shape
+    route_stops = np.asarray(route_stops, dtype=np.int32)
+    route_connections = np.empty(trip_count * (stop_count - 1), dtype=CONNECTION_DTYPE)
+    route_connections["dep_time"] = route_array[:, :-1].ravel()
+    route_connections["arr_time"] = route_array[:, 1:].ravel()
+    route_connections["from_stop"] = np.tile(route_stops[:-1], trip_count)
+    route_connections["to_stop"] = np.tile(route_stops[1:], trip_count)
+    route_connections["trip"] = np.repeat(np.arange(first_trip, first_trip + trip_count, dtype=np.int32), stop_count - 1)
+    route_connections = route_connections[(route_connections["from_stop"] != route_connections["to_stop"]) &
+                                          (route_connections["dep_time"] < route_connections["arr_time"])]
+    return route_connections[np.argsort(connection_key(route_connections), kind="stable")]
+
+
+def connection_key(connections):
+    """
+    Sort key of connections: departure time, then integer trip id (same order as process_csa_array).
+
+    Args:
+        connections (numpy.ndarray): structured array with dtype CONNECTION_DTYPE.
+
+    Returns:
+        key (numpy.ndarray): int64 array.
+    """
+    return (connections["dep_time"].astype(np.int64) << 32) | connections["trip"].astype(np.int64)
+
+
+def build_connection_runs(stoptimes_array: dict, stops_dict: dict, run_folder: str) -> list:
+    """
+    Extracts connections route by route and writes them as sorted runs (.npy files) of at most RUN_SIZE connections
+    (a single route larger than RUN_SIZE forms its own run). Only one run is kept in memory.
+
+    Args:
+        stoptimes_array (dict): Format {route_id: numpy.ndarray of shape (trips, stops) and dtype int32}.
+        stops_dict (dict): preprocessed dict. Format {route_id: [ids of stops in the route]}.
+        run_folder (str): folder for the run files.
+
+    Returns:
+        run_files (list): paths of the run files.
+    """
+    route_first_trip = build_trip_offsets(stoptimes_array)[0]
+    run_files, run, run_length = [], [], 0
+
+    def flush_run():
+        connections = np.concatenate(run) if run else np.empty(0, dtype=CONNECTION_DTYPE)
+        run_files.append(f"{run_folder}/run_{len(run_files)}.npy")
+        np.save(run_files[-1], connections[np.argsort(connection_key(connections), kind="stable")])
+
+    for r_id in tqdm(sorted(stoptimes_array.keys())):
+        route_connections = extract_connection_array(stoptimes_array[r_id], stops_dict[r_id], route_first_trip[r_id])
+        if run and run_length + len(route_connections) > RUN_SIZE:
+            flush_run()
+            run, run_length = [], 0
+        run.append(route_connections)
+        run_length = run_length + len(route_connections)
+    if run:
+        flush_run()
+    return run_files
+
+
+def merge_connection_runs(run_files: list, output_path: str) -> int:
+    """
+    k-way merge of sorted runs into a single .npy file (written through a memmap). Every run is read in blocks of MERGE_BLOCK
+    connections. In each step, all buffered connections with key <= smallest last key of the buffers are sorted and written, so at
+    least one buffer is consumed per step and peak memory is about len(run_files) * MERGE_BLOCK connections.
+
+    Args:
+        run_files (list): paths of the sorted run files.
+        output_path (str): path of the merged .npy file.
+
+    Returns:
+        connection_count (int): number of connections written.
+    """
+    runs = [np.load(path, mmap_mode="r") for path in run_files]
+    connection_count = sum(len(run) for run in runs)
+    if connection_count == 0:
+        np.save(output_path, np.empty(0, dtype=CONNECTION_DTYPE))
+        return 0
+    output = np.lib.format.open_memmap(output_path, mode="w+", dtype=CONNECTION_DTYPE, shape=(connection_count,))
+    position = [0] * len(runs)
+    buffers = [np.array(run[:MERGE_BLOCK]) for run in runs]
+    written = 0
+    with tqdm(total=connection_count) as progress:
+        while written < connection_count:
+            active = [idx for idx, buffer in enumerate(buffers) if len(buffer)]
+            cutoff = min(int(connection_key(buffers[idx][-1:])[0]) for idx in active)
+            block = []
+            for idx in active:
+                take = int(np.searchsorted(connection_key(buffers[idx]), cutoff, side="right"))
+                block.append(buffers[idx][:take])
+                buffers[idx] = buffers[idx][take:]
+                if len(buffers[idx]) == 0:
+                    position[idx] = position[idx] + MERGE_BLOCK
+                    buffers[idx] = np.array(runs[idx][position[idx]: position[idx] + MERGE_BLOCK])
+            block = np.concatenate(block) if block else np.empty(0, dtype=CONNECTION_DTYPE)
+            output[written: written + len(block)] = block[np.argsort(connection_key(block), kind="stable")]
+            written = written + len(block)
+            progress.update(len(block))
+    output.flush()
+    del output, runs
+    return connection_count
+
+
+def build_save_connection_array(stoptimes_array: dict, stops_dict: dict, NETWORK_NAME: str) -> int:
+    """
+    Builds the sorted connection array (see csa_functions.CONNECTION_DTYPE) with bounded memory and saves it to
+    ./Data/CSA/{NETWORK_NAME}/connections_array.npy. The file is memory-mapped by load_CSA (with USE_ARRAY=1).
+
+    Args:
+        stoptimes_array (dict): Format {route_id: numpy.ndarray of shape (trips, stops) and dtype int32}.
+        stops_dict (dict): preprocessed dict. Format {route_id: [ids of stops in the route]}.
+        NETWORK_NAME (str): Network name
+
+    Returns:
+        connection_count (int): number of connections saved.
+
+    Examples:
+        >>> build_save_connection_array(stoptimes_array, stops_dict, 'anaheim')
+    """
+    print("Building connections array (streaming)...")
+    run_folder = f'./Data/CSA/{NETWORK_NAME}/runs'
+    if os.path.exists(run_folder):
+        shutil.rmtree(run_folder)
+    os.makedirs(run_folder)
+    run_files = build_connection_runs(stoptimes_array, stops_dict, run_folder)
+    print(f" Merging {len(run_files)} sorted runs...")
+    connection_count = merge_connection_runs(run_files, f'./Data/CSA/{NETWORK_NAME}/connections_array.npy')
+    shutil.rmtree(run_folder)
+    print(f"Connections array saved: {connection_count} connections")
+    print(breaker)
+    return connection_count
+
+
 def save_csa(final_connections: list, NETWORK_NAME: str) -> None:
     """
     Save structures related to CSA
@@ -117,7 +273,7 @@ def save_csa(final_connections: list, NETWORK_NAME: str) -> None:
     """
     print(f"Final connections count: {len(final_connections)}")
     print("Saving connections array...")
-    with open(f'./DATA/CSA/{NETWORK_NAME}/connections_list_pkl.pkl', 'wb') as pickle_file:
+    with open(f'./Data/CSA/{NETWORK_NAME}/connections_list_pkl.pkl', 'wb') as pickle_file:
         pickle.dump(final_connections, pickle_file)
     print("CSA preprocessing complete")
     print(breaker)
@@ -136,6 +292,11 @@ if __name__ == "__main__":
 
         stops_file, trips_file, stop_times_file, transfers_file, stops_dict, stoptimes_dict, footpath_dict, routes_by_stop_dict, idx_by_route_stop_dict, routesindx_by_stop_dict = read_testcase(
             NETWORK_NAME)
+        try:
+            stoptimes_array, service_day = load_stoptimes_array(NETWORK_NAME)
+        except FileNotFoundError:
+            stoptimes_array, service_day = build_save_stoptimes_array(stoptimes_dict, NETWORK_NAME)
+        build_save_connection_array(stoptimes_array, stops_dict, NETWORK_NAME)
         input_list = stoptimes_dict.items()
 
         print("Building connections array...")
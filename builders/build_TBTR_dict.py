@@ -1,67 +1,71 @@
 """
 Builds data structure for TBTR related algorithms
 """
+import math
 import multiprocessing
 import sys
 # print(os.getcwd())
 # os.chdir(os.path.dirname(os.getcwd()))
 # os.chdir('D:\\prateek\\research\\indivisual\\TB2')
-from collections import defaultdict
-from itertools import chain
 from multiprocessing import Pool
 from random import shuffle
 from time import time as time_measure
 
+import numpy as np
+
+from dict_builder.dict_builder_functions import build_save_network_snapshot, build_save_stoptimes_array, build_save_trip_transfer_csr
+from gtfs_loader import INF_SECONDS, build_int_footpath_dict, build_trip_offsets, duration_seconds, load_stoptimes_array
 from miscellaneous_func import *
 
 
-def algorithm1_parallel(route_details: tuple) -> list:
+def get_transfer_targets(r_id: int, stop_id: int) -> list:
     """
-    Collects all possible trip transfers.
+    Collects the (route, stop index) pairs that can be boarded after alighting from route r_id at stop_id, either at stop_id itself
+    or after a footpath. Footpath durations are rounded up: times are whole seconds, so a trip departing at or after
+    arrival + ceil(duration) is exactly a trip that can be caught after the walk.
 
     Args:
-        route_details (list): tuple of format: (route id, list of trips)
+        r_id (int): route id of the trip being alighted.
+        stop_id (int): stop id where the trip is alighted.
 
     Returns:
-        list of trip-transfers  format [(from trip id, from stop id, to strip id, to stop id)]
+        targets (list): Format [(to route id, to stop index, minimum time between arrival and boarding in seconds)].
     """
-    trip_transfer_list = []
-    rr, route_trips = route_details
-    for tcount, trips in enumerate(route_trips):
-        for scount, stop_seq in enumerate(trips[1:], 1):
-            try:
-                to_route_list = routes_by_stop_dict[stop_seq[0]].copy()
-                to_route_list.remove(rr)
-                for r_route in to_route_list:
-                    stopindex_by_route = stops_dict[r_route].index(stop_seq[0])
-                    earliest_trip = -1
-                    for ttcount, tripss in enumerate(stoptimes_dict[r_route]):
-                        if tripss[stopindex_by_route][1] >= change_time + stop_seq[1]:
-                            earliest_trip = 1
-                            break
-                    if earliest_trip == 1:
-                        if r_route != rr or tcount < ttcount or stopindex_by_route < scount:
-                            trip_transfer_list.append(
-                                (f"{rr}_{tcount}", scount, f"{r_route}_{ttcount}", stopindex_by_route))
-            except KeyError:
-                pass
-            try:
-                for connection in footpath_dict[stop_seq[0]]:
-                    to_route_list = routes_by_stop_dict[connection[0]]
-                    for r_route in to_route_list:
-                        stopindex_by_route = stops_dict[r_route].index(connection[0])
-                        earliest_trip = -1
-                        for ttcount, tripss in enumerate(stoptimes_dict[r_route]):
-                            if tripss[stopindex_by_route][1] >= stop_seq[1] + connection[1]:
-                                earliest_trip = 1
-                                break
-                        if earliest_trip == 1:
-                            if r_route != rr or tcount < ttcount or stopindex_by_route < scount:
-                                trip_transfer_list.append(
-                                    (f"{rr}_{tcount}", scount, f"{r_route}_{ttcount}", stopindex_by_route))
-            except KeyError:
-                pass
-    return trip_transfer_list
+    targets = [(r_route, idx_by_route_stop_dict[(r_route, stop_id)], change_time_sec) for r_route in routes_by_stop_dict[stop_id] if r_route != r_id]
+    for to_stop, duration in footpath_dict.get(stop_id, []):
+        for r_route in routes_by_stop_dict.get(to_stop, []):
+            targets.append((r_route, idx_by_route_stop_dict[(r_route, to_stop)], math.ceil(duration_seconds(duration))))
+    return targets
+
+
+def algorithm1_parallel(r_id: int):
+    """
+    Collects all possible trip transfers from the trips of a route. For every stop index of the route and every (route, stop index)
+    reachable from it, the earliest catchable trip is found for all trips of r_id at once with np.searchsorted over sorted_departures.
+
+    Args:
+        r_id (int): route id.
+
+    Returns:
+        trip_transfers (numpy.ndarray): int64 array of shape (transfers, 6). Format [from route id, from trip index, from stop index, to route id, to trip index, to stop index]
+    """
+    arrival_times = stoptimes_array[r_id].T
+    trip_index = np.arange(arrival_times.shape[1])
+    trip_transfers = []
+    for from_idx, stop_id in enumerate(stops_dict[r_id][1:], 1):
+        for to_route, to_idx, min_gap in get_transfer_targets(r_id, stop_id):
+            to_departures = sorted_departures[to_route][to_idx]
+            to_trip = np.searchsorted(to_departures, arrival_times[from_idx] + min_gap, side="left")
+            valid = to_trip < len(to_departures)
+            if to_route == r_id and to_idx >= from_idx:
+                valid &= trip_index < to_trip
+            count = int(valid.sum())
+            if count != 0:
+                trip_transfers.append(np.column_stack([np.full(count, r_id), trip_index[valid], np.full(count, from_idx),
+                                                       np.full(count, to_route), to_trip[valid], np.full(count, to_idx)]))
+    if not trip_transfers:
+        return np.empty((0, 6), dtype=np.int64)
+    return np.concatenate(trip_transfers).astype(np.int64)
 
 
 def algorithm2_parallel(trip_transfer_: list) -> list:
@@ -86,47 +90,108 @@ def algorithm2_parallel(trip_transfer_: list) -> list:
         return []
 
 
-def algorithm3_parallel(trip_details: tuple) -> list:
+def build_footpath_arrays(footpath_dict: dict, max_stop: int) -> tuple:
     """
-    Removes trip transfers that are not part of any optimal journey
+    Builds a CSR (indexed by stop id) version of footpath_dict with integer durations (rounded up, see get_transfer_targets).
 
     Args:
-        trip_details (tuple): tuple of form: (route_id, trip_id, trip)
+        footpath_dict (dict): keys: from stop_id, values: list of tuples of form (to stop id, footpath duration).
+        max_stop (int): largest stop id in the network.
 
     Returns:
-        list of non-optimal trip transfers.
+        footpath_offsets (numpy.ndarray): footpaths from stop s are footpath_to[footpath_offsets[s]: footpath_offsets[s + 1]].
+        footpath_to (numpy.ndarray): to stop id of every footpath.
+        footpath_time (numpy.ndarray): duration (in seconds) of every footpath.
+    """
+    footpath_count = np.zeros(max_stop + 2, dtype=np.int64)
+    footpath_to, footpath_time = [], []
+    for from_stop in sorted(footpath_dict.keys()):
+        footpath_count[int(from_stop) + 1] = len(footpath_dict[from_stop])
+        for to_stop, duration in footpath_dict[from_stop]:
+            footpath_to.append(to_stop)
+            footpath_time.append(math.ceil(duration_seconds(duration)))
+    return np.cumsum(footpath_count), np.array(footpath_to, dtype=np.int64), np.array(footpath_time, dtype=np.int64)
+
 
+def relax_trip_stop(stop: int, arrival_time: int, touched_stops: list) -> None:
     """
-    r_id, t_id, trip = trip_details
-    removed_trans = []
-    stop_labels = defaultdict(lambda: inf_time)
-    trip_rev = reversed(list(enumerate(trip)))
-    tid = f"{r_id}_{t_id}"
-    for s_idx, stop_seq in trip_rev:
-        stop_labels[stop_seq[0]] = min(stop_labels[stop_seq[0]], stop_seq[1])
-        try:
-            for q in footpath_dict[stop_seq[0]]:
-                stop_labels[q[0]] = min(stop_labels[q[0]], stop_seq[1] + q[1])
-        except KeyError:
-            pass
-        try:
-            trans_from_stop = [(trans, [int(x) for x in trans[1].split("_")]) for trans in trip_transfer_dict[tid] if trans[0] == s_idx]
-            for trans, breakdown in trans_from_stop:
-                keep = False
-                for stop_connect_0, stop_connect_1 in stoptimes_dict[breakdown[0]][breakdown[1]][trans[2] + 1:]:
-                    if stop_connect_1 < stop_labels[stop_connect_0]:
-                        keep = True
-                        stop_labels[stop_connect_0] = stop_connect_1
-                    if stop_connect_0 in footpath_keys:
-                        for footpath_connect in footpath_dict[stop_connect_0]:
-                            if stop_labels[footpath_connect[0]] > stop_connect_1 + footpath_connect[1]:
-                                keep = True
-                                stop_labels[footpath_connect[0]] = stop_connect_1 + footpath_connect[1]
-                if not keep:
-                    removed_trans.append((tid, trans))
-        except KeyError:
-            pass
-    return removed_trans
+    Updates stop_labels with the arrival time at a stop of the scanned trip and at the stops reachable from it by a footpath.
+    Scalar version of relax_stops, which is slower for a single stop.
+
+    Args:
+        stop (int): stop id.
+        arrival_time (int): arrival time at stop.
+        touched_stops (list): stop ids whose labels were compared (used to reset stop_labels). Updated in place.
+
+    Returns:
+        None
+    """
+    if arrival_time < stop_labels[stop]:
+        stop_labels[stop] = arrival_time
+    touched_stops.append(stop)
+    for to_stop, duration in int_footpath_dict.get(stop, []):
+        if arrival_time + duration < stop_labels[to_stop]:
+            stop_labels[to_stop] = arrival_time + duration
+        touched_stops.append(to_stop)
+    return None
+
+
+def relax_stops(stops, arrival_times) -> tuple:
+    """
+    Updates stop_labels with the arrival times at stops and at the stops reachable from them by a footpath. Used for the stops
+    after the boarding index of a target trip.
+
+    Args:
+        stops (numpy.ndarray): stop ids.
+        arrival_times (numpy.ndarray): arrival time at every stop in stops.
+
+    Returns:
+        improved (bool): True if any label was improved.
+        targets (numpy.ndarray): stop ids whose labels were compared (used to reset stop_labels).
+    """
+    counts = footpath_offsets[stops + 1] - footpath_offsets[stops]
+    edges = np.repeat(footpath_offsets[stops] - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+    targets = np.concatenate([stops, footpath_to[edges]])
+    arrivals = np.concatenate([arrival_times, np.repeat(arrival_times, counts) + footpath_time[edges]])
+    improved = bool((arrivals < stop_labels[targets]).any())
+    np.minimum.at(stop_labels, targets, arrivals)
+    return improved, targets
+
+
+def algorithm3_parallel(tid: int):
+    """
+    Marks trip transfers (from trip tid) that are not part of any optimal journey. Stops of the trip are scanned in reverse order and
+    transfers are read from the arrays sorted by (from_trip, from_stop_index desc), so transfers of a stop index form a contiguous
+    run. Stops of the trip are relaxed one at a time (relax_trip_stop) and the stops of a target trip after its boarding index at
+    once (relax_stops). stop_labels is a dense array shared by all trips of a process; only the touched entries are reset after the trip.
+
+    Args:
+        tid (int): integer trip id (see gtfs_loader.build_trip_offsets).
+
+    Returns:
+        keep (numpy.ndarray): boolean mask over transfers transfer_offsets[tid]: transfer_offsets[tid + 1]. False for non-optimal transfers.
+    """
+    start, end = transfer_offsets[tid], transfer_offsets[tid + 1]
+    keep = np.ones(end - start, dtype=bool)
+    if start == end:
+        return keep
+    trip_stops, trip_times = stops_dict[trip_route[tid]], stoptimes_array[trip_route[tid]][trip_idx[tid]].tolist()
+    touched, touched_stops = [], []
+    pointer = start
+    for s_idx in range(len(trip_stops) - 1, -1, -1):
+        relax_trip_stop(trip_stops[s_idx], trip_times[s_idx], touched_stops)
+        while pointer < end and transfer_from_idx[pointer] == s_idx:
+            to_route, to_idx = transfer_to_route[pointer], transfer_to_idx[pointer]
+            improved, targets = relax_stops(route_stops[to_route][to_idx + 1:], stoptimes_array[to_route][transfer_to_tid[pointer], to_idx + 1:])
+            keep[pointer - start] = improved
+            touched.append(targets)
+            pointer += 1
+        if pointer == end:
+            break
+    stop_labels[touched_stops] = INF_SECONDS
+    if touched:
+        stop_labels[np.concatenate(touched)] = INF_SECONDS
+    return keep
 
 
 def initialize() -> tuple:
@@ -166,6 +231,10 @@ if __name__ == "__main__":
         print(breaker)
         stops_file, trips_file, stop_times_file, transfers_file, stops_dict, stoptimes_dict, footpath_dict, routes_by_stop_dict, idx_by_route_stop_dict, routesindx_by_stop_dict = read_testcase(
             NETWORK_NAME)
+        try:
+            stoptimes_array, service_day = load_stoptimes_array(NETWORK_NAME)
+        except FileNotFoundError:
+            stoptimes_array, service_day = build_save_stoptimes_array(stoptimes_dict, NETWORK_NAME)
         # inf_time = pd.to_datetime("today").round(freq='H') + pd.to_timedelta("365 day")
         # GENERATE_LOGFILE = 1
         if GENERATE_LOGFILE == 1:
@@ -176,24 +245,25 @@ if __name__ == "__main__":
 
         ########Algorithm 1
         print("Running Algorithm 1")
-        route_details_list = list(stoptimes_dict.items())
-        shuffle(route_details_list)
+        change_time_sec = int(change_time.total_seconds())
+        # Running maximum over the trips makes every column sorted. The first trip with running maximum >= t is the first trip
+        # departing at or after t, so the search stays exact even if a route is not FIFO.
+        sorted_departures = {r_id: np.ascontiguousarray(np.maximum.accumulate(route_times, axis=0).T) for r_id, route_times in stoptimes_array.items()}
+        route_id_list = list(stoptimes_array.keys())
+        shuffle(route_id_list)
         start = time_measure()
         if USE_PARALlEL==1:
             with Pool(CORES) as pool:
-                result = pool.map(algorithm1_parallel, route_details_list)
+                result = pool.map(algorithm1_parallel, route_id_list)
         else:
-            result = [algorithm1_parallel(route_details) for route_details in route_details_list]
+            result = [algorithm1_parallel(r_id) for r_id in route_id_list]
         A1_time = time_measure() - start
-        Transfer_set_db = pd.DataFrame(list(chain(*result)), columns=["from_Trip", "from_stop_index", "to_trip", "to_stop_index"])
+        Transfer_set_db = pd.DataFrame(np.concatenate(result), columns=["from_routeid", "from_tid", "from_stop_index", "to_routeid", "to_tid", "to_stop_index"])
         print(breaker)
 
         ########Algorithm 2
         print("Running Algorithm 2")
         Transfer_set_db_temp = Transfer_set_db.reset_index()
-        Transfer_set_db_temp['from_routeid'], Transfer_set_db_temp['from_tid'] = zip(*Transfer_set_db_temp['from_Trip'].apply(lambda x: x.split("_")))
-        Transfer_set_db_temp['to_routeid'], Transfer_set_db_temp['to_tid'] = zip(*Transfer_set_db_temp['to_trip'].apply(lambda x: x.split("_")))
-        Transfer_set_db_temp = Transfer_set_db_temp.drop(columns=['from_Trip', 'to_trip']).astype(int)
         Transfer_set_db_temp.from_stop_index = Transfer_set_db_temp.from_stop_index - 1
         Transfer_set_db_temp.to_stop_index = Transfer_set_db_temp.to_stop_index + 1
         Transfer_set_db_temp = Transfer_set_db_temp[['index', 'from_routeid', 'from_tid', 'to_routeid', 'to_tid', 'from_stop_index', 'to_stop_index']]
@@ -206,41 +276,34 @@ if __name__ == "__main__":
         A2_time = time_measure() - start
         U_Turns_list = [x for x in U_Turns_list if x]
         Transfer_set = Transfer_set_db.drop(U_Turns_list).reset_index(drop=True)
-        from_T_group = Transfer_set.groupby(['from_Trip'])
-        trip_transfer_dict = {idx: list(zip(rows["from_stop_index"], rows['to_trip'], rows['to_stop_index'])) for idx, rows in from_T_group}
         print(breaker)
         ########Algorithm 3
         print("Running Algorithm 3")
-        for stop, flist in footpath_dict.items():
-            temp = []
-            footpath_dict[stop] = [(y[0], y[1].total_seconds()) for y in flist]
-        for rid, route_det in stoptimes_dict.items():
-            temp = []
-            for trip in route_det:
-                temp.append([(stamp[0], stamp[1].timestamp()) for stamp in trip])
-            stoptimes_dict[rid] = temp
-        inf_time = (pd.to_datetime("today").round(freq='H') + pd.to_timedelta("365 day")).timestamp()
-        footpath_keys = set(footpath_dict.keys())
-        route_details1 = list(stoptimes_dict.items())
-        route_details1.sort(key=lambda x: x[0])
-        trip_list = []
-        for rid, route_trips in route_details1:
-            for t_id, trip in enumerate(route_trips):
-                trip_list.append((rid, t_id, trip))
-        route_details1 = None
-
-        init_tans = sum([len(x) for x in trip_transfer_dict.values()])
+        trip_offsets = build_trip_offsets(stoptimes_dict)
+        route_first_trip, _, trip_route, trip_idx = trip_offsets
+        Transfer_set['from_trip'] = Transfer_set.from_routeid.map(route_first_trip) + Transfer_set.from_tid
+        Transfer_set['to_trip'] = Transfer_set.to_routeid.map(route_first_trip) + Transfer_set.to_tid
+        Transfer_set = Transfer_set.sort_values(['from_trip', 'from_stop_index'], ascending=[True, False]).reset_index(drop=True)
+        transfer_offsets = np.searchsorted(Transfer_set.from_trip.values, np.arange(len(trip_route) + 1), side="left")
+        transfer_from_idx, transfer_to_route, transfer_to_tid, transfer_to_idx = [Transfer_set[col].values for col in
+                                                                                  ['from_stop_index', 'to_routeid', 'to_tid', 'to_stop_index']]
+        route_stops = {r_id: np.array(stops, dtype=np.int64) for r_id, stops in stops_dict.items()}
+        max_stop = int(max(max(max(stops) for stops in stops_dict.values()),
+                           max([max([from_stop] + [to_stop for to_stop, _ in footpaths]) for from_stop, footpaths in footpath_dict.items()], default=0)))
+        footpath_offsets, footpath_to, footpath_time = build_footpath_arrays(footpath_dict, max_stop)
+        int_footpath_dict = build_int_footpath_dict(footpath_dict)
+        stop_labels = np.full(max_stop + 1, INF_SECONDS, dtype=np.int64)
+
+        init_tans = len(Transfer_set)
         start = time_measure()
         if USE_PARALlEL==1:
             with Pool(CORES) as pool:
-                non_optimal_trans = pool.map(algorithm3_parallel, trip_list)
+                keep_masks = pool.map(algorithm3_parallel, range(len(trip_route)), chunksize=256)
         else:
-            non_optimal_trans = [algorithm3_parallel(trip_details) for trip_details in trip_list]
+            keep_masks = [algorithm3_parallel(tid) for tid in range(len(trip_route))]
         A3_time = time_measure() - start
-        for route_level_turns in non_optimal_trans:
-            for tid, trans in route_level_turns:
-                trip_transfer_dict[tid].remove(trans)
-        final_trans = sum([len(x) for x in trip_transfer_dict.values()])
+        Transfer_set = Transfer_set[np.concatenate(keep_masks)]
+        final_trans = len(Transfer_set)
         print(breaker)
         print(f"Algorithm 1 time - {round(A1_time, 2)},Triptransfer count = {len(Transfer_set_db)}")
         print(
@@ -249,25 +312,18 @@ if __name__ == "__main__":
         print(f"Total time - {round(A1_time + A2_time + A3_time, 1)}")
         print(f"Total time - {round((A1_time + A2_time + A3_time) * CORES, 1)}")
         print(breaker)
+        # Trip ids are saved as integer trip ids (see gtfs_loader.build_trip_offsets). Every stop index of a trip gets a key.
         trip_transfer_dict_new = {}
-        for tid, connections in trip_transfer_dict.items():
-            if connections == []: continue
-            trip_transfer_dict_new[tid] = {}
-            for x in connections:
-                if x[0] not in trip_transfer_dict_new[tid].keys():
-                    trip_transfer_dict_new[tid][x[0]] = []
-                trip_transfer_dict_new[tid][x[0]].append((x[1], x[2]))
-        # Added [] for every stop of key (or cast it as default dict to avoid error keyerror in TBTR code)
-        for tid in trip_transfer_dict_new.keys():
-            numberofstops = set(range(len(stops_dict[int(tid.split('_')[0])])))
-            keys_present = set(trip_transfer_dict_new[tid].keys())
-            keystobeadded = numberofstops - keys_present
-            for key in keystobeadded:
-                trip_transfer_dict_new[tid][key] = []
+        for from_trip, from_idx, to_trip, to_idx in zip(*[Transfer_set[col].tolist() for col in ['from_trip', 'from_stop_index', 'to_trip', 'to_stop_index']]):
+            if from_trip not in trip_transfer_dict_new:
+                trip_transfer_dict_new[from_trip] = {s_idx: [] for s_idx in range(len(stops_dict[trip_route[from_trip]]))}
+            trip_transfer_dict_new[from_trip][from_idx].append((to_trip, to_idx))
 
         with open(f'./Data/TBTR/{NETWORK_NAME}/TBTR_trip_transfer_dict.pkl', 'wb') as pickle_file:
             pickle.dump(trip_transfer_dict_new, pickle_file)
         print("trip_Transfer_dict done final")
+        build_save_trip_transfer_csr(NETWORK_NAME, stops_dict, stoptimes_array, trip_transfer_dict_new)
+        build_save_network_snapshot(NETWORK_NAME, stops_dict, stoptimes_array, service_day, footpath_dict, trip_transfer_dict_new)
         if GENERATE_LOGFILE == 1: sys.stdout.close()
 
         """
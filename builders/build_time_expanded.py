@@ -4,8 +4,9 @@ Builds the Time expanded Graph.
 import sys
 from time import time
 
-from tqdm import tqdm
+import numpy as np
 
+from gtfs_loader import save_array_file
 from miscellaneous_func import *
 
 
@@ -17,9 +18,10 @@ def initialize() -> tuple:
         breaker (str): string
         GENERATE_LOGFILE (int): 1 to redirect and save a log file. Else 0
         start_time: timestamp object
+        SAVE_NETWORKX (int): 1 to also save the networkx graph (fallback for TE_DIJ). Else 0
 
     Examples:
-        >>> breaker, start_time, GENERATE_LOGFILE = initialize()
+        >>> breaker, start_time, GENERATE_LOGFILE, SAVE_NETWORKX = initialize()
 
     """
     breaker = "________________________________________________________________"
@@ -28,6 +30,7 @@ def initialize() -> tuple:
     import psutil
     print(f'RAM {round(psutil.virtual_memory().total / (1024.0 ** 3))} GB (% used:{psutil.virtual_memory()[2]})')
     GENERATE_LOGFILE = int(input(f"Press 1 to redirect output to a log file in logs folder. Else press 0. Example: 0\n: "))
+    SAVE_NETWORKX = int(input(f"Press 1 to also save the networkx graph (only needed as fallback). Else press 0. Example: 0\n: "))
     if not os.path.exists(f'./logs/.'):
         os.makedirs(f'./logs/.')
     if not os.path.exists(f'./Data/time_expanded/{NETWORK_NAME}'):
@@ -35,139 +38,147 @@ def initialize() -> tuple:
 
     start_time = time()
 
-    return breaker, start_time, GENERATE_LOGFILE
+    return breaker, start_time, GENERATE_LOGFILE, SAVE_NETWORKX
 
 
-def add_edges_for_trips(stop_times_file, nodes_dict: dict) -> list:
+def build_event_nodes(stop_times_file):
     """
-    Adds edges corresponding to trips
+    Assigns node ids (starting from 1) to the stop events (stop id, arrival time) of stop_times_file. Node ids are in the order of
+    first appearance, i.e., same as the old nodes_dict.
 
     Args:
         stop_times_file (pandas.dataframe): dataframe with stoptimes details.
-        nodes_dict (dict): mapping dictionary. Format: {(stop id, arrival time): new node id}
 
     Returns:
-        trip_edges (list): list of tuples of format: [(from node id, to node id, weight)]
+        events (pandas.dataframe): columns stop_id, arrival_time, node.
 
     Examples:
-        >>> trip_edges = add_edges_for_trips(stop_times_file, nodes_dict)
+        >>> events = build_event_nodes(stop_times_file)
+    """
+    events = stop_times_file[['stop_id', 'arrival_time']].drop_duplicates().reset_index(drop=True)
+    events['node'] = np.arange(1, len(events) + 1, dtype=np.int64)
+    return events
+
+
+def _edge_array(from_node, to_node, from_time, to_time):
+    """
+    Stacks edge columns into an int64 array of shape (edges, 3). Weight is to_time - from_time in seconds.
+    """
+    weight = (to_time.values - from_time.values) // np.timedelta64(1, 's')
+    return np.column_stack([from_node.values, to_node.values, weight]).astype(np.int64)
+
+
+def add_edges_for_trips(stop_times_file, events) -> np.ndarray:
+    """
+    Adds edges corresponding to trips (consecutive stop events of every trip).
+
+    Args:
+        stop_times_file (pandas.dataframe): dataframe with stoptimes details.
+        events (pandas.dataframe): stop events with node ids. See build_event_nodes.
+
+    Returns:
+        trip_edges (numpy.ndarray): array of format: [(from node id, to node id, weight)]
+
+    Examples:
+        >>> trip_edges = add_edges_for_trips(stop_times_file, events)
     """
     print("adding edges corresponding to trips...")
     t1 = time()
-    trip_edges = []
-    trip_groups = stop_times_file.groupby("trip_id")
-    for tid, trip in tqdm(trip_groups):
-        trip.sort_values(by='stop_sequence', inplace=True)
-        for x in range(len(trip) - 1):
-            row1, row2 = trip.iloc[x], trip.iloc[x + 1]
-            trip_edges.append(
-                (nodes_dict[(row1.stop_id, row1.arrival_time)], nodes_dict[(row2.stop_id, row2.arrival_time)],
-                 int((row2.arrival_time - row1.arrival_time).total_seconds())))
+    trips = stop_times_file[['trip_id', 'stop_sequence', 'stop_id', 'arrival_time']].merge(events, on=['stop_id', 'arrival_time'])
+    trips = trips.sort_values(by=['trip_id', 'stop_sequence']).reset_index(drop=True)
+    next_event = trips.groupby('trip_id')[['node', 'arrival_time']].shift(-1)
+    valid = next_event.node.notna()
+    trip_edges = _edge_array(trips.node[valid], next_event.node[valid], trips.arrival_time[valid], next_event.arrival_time[valid])
     print(f"Time required to add trip edges: {round((time() - t1) / 60, 2)} minutes")
     print(breaker)
     return trip_edges
 
 
-def add_edges_for_footpaths(stop_times_file, nodes_dict: dict, transfers_file) -> list:
+def add_edges_for_footpaths(events, transfers_file) -> np.ndarray:
     """
-    Adds edges corresponding to footpaths
+    Adds edges corresponding to footpaths. Every event at from stop is connected only to the first event at to stop that can be
+    reached by walking (later events are reachable through waiting edges).
 
     Args:
-        stop_times_file (pandas.dataframe): dataframe with stoptimes details.
+        events (pandas.dataframe): stop events with node ids. See build_event_nodes.
         transfers_file (pandas.dataframe): dataframe with transfers (footpath) details.
-        nodes_dict (dict): mapping dictionary. Format: {(stop id, arrival time): new node id}
 
     Returns:
-        foot_connection (list): list of tuples of format: [(from node id, to node id, weight)]
+        foot_connections (numpy.ndarray): array of format: [(from node id, to node id, weight)]
 
     Examples:
-        >>> foot_connections = add_edges_for_footpaths(stop_times_file, nodes_dict, transfers_file)
+        >>> foot_connections = add_edges_for_footpaths(events, transfers_file)
 
     """
     print("adding edges corresponding to footpaths...")
     t2 = time()
-    foot_connections = []
-    temp = list(transfers_file.from_stop_id)
-    temp.extend(transfers_file.to_stop_id)
-    temp = stop_times_file[stop_times_file.stop_id.isin(set(temp))]
-    t = temp[['stop_id', 'arrival_time']].groupby("stop_id")
-    for _, trans in tqdm(transfers_file.iterrows()):
-        from_nodes = list(t.get_group(trans.from_stop_id).itertuples(index=False, name=None))
-        to_nodes = list(t.get_group(trans.to_stop_id).itertuples(index=False, name=None))
-        foot_connections.extend(
-            [(nodes_dict[s], nodes_dict[d], (d[1] - s[1]).total_seconds()) for s in from_nodes for d in to_nodes if
-             (d[1] - s[1]).total_seconds() >= trans.min_transfer_time])
+    walks = transfers_file[['from_stop_id', 'to_stop_id', 'min_transfer_time']].merge(events, left_on='from_stop_id', right_on='stop_id')
+    walks['ready_time'] = walks.arrival_time + pd.to_timedelta(walks.min_transfer_time, unit='seconds')
+    targets = events.rename(columns={'stop_id': 'to_stop_id', 'arrival_time': 'to_time', 'node': 'to_node'})
+    walks = pd.merge_asof(walks.sort_values('ready_time'), targets.sort_values('to_time'), left_on='ready_time', right_on='to_time',
+                          by='to_stop_id', direction='forward').dropna(subset=['to_node'])
+    foot_connections = _edge_array(walks.node, walks.to_node, walks.arrival_time, walks.to_time)
     print(f"Time required to add footpath edges: {round((time() - t2) / 60, 2)} minutes")
     print(breaker)
     return foot_connections
 
 
-def add_transfer_edges(stop_times_file, nodes_dict: dict) -> list:
+def add_transfer_edges(events) -> np.ndarray:
     """
-    Adds transfer edges between nodes
+    Adds transfer (waiting) edges between consecutive events of every stop.
 
     Args:
-        stop_times_file (pandas.dataframe): dataframe with stoptimes details.
-        nodes_dict (dict): mapping dictionary. Format: {(stop id, arrival time): new node id}
+        events (pandas.dataframe): stop events with node ids. See build_event_nodes.
 
     Returns:
-        transfer_edges (list): list of tuples of format: [(from node id, to node id, weight)]
+        transfer_edges (numpy.ndarray): array of format: [(from node id, to node id, weight)]
 
     Examples:
-        >>> transfer_edges = add_transfer_edges(stop_times_file, nodes_dict)
+        >>> transfer_edges = add_transfer_edges(events)
 
     """
     print("Adding waiting edges...")
     t3 = time()
-    transfer_edges = []
-    t = stop_times_file[['stop_id', 'arrival_time']].groupby("stop_id")
-    for _, stop_Det in tqdm(t):
-        transfer_edge = list(stop_Det.sort_values('arrival_time').itertuples(index=False, name=None))
-        for pointer in range(len(stop_Det) - 1):
-            transfer_edges.append(
-                (nodes_dict[transfer_edge[pointer]], nodes_dict[transfer_edge[pointer + 1]],
-                 int((transfer_edge[pointer + 1][1] - transfer_edge[pointer][1]).total_seconds())))
+    stop_events = events.sort_values(by=['stop_id', 'arrival_time']).reset_index(drop=True)
+    next_event = stop_events.shift(-1)
+    valid = (next_event.stop_id == stop_events.stop_id)
+    transfer_edges = _edge_array(stop_events.node[valid], next_event.node[valid], stop_events.arrival_time[valid], next_event.arrival_time[valid])
     print(f"Time required to add transfer edges: {round((time() - t3) / 60, 2)} minutes")
     print(breaker)
     return transfer_edges
 
 
-def combine_edges(trip_edges: list, foot_connections: list, transfer_edges: list) -> list:
+def combine_edges(trip_edges: np.ndarray, foot_connections: np.ndarray, transfer_edges: np.ndarray) -> np.ndarray:
     """
-    Combines all 3 types of edges into a single list (trip, footpath, and transfer)
+    Combines all 3 types of edges into a single array (trip, footpath, and transfer)
 
     Args:
-        trip_edges (list) : list of tuples of format: [(from node id, to node id, weight)]
-        foot_connections (list) : list of tuples of format: [(from node id, to node id, weight)]
-        transfer_edges (list): list of tuples of format: [(from node id, to node id, weight)]
+        trip_edges (numpy.ndarray) : array of format: [(from node id, to node id, weight)]
+        foot_connections (numpy.ndarray) : array of format: [(from node id, to node id, weight)]
+        transfer_edges (numpy.ndarray): array of format: [(from node id, to node id, weight)]
 
     Returns:
-        edges (list): list of tuples of format: [(from node id, to node id, weight)]
+        edges (numpy.ndarray): array of format: [(from node id, to node id, weight)]
 
     Examples:
-        >>> edge_list = combine_edges(trip_edges, foot_connections, transfer_edges)
+        >>> edges = combine_edges(trip_edges, foot_connections, transfer_edges)
 
     """
     print("Combining all edges...")
     t4 = time()
-    edges = []
-    edges.extend(trip_edges)
-    del (trip_edges)
-    edges.extend(foot_connections)
-    del (foot_connections)
-    edges.extend(transfer_edges)
-    del (transfer_edges)
+    edges = np.concatenate([trip_edges, foot_connections, transfer_edges])
+    print(f"Trip edges: {len(trip_edges)}, footpath edges: {len(foot_connections)}, waiting edges: {len(transfer_edges)}")
     print(f"Time required to combine transfer edges: {round((time() - t4) / 60, 2)} minutes")
     print(breaker)
     return edges
 
 
-def dump_edges_dict(edges: list, NETWORK_NAME: str) -> None:
+def dump_edges_dict(edges: np.ndarray, NETWORK_NAME: str) -> None:
     """
-    Saves the edges list as a pickle file
+    Saves the edges array as a pickle file
 
     Args:
-        edges (list): list of tuples of format: [(from node id, to node id, weight)]
+        edges (numpy.ndarray): array of format: [(from node id, to node id, weight)]
         NETWORK_NAME (str): name of the network
 
     Returns:
@@ -183,26 +194,87 @@ def dump_edges_dict(edges: list, NETWORK_NAME: str) -> None:
     return None
 
 
-def dump_graph_dict(edges: list, NETWORK_NAME: str, nodes_dict: dict) -> None:
+def build_csr_graph(edges: np.ndarray, node_count: int) -> dict:
+    """
+    Converts the edge list to a CSR graph. Out-edges of node v are indices[indptr[v]: indptr[v + 1]] with matching weights.
+
+    Args:
+        edges (numpy.ndarray): array of format: [(from node id, to node id, weight)]
+        node_count (int): 1 + largest node id.
+
+    Returns:
+        G (dict): keys: indptr (int64), indices (int32), weights (int32).
+
+    Examples:
+        >>> G = build_csr_graph(edges, len(events) + 1)
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 3)
+    edges = edges[np.argsort(edges[:, 0], kind="stable")]
+    indptr = np.zeros(node_count + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(edges[:, 0], minlength=node_count))
+    return {"indptr": indptr, "indices": edges[:, 1].astype(np.int32), "weights": edges[:, 2].astype(np.int32)}
+
+
+def dump_csr_graph(edges: np.ndarray, NETWORK_NAME: str, node_count: int) -> None:
+    """
+    Builds and saves the CSR graph to ./Data/time_expanded/{NETWORK_NAME}/TE_csr.bin (see gtfs_loader.save_array_file).
+
+    Args:
+        edges (numpy.ndarray): array of format: [(from node id, to node id, weight)]
+        NETWORK_NAME (str): name of the network
+        node_count (int): 1 + largest node id.
+
+    Returns:
+        None
+
+    Examples:
+        >>> dump_csr_graph(edges, 'anaheim', len(events) + 1)
+    """
+    print("Building and saving CSR graph")
+    G = build_csr_graph(edges, node_count)
+    save_array_file(f"./Data/time_expanded/{NETWORK_NAME}/TE_csr.bin", G, {"network": NETWORK_NAME})
+    print(f"TE graph for {NETWORK_NAME}: \n Nodes {node_count - 1} \n Edges {len(G['indices'])}")
+    print(breaker)
+    return None
+
+
+def dump_stop_events(events, NETWORK_NAME: str) -> None:
+    """
+    Builds and saves the per-stop sorted event arrays to ./Data/time_expanded/{NETWORK_NAME}/TE_events.bin (see
+    miscellaneous_func.build_stop_events). Used by TE_DIJ to find source and target nodes.
+
+    Args:
+        events (pandas.dataframe): stop events with node ids. See build_event_nodes.
+        NETWORK_NAME (str): name of the network
+
+    Returns:
+        None
+
+    Examples:
+        >>> dump_stop_events(events, 'anaheim')
+    """
+    save_array_file(f"./Data/time_expanded/{NETWORK_NAME}/TE_events.bin", build_stop_events(events), {"network": NETWORK_NAME})
+    return None
+
+
+def dump_graph_dict(edges: np.ndarray, NETWORK_NAME: str) -> None:
     """
     Builds and saves a networkx multigraph object.
 
     Args:
-        edges: list of edges. Format: [(from stop, to stop, weight)]
+        edges (numpy.ndarray): array of edges. Format: [(from node id, to node id, weight)]
         NETWORK_NAME (str): name of the network
-        nodes_dict (dict): mapping dictionary. Format: {(stop id, arrival time): new node id}
 
     Returns:
         None
 
     Examples:
-        >>> dump_graph_dict(edges, 'anaheim', nodes_dict)
+        >>> dump_graph_dict(edges, 'anaheim')
     """
     print("Building and saving graph object")
     G = nx.MultiDiGraph()
-    G.add_weighted_edges_from(edges)
+    G.add_weighted_edges_from(edges.tolist())
     del (edges)
-    del (nodes_dict)
     with open(f"./Data/time_expanded/{NETWORK_NAME}/graph_{NETWORK_NAME}", 'wb') as file:
         pickle.dump(G, file)
     print(f"TE graph for {NETWORK_NAME}: \n Nodes {G.number_of_nodes()} \n Edges {G.number_of_edges()}")
@@ -221,20 +293,23 @@ def main() -> None:
         >>> main()
 
     """
-    temp = stop_times_file[['stop_id', 'arrival_time']].drop_duplicates().reset_index(drop=True)
-    nodes_dict = {stop_stamp: idx for idx, stop_stamp in enumerate(list(zip(temp['stop_id'], temp['arrival_time'])), 1)}
+    events = build_event_nodes(stop_times_file)
 
-    trip_edges = add_edges_for_trips(stop_times_file, nodes_dict)
+    trip_edges = add_edges_for_trips(stop_times_file, events)
 
-    foot_connections = add_edges_for_footpaths(stop_times_file, nodes_dict, transfers_file)
+    foot_connections = add_edges_for_footpaths(events, transfers_file)
 
-    transfer_edges = add_transfer_edges(stop_times_file, nodes_dict)
+    transfer_edges = add_transfer_edges(events)
 
     edges = combine_edges(trip_edges, foot_connections, transfer_edges)
 
     dump_edges_dict(edges, NETWORK_NAME)
 
-    dump_graph_dict(edges, NETWORK_NAME, nodes_dict)
+    dump_csr_graph(edges, NETWORK_NAME, len(events) + 1)
+    dump_stop_events(events, NETWORK_NAME)
+
+    if SAVE_NETWORKX == 1:
+        dump_graph_dict(edges, NETWORK_NAME)
 
     end = (time() - start_time) / 60
     print(f"Total Time: {round(end, 2)} minutes")
@@ -248,7 +323,7 @@ if __name__ == '__main__':
     # BUILD_TRANSFER, NETWORK_NAME, BUILD_TBTR_FILES = 1, "anaheim", 1
     BUILD_TE = 1
     if BUILD_TE == 1:
-        breaker, start_time, GENERATE_LOGFILE = initialize()
+        breaker, start_time, GENERATE_LOGFILE, SAVE_NETWORKX = initialize()
         stops_file, trips_file, stop_times_file, transfers_file, stops_dict, stoptimes_dict, footpath_dict, routes_by_stop_dict, idx_by_route_stop_dict, routesindx_by_stop_dict = read_testcase(
             NETWORK_NAME)
         if GENERATE_LOGFILE == 1:
@@ -9,49 +9,227 @@ from random import shuffle
 from time import time
 
 from Algorithms.TRANSFER_PATTERNS.transferpattern_func import *
+from Algorithms.TBTR.TBTR_functions import str_trip_transfer_dict
+from gtfs_loader import build_departures_dict, build_trip_offsets
 from miscellaneous_func import *
 
 
-def run_tbtr(SOURCE) -> None:
+SOURCE_CHUNK = 16
+ROUTE_DEGREE_WEIGHT = 0.01
+CUT_STOP_WEIGHT = 1.0
+
+
+def get_tp_folder(NETWORK_NAME, HUB_COUNT, STP_PARTITIONS, STP_SCHEME, HUB_METHOD) -> str:
+    """
+    Directory of the shards and manifest. The packed store is saved next to it as {folder}.bin.
+
+    Args:
+        NETWORK_NAME (str): name of the network
+        HUB_COUNT (int):  Number of hub stops
+        STP_PARTITIONS (int): number of partitions for scalable transfer patterns. 0 for transfer patterns.
+        STP_SCHEME (str): weighing scheme of the scalable transfer patterns partitions.
+        HUB_METHOD (str): hub selection method. See get_tp_store_name.
+
+    Returns:
+        folder (str)
+
+    """
+    if STP_PARTITIONS != 0:
+        return f"./Data/Transfer_Patterns/stp/{NETWORK_NAME}_{STP_SCHEME}_{STP_PARTITIONS}"
+    return get_tp_store_name(NETWORK_NAME, HUB_COUNT, HUB_METHOD)
+
+
+def get_hub_params() -> dict:
+    """
+    Parameters of the hub selection saved with the hubs (see save_hub_dict). Sampled hubs depend on the sample and the weights.
+
+    Returns:
+        hub_params (dict)
+
     """
-    Generate transfer patterns in parallel using TBTR. Transfer patterns are saved locally.
+    if HUB_METHOD != "sampled":
+        return {}
+    return {"sample_size": HUB_SAMPLE_SIZE, "route_degree_weight": ROUTE_DEGREE_WEIGHT, "cut_stop_weight": CUT_STOP_WEIGHT,
+            "partitions": NO_OF_PARTITION, "scheme": WEIGHING_SCHEME}
+
+
+def get_search_space(SOURCE) -> tuple:
+    """
+    Destinations and blocked stops (stops from which the search is not continued, see onetoall_rraptor_forhubs) of SOURCE.
+    For transfer patterns, all stops are destinations and hubs are blocked.
+    For scalable transfer patterns (STP_PARTITIONS != 0):
+        stop inside a cell: local patterns. Destinations are the stops of the cell (including its border stops) and all stops outside
+            the cell are blocked, so the search stays in the cell.
+        border stop: global patterns to all border stops and local patterns into the cells it borders. Nothing is blocked.
 
     Args:
         SOURCE (int): stop id of source stop.
 
     Returns:
-        None
+        DESTINATION_LIST (list): list of stop ids of destination stops.
+        blocked_stops (set): stop ids of blocked stops.
+
+    """
+    if STP_PARTITIONS == 0:
+        return list(routes_by_stop_dict.keys()), hubstops
+    cells = [cid for cid in cell_blocked_stops if SOURCE in cluster_info[cid]]
+    if SOURCE in cluster_info[-1] or not cells:
+        return list(cluster_info[-1].union(*[cluster_info[cid] for cid in cells], {SOURCE})), set()
+    return list(cluster_info[cells[0]]), cell_blocked_stops[cells[0]]
 
+
+def run_tbtr(SOURCE) -> list:
     """
-    DESTINATION_LIST = list(routes_by_stop_dict.keys())
+    Generate transfer patterns using TBTR.
+
+    Args:
+        SOURCE (int): stop id of source stop.
+
+    Returns:
+        output (list): list of stop sequence transfer patterns
+
+    """
+    DESTINATION_LIST, blocked_stops = get_search_space(SOURCE)
     # print(SOURCE, psutil.Process().cpu_num())
     output = onetomany_rtbtr_forhubs(SOURCE, DESTINATION_LIST, d_time_groups, MAX_TRANSFER, WALKING_FROM_SOURCE, PRINT_ITINERARY,
                                      OPTIMIZED, routes_by_stop_dict, stops_dict, stoptimes_dict, footpath_dict, idx_by_route_stop_dict, trip_transfer_dict,
-                                     trip_set, hubstops)
-    with open(f"./Data/TRANSFER_PATTERNS/{NETWORK_NAME}_{HUB_COUNT}/{SOURCE}", "wb") as fp:
-        pickle.dump(output, fp)
-    return None
+                                     trip_set, blocked_stops)
+    return output
 
 
-def run_raptor(SOURCE):
+def run_raptor(SOURCE) -> list:
     """
-    Generate transfer patterns in parallel using RAPTOR. Transfer patterns are saved locally.
+    Generate transfer patterns using RAPTOR.
 
     Args:
         SOURCE (int): stop id of source stop.
 
     Returns:
-        None
+        output (list): list of stop sequence transfer patterns
 
     """
-    DESTINATION_LIST = list(routes_by_stop_dict.keys())
+    DESTINATION_LIST, blocked_stops = get_search_space(SOURCE)
     # print(SOURCE, psutil.Process().cpu_num())
     output = onetoall_rraptor_forhubs(SOURCE, DESTINATION_LIST, d_time_groups, MAX_TRANSFER, WALKING_FROM_SOURCE, CHANGE_TIME_SEC,
                                       PRINT_ITINERARY, OPTIMIZED, routes_by_stop_dict, stops_dict, stoptimes_dict,
-                                      footpath_dict, idx_by_route_stop_dict, hubstops)
-    with open(f"./Data/Transfer_Patterns/{NETWORK_NAME}_{HUB_COUNT}/{SOURCE}", "wb") as fp:
-        pickle.dump(output, fp)
-    return None
+                                      footpath_dict, idx_by_route_stop_dict, blocked_stops, departures_dict)
+    return output
+
+
+def run_source_chunk(source_chunk: list) -> tuple:
+    """
+    Generate transfer patterns for a chunk of sources (work item of the pool). Results are appended as (SOURCE, transfer patterns)
+    records to the shard file of the worker process (shard_{RUN_ID}_{pid}.pkl), which is flushed to disk before returning. A source
+    that raises an error is reported as failed and is recomputed on the next (resumed) run.
+
+    Args:
+        source_chunk (list): stop ids of source stops.
+
+    Returns:
+        done (list): stop ids of the sources saved to the shard.
+        failed (list): list of tuples of format: (stop id, error message)
+
+    """
+    done, failed = [], []
+    with open(f"{TP_FOLDER}/shard_{RUN_ID}_{os.getpid()}.pkl", "ab") as fp:
+        for SOURCE in source_chunk:
+            try:
+                output = run_tbtr(SOURCE) if USE_TBTR == 1 else run_raptor(SOURCE)
+            except Exception as error:
+                failed.append((SOURCE, repr(error)))
+                continue
+            pickle.dump((SOURCE, output), fp)
+            done.append(SOURCE)
+        fp.flush()
+        os.fsync(fp.fileno())
+    return done, failed
+
+
+def read_manifest(folder) -> set:
+    """
+    Reads the checkpoint manifest, i.e., the stop ids of the sources whose transfer patterns are saved in a shard.
+    A last line without newline (interrupted write) is ignored, and so are sources without a complete record in the shards
+    (see read_transfer_pattern_shards). These sources are computed again.
+
+    Args:
+        folder (str): directory of the shards. See get_tp_folder.
+
+    Returns:
+        completed (set): stop ids of completed sources.
+
+    """
+    manifest_path = f"{folder}/manifest.txt"
+    if not os.path.exists(manifest_path):
+        return set()
+    with open(manifest_path, "r") as manifest:
+        completed = {int(line) for line in manifest if line.endswith("\n") and line.strip()}
+    if not completed:
+        return completed
+    return completed.intersection(SOURCE for SOURCE, _ in read_transfer_pattern_shards(folder))
+
+
+def compute_transfer_patterns(source_LIST, CORES, USE_PARALlEL) -> list:
+    """
+    Work queue over the sources that are not in the manifest. Sources are split into chunks of SOURCE_CHUNK and consumed with
+    imap_unordered, so idle workers pick the next chunk. Completed sources are appended to the manifest as soon as their chunk
+    returns, so an interrupted run can be resumed.
+
+    Args:
+        source_LIST (list): stop ids of all source stops.
+        CORES (int): Number of codes to be used
+        USE_PARALlEL (int): 1 for parallel and 0 for serial
+
+    Returns:
+        failed (list): list of tuples of format: (stop id, error message)
+
+    """
+    completed = read_manifest(TP_FOLDER)
+    pending = [SOURCE for SOURCE in source_LIST if SOURCE not in completed]
+    print(f"Sources completed earlier: {len(source_LIST) - len(pending)}. Sources pending: {len(pending)}")
+    chunks = [pending[x: x + SOURCE_CHUNK] for x in range(0, len(pending), SOURCE_CHUNK)]
+    failed = []
+    pool = Pool(CORES) if USE_PARALlEL == 1 else None
+    try:
+        results = pool.imap_unordered(run_source_chunk, chunks) if pool is not None else map(run_source_chunk, chunks)
+        with open(f"{TP_FOLDER}/manifest.txt", "a") as manifest, \
+                tqdm(total=len(pending), unit="source", smoothing=0.05) as progress:
+            for done, chunk_failed in results:
+                manifest.writelines(f"{SOURCE}\n" for SOURCE in done)
+                manifest.flush()
+                failed.extend(chunk_failed)
+                progress.update(len(done) + len(chunk_failed))
+                progress.set_postfix(failed=len(failed))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return failed
+
+
+def select_sampled_hubs(source_LIST, CORES, USE_PARALlEL) -> list:
+    """
+    Hub selection stage. Transfer patterns (without hubs) are computed for the first HUB_SAMPLE_SIZE sources of the (shuffled)
+    source_LIST and stops are ranked with get_sampledhubs. Cut stops of the KaHyPar partitions are favoured if NO_OF_PARTITION is not 0.
+
+    Args:
+        source_LIST (list): stop ids of all source stops (shuffled).
+        CORES (int): Number of codes to be used
+        USE_PARALlEL (int): 1 for parallel and 0 for serial
+
+    Returns:
+        ranking (list): list of tuples of format: (stop_id, score) in decreasing order of score.
+
+    """
+    sample = source_LIST[:HUB_SAMPLE_SIZE]
+    run_source = run_tbtr if USE_TBTR == 1 else run_raptor
+    print(f"Selecting hubs from {len(sample)} sampled sources...")
+    if USE_PARALlEL == 1:
+        with Pool(CORES) as pool:
+            sampled_transferpatterns = list(tqdm(pool.imap_unordered(run_source, sample), total=len(sample)))
+    else:
+        sampled_transferpatterns = [run_source(SOURCE) for SOURCE in tqdm(sample)]
+    cut_stops = read_cut_stops(NETWORK_NAME, NO_OF_PARTITION, WEIGHING_SCHEME) if NO_OF_PARTITION != 0 else set()
+    return get_sampledhubs(routes_by_stop_dict, NETWORK_NAME, sampled_transferpatterns, cut_stops, ROUTE_DEGREE_WEIGHT, CUT_STOP_WEIGHT, get_hub_params())
 
 
 def initialize() -> tuple:
@@ -73,6 +251,13 @@ def initialize() -> tuple:
         GENERATE_LOGFILE (int): 1 to redirect and save a log file. Else 0
         USE_TBTR (int): 1 to use TBTR for generating transfer patterns. 0 for RAPTOR
         CHANGE_TIME_SEC (int): change-time in seconds.
+        RESUME (int): 1 to resume from the checkpoint manifest. 0 to delete earlier results and start again.
+        HUB_METHOD (str): hub selection method. brute (needs transfer patterns without hubs) or sampled (see select_sampled_hubs).
+        HUB_SAMPLE_SIZE (int): number of sampled sources for sampled hub selection.
+        NO_OF_PARTITION (int): number of KaHyPar partitions whose cut stops are favoured as hubs. 0 to ignore partitions.
+        WEIGHING_SCHEME (str): weighing scheme of the partitions.
+        STP_PARTITIONS (int): number of KaHyPar partitions for scalable transfer patterns. 0 to build transfer patterns.
+        STP_SCHEME (str): weighing scheme of the scalable transfer patterns partitions.
 
     """
     breaker = "________________________________________________________________"
@@ -85,47 +270,62 @@ def initialize() -> tuple:
     import psutil
     print(f'RAM {round(psutil.virtual_memory().total / (1024.0 ** 3))} GB (% used:{psutil.virtual_memory()[2]})')
     start_time = time()
-    HUB_COUNT = int(input("Enter the number of hub stops. Else press 0. Example: 0\n: "))
+    STP_PARTITIONS, STP_SCHEME = 0, None
+    if int(input("Press 1 to build Scalable Transfer Patterns over the KaHyPar partitions (kpartitions). Else press 0. Example: 0\n: ")) == 1:
+        STP_PARTITIONS = int(input("Enter number of partitions. Example: 4\n: "))
+        STP_SCHEME = str(input("Enter weighing scheme [S1, S2, S3 S4 S5 S6]\n: "))
+    HUB_COUNT = 0
+    if STP_PARTITIONS == 0:
+        HUB_COUNT = int(input("Enter the number of hub stops. Else press 0. Example: 0\n: "))
+    HUB_METHOD, HUB_SAMPLE_SIZE, NO_OF_PARTITION, WEIGHING_SCHEME = "brute", 0, 0, None
+    if HUB_COUNT != 0:
+        if int(input("Press 1 to select hubs from sampled profile queries. Press 0 to use brute force hubs. Example: 1\n: ")) == 1:
+            HUB_METHOD = "sampled"
+            HUB_SAMPLE_SIZE = int(input("Enter number of sampled source stops. Example: 500\n: "))
+            NO_OF_PARTITION = int(input("Enter number of partitions to favour cut stops as hubs. Else press 0. Example: 0\n: "))
+            if NO_OF_PARTITION != 0:
+                WEIGHING_SCHEME = str(input("Enter weighing scheme [S1, S2, S3 S4 S5 S6]\n: "))
     MAX_TRANSFER = int(input("Enter maximum transfer limit for which transfer patterns would be built. Example: 4\n: "))
     WALKING_FROM_SOURCE = int(input("Press 1 to allow walking from source stop else press 0. Example: 1\n: "))
     GENERATE_LOGFILE = int(input("Press 1 to generate logfile else press 0. Example: 0\n: "))
     if GENERATE_LOGFILE == 1:
         print("All outputs will be redirected to log file")
     USE_TBTR = int(input("Press 1 to use TBTR to build Transfer Patterns.\nPress 2 to use RAPTOR to build Transfer Patterns. Example: 2\n: "))
+    RESUME = int(input("Press 1 to resume an interrupted build (completed sources are skipped). Press 0 to start again. Example: 0\n: "))
     PRINT_ITINERARY = 0
     OPTIMIZED = 1
     CHANGE_TIME_SEC = 0
     if not os.path.exists(f'./logs/.'):
         os.makedirs(f'./logs/.')
-    if not os.path.exists(f'./Data/Transfer_Patterns/{NETWORK_NAME}_{HUB_COUNT}/.'):
-        os.makedirs(f'./Data/Transfer_Patterns/{NETWORK_NAME}_{HUB_COUNT}/.')
+    if not os.path.exists(f'{get_tp_folder(NETWORK_NAME, HUB_COUNT, STP_PARTITIONS, STP_SCHEME, HUB_METHOD)}/.'):
+        os.makedirs(f'{get_tp_folder(NETWORK_NAME, HUB_COUNT, STP_PARTITIONS, STP_SCHEME, HUB_METHOD)}/.')
 
-    return breaker, CORES, start_time, USE_PARALlEL, HUB_COUNT, MAX_TRANSFER, WALKING_FROM_SOURCE, PRINT_ITINERARY, OPTIMIZED, GENERATE_LOGFILE, USE_TBTR, CHANGE_TIME_SEC
+    return breaker, CORES, start_time, USE_PARALlEL, HUB_COUNT, MAX_TRANSFER, WALKING_FROM_SOURCE, PRINT_ITINERARY, OPTIMIZED, GENERATE_LOGFILE, USE_TBTR, CHANGE_TIME_SEC, RESUME, \
+           HUB_METHOD, HUB_SAMPLE_SIZE, NO_OF_PARTITION, WEIGHING_SCHEME, STP_PARTITIONS, STP_SCHEME
 
 
-def remove_older_files(NETWORK_NAME, HUB_COUNT) -> None:
+def remove_older_files(folder) -> None:
     """
     Creates a new (empty) directory for saving transfer patterns.
 
     Args:
-                NETWORK_NAME (str): name of the network
-        HUB_COUNT (int):  Number of hub stops
+        folder (str): directory of the shards. See get_tp_folder.
 
     Returns:
         None
 
     """
-    if not os.path.exists(f"Algorithms/TRANSFER_PATTERNS/{NETWORK_NAME}_{HUB_COUNT}/."):
-        os.makedirs(f"Algorithms/TRANSFER_PATTERNS/{NETWORK_NAME}_{HUB_COUNT}/.")
-    files = glob.glob(f'Algorithms/TRANSFER_PATTERNS/{NETWORK_NAME}_{HUB_COUNT}/*')
+    if not os.path.exists(f"{folder}/."):
+        os.makedirs(f"{folder}/.")
+    files = glob.glob(f'{folder}/*')
     if files != []:
-        print(f"Cleaning existing files (if any) in directory ./Data/Transfer_Patterns/{NETWORK_NAME}_{HUB_COUNT}/")
+        print(f"Cleaning existing files (if any) in directory {folder}/")
         for f in files:
             os.remove(f)
     return None
 
 
-def post_process(runtime, CORES, HUB_COUNT, NETWORK_NAME) -> None:
+def post_process(runtime, CORES, HUB_COUNT, folder) -> None:
     """
     Post process and print the statistics realted to transfer patterns.
 
@@ -139,7 +339,7 @@ def post_process(runtime, CORES, HUB_COUNT, NETWORK_NAME) -> None:
         None
 
     """
-    Folderpath = f'./Data/TRANSFER_PATTERNS/{NETWORK_NAME}_{HUB_COUNT}'
+    Folderpath = folder
     total_kb_list = [os.path.getsize(ele) for ele in os.scandir(Folderpath)]
     file_count = len(total_kb_list)
     total_kb = sum(total_kb_list)
@@ -150,7 +350,9 @@ def post_process(runtime, CORES, HUB_COUNT, NETWORK_NAME) -> None:
     print(f'CORES USED: {CORES}')
     print(f'HUB_COUNT: {HUB_COUNT}')
     print(f'Space: {round(Gb_size, 2)} GB ({round(MB_size, 2)} MB)')
-    print(f'Total files saved: {file_count}')
+    print(f"Total files saved (shards and manifest): {file_count}")
+    store_size = os.path.getsize(f'{folder}.bin') / (1024 ** 2)
+    print(f'Transfer pattern store: {round(store_size, 2)} MB')
     print("Transfer Patterns preprocessing complete")
     print(breaker)
     return None
@@ -162,7 +364,8 @@ if __name__ == "__main__":
     BUILD_TRANSFER, NETWORK_NAME, BUILD_TBTR_FILES, BUILD_TRANSFER_PATTERNS_FILES, BUILD_CSA = parameter_files
     # BUILD_TRANSFER, NETWORK_NAME, BUILD_TBTR_FILES, BUILD_TP = 1, "anaheim", 1, 1
     if BUILD_TRANSFER_PATTERNS_FILES == 1:
-        breaker, CORES, start_time, USE_PARALlEL, HUB_COUNT, MAX_TRANSFER, WALKING_FROM_SOURCE, PRINT_ITINERARY, OPTIMIZED, GENERATE_LOGFILE, USE_TBTR, CHANGE_TIME_SEC = initialize()
+        breaker, CORES, start_time, USE_PARALlEL, HUB_COUNT, MAX_TRANSFER, WALKING_FROM_SOURCE, PRINT_ITINERARY, OPTIMIZED, GENERATE_LOGFILE, USE_TBTR, CHANGE_TIME_SEC, RESUME, \
+            HUB_METHOD, HUB_SAMPLE_SIZE, NO_OF_PARTITION, WEIGHING_SCHEME, STP_PARTITIONS, STP_SCHEME = initialize()
         print(breaker)
         stops_file, trips_file, stop_times_file, transfers_file, stops_dict, stoptimes_dict, footpath_dict, routes_by_stop_dict, idx_by_route_stop_dict, routesindx_by_stop_dict = read_testcase(
             NETWORK_NAME)
@@ -172,44 +375,44 @@ if __name__ == "__main__":
         print(f"Network: {NETWORK_NAME}")
         print(f'CORES used ={CORES}')
         print(breaker)
-        # Import Hub information
-        hubs_dict = {}
-        if HUB_COUNT != 0:
-            method = "brute"
-            with open(f'./Data/Transfer_Patterns/{NETWORK_NAME}_hub_{method}.pkl', 'rb') as file:
-                hubs_dict = pickle.load(file)
-        hubs_dict[0] = []
-        hubstops = hubs_dict[HUB_COUNT]
-        remove_older_files(NETWORK_NAME, HUB_COUNT)
+        TP_FOLDER = get_tp_folder(NETWORK_NAME, HUB_COUNT, STP_PARTITIONS, STP_SCHEME, HUB_METHOD)
+        if RESUME == 0:
+            remove_older_files(TP_FOLDER)
+        RUN_ID = int(time())
         # Main code
         source_LIST = list(routes_by_stop_dict.keys())
         # source_LIST = source_LIST[:50]
         shuffle(source_LIST)
         d_time_groups = stop_times_file.groupby("stop_id")
-        print("Generating transfer patterns...")
+        departures_dict = build_departures_dict(stoptimes_dict)
         if USE_TBTR == 1:
-            try:
-                with open(f'./Data/TBTR/{NETWORK_NAME}/TBTR_trip_transfer_dict.pkl', 'rb') as file:
-                    trip_transfer_dict = pickle.load(file)
-                trip_set = set(trip_transfer_dict.keys())
-            except FileNotFoundError:
+            TBTR_files = load_TBTR(NETWORK_NAME)
+            if TBTR_files is None:
                 print("TBTR files not found. Either build TBTR or reinitialize using RAPTOR")
-            if USE_PARALlEL == 1:
-                with Pool(CORES) as pool:
-                    result = pool.map(run_tbtr, source_LIST)
-                runtime = round((time() - start_time) / 60, 1)
-            else:
-                result = [run_tbtr(source) for source in tqdm(source_LIST)]
-                runtime = round((time() - start_time) / 60, 1)
-        else:
-            if USE_PARALlEL == 1:
-                with Pool(CORES) as pool:
-                    result = pool.map(run_raptor, source_LIST)
-                runtime = round((time() - start_time) / 60, 1)
             else:
-                # source = 36
-                result = [run_raptor(source) for source in tqdm(source_LIST)]
-                runtime = round((time() - start_time) / 60, 1)
-        post_process(runtime, CORES, HUB_COUNT, NETWORK_NAME)
+                trip_transfer_dict = str_trip_transfer_dict(TBTR_files[0], build_trip_offsets(stoptimes_dict))
+                trip_set = set(trip_transfer_dict.keys())
+        # Import Hub information
+        hubs_dict, hub_params, hubstops = {0: []}, None, []
+        if HUB_COUNT != 0:
+            # Sampled hubs are only reused when resuming. load_hub_dict rejects hubs selected with other parameters.
+            if HUB_METHOD == "sampled" and (RESUME == 0 or not os.path.exists(f'./Data/Transfer_Patterns/{NETWORK_NAME}_hub_{HUB_METHOD}.pkl')):
+                select_sampled_hubs(source_LIST, CORES, USE_PARALlEL)
+            hubs_dict, hub_params = load_hub_dict(NETWORK_NAME, HUB_METHOD, get_hub_params())
+        hubstops = hubs_dict[HUB_COUNT]
+        if STP_PARTITIONS != 0:
+            cluster_info = read_cluster_info(NETWORK_NAME, STP_PARTITIONS, STP_SCHEME)
+            cell_blocked_stops = {cid: set(routes_by_stop_dict.keys()).difference(cluster_info[cid]) for cid in range(STP_PARTITIONS)}
+            print(f"Cells: {STP_PARTITIONS}. Border stops: {len(cluster_info[-1])}")
+        print("Generating transfer patterns...")
+        failed = compute_transfer_patterns(source_LIST, CORES, USE_PARALlEL)
+        if failed:
+            print(f"Transfer patterns failed for {len(failed)} sources (rerun with resume to retry). Example: {failed[0]}")
+        print("Packing transfer patterns...")
+        store_meta = {"network": NETWORK_NAME, "hub_count": HUB_COUNT, "hub_method": HUB_METHOD if HUB_COUNT != 0 else None, "hub_params": hub_params,
+                      "partitions": STP_PARTITIONS, "scheme": STP_SCHEME}
+        pack_transfer_pattern_shards(TP_FOLDER, f"{TP_FOLDER}.bin", store_meta)
+        runtime = round((time() - start_time) / 60, 1)
+        post_process(runtime, CORES, HUB_COUNT, TP_FOLDER)
 
         sys.stdout.close()
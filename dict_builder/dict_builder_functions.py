@@ -3,8 +3,10 @@ Module defines a function to save (using pickling) the GTFS information in the f
 This is done for easy/faster data lookup.
 """
 
+import math
 import pickle
 
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
@@ -92,6 +94,193 @@ def build_save_stopstimes_dict(stop_times_file, trips_file, NETWORK_NAME: str) -
     return stoptimes_dict
 
 
+def build_save_stoptimes_array(stoptimes_dict: dict, NETWORK_NAME: str) -> tuple:
+    """
+    This function saves a columnar version of stoptimes_dict. For every route, arrival times of all its trips are stored in a
+    2D numpy array of shape (trips, stops) as int32 seconds since the service day. Row order is same as in stoptimes_dict
+    (i.e., increasing order of departure time) and column order is same as in stops_dict.
+
+    Args:
+        stoptimes_dict (dict): keys: route ID, values: list of trips in the increasing order of start time. Format-> dict[route_ID] = [trip_1, trip_2] where trip_1 = [(stop id, arrival time), (stop id, arrival time)]
+        NETWORK_NAME (str): name of the network
+    Returns:
+        stoptimes_array (dict): Format {route_id: numpy.ndarray of shape (trips, stops) and dtype int32}.
+        service_day (pandas.datetime): midnight of the service day. All integer times are relative to it.
+    """
+    print("building stoptimes array")
+    service_day = min(trips[0][0][1] for trips in stoptimes_dict.values()).normalize()
+    stoptimes_array = {}
+    for r_id, trips in tqdm(stoptimes_dict.items()):
+        route_times = pd.to_datetime([arrival_time for trip in trips for _, arrival_time in trip])
+        seconds = (route_times - service_day).total_seconds().values.astype(np.int32)
+        stoptimes_array[r_id] = seconds.reshape(len(trips), len(trips[0]))
+
+    with open(f'./dict_builder/{NETWORK_NAME}/stoptimes_array_pkl.pkl', 'wb') as pickle_file:
+        pickle.dump({"service_day": service_day, "stoptimes_array": stoptimes_array}, pickle_file)
+    print("stoptimes array done")
+    return stoptimes_array, service_day
+
+
+def build_trip_index(stops_dict: dict, stoptimes_array: dict) -> dict:
+    """
+    Flattens the routes and the columnar timetable into CSR arrays. Routes are sorted by route id. Trip j of the route at
+    position r gets the integer trip id route_trip_offsets[r] + j. Arrival times of trip t are
+    stop_times[trip_time_offsets[t]: trip_time_offsets[t + 1]] (one entry per stop of the route). trip_route[t] and trip_idx[t] give
+    the usual "route_trip" trip id.
+
+    Args:
+        stops_dict (dict): keys: route_id, values: list of stop id in the route_id. Format-> dict[route_id] = [stop_id]
+        stoptimes_array (dict): Format {route_id: numpy.ndarray of shape (trips, stops) and dtype int32}.
+
+    Returns:
+        arrays (dict): keys: route_ids, route_stop_offsets, route_stops, route_trip_offsets, trip_time_offsets, stop_times, trip_route, trip_idx.
+    """
+    route_ids = sorted(stoptimes_array.keys())
+    trip_count = [len(stoptimes_array[r_id]) for r_id in route_ids]
+    route_trip_offsets = np.concatenate([[0], np.cumsum(trip_count)]).astype(np.int64)
+    trip_length = np.repeat([len(stops_dict[r_id]) for r_id in route_ids], trip_count)
+    return {
+        "route_ids": np.array(route_ids, dtype=np.int64),
+        "route_stop_offsets": np.concatenate([[0], np.cumsum([len(stops_dict[r_id]) for r_id in route_ids])]).astype(np.int64),
+        "route_stops": np.array([stop for r_id in route_ids for stop in stops_dict[r_id]], dtype=np.int32),
+        "route_trip_offsets": route_trip_offsets,
+        "trip_time_offsets": np.concatenate([[0], np.cumsum(trip_length)]).astype(np.int64),
+        "stop_times": np.concatenate([stoptimes_array[r_id].ravel() for r_id in route_ids]).astype(np.int32),
+        "trip_route": np.repeat(route_ids, trip_count).astype(np.int64),
+        "trip_idx": (np.arange(route_trip_offsets[-1]) - np.repeat(route_trip_offsets[:-1], trip_count)).astype(np.int32),
+    }
+
+
+def build_stop_route_index(arrays: dict, max_stop: int) -> dict:
+    """
+    Builds the routes passing through every stop in CSR layout indexed by stop id. Routes of stop s are
+    stop_route_ids[stop_route_offsets[s]: stop_route_offsets[s + 1]] (in increasing order of route id) and stop_route_idx holds the
+    (first) index of s in each of them. Used for routes_by_stop_dict, idx_by_route_stop_dict and routesindx_by_stop_dict views.
+
+    Args:
+        arrays (dict): output of build_trip_index.
+        max_stop (int): largest stop id in the network.
+
+    Returns:
+        arrays (dict): keys: stop_route_offsets, stop_route_ids, stop_route_idx.
+    """
+    route_length = np.diff(arrays["route_stop_offsets"])
+    entry_stop = arrays["route_stops"].astype(np.int64)
+    entry_route = np.repeat(arrays["route_ids"], route_length)
+    entry_idx = np.arange(len(entry_stop)) - np.repeat(arrays["route_stop_offsets"][:-1], route_length)
+    order = np.lexsort((entry_idx, entry_route, entry_stop))
+    entry_stop, entry_route, entry_idx = entry_stop[order], entry_route[order], entry_idx[order]
+    first = np.ones(len(entry_stop), dtype=bool)
+    first[1:] = (entry_stop[1:] != entry_stop[:-1]) | (entry_route[1:] != entry_route[:-1])
+    entry_stop, entry_route, entry_idx = entry_stop[first], entry_route[first], entry_idx[first]
+    return {
+        "stop_route_offsets": np.concatenate([[0], np.cumsum(np.bincount(entry_stop, minlength=max_stop + 1))]).astype(np.int64),
+        "stop_route_ids": entry_route.astype(np.int64),
+        "stop_route_idx": entry_idx.astype(np.int32),
+    }
+
+
+def build_transfer_csr(trip_transfer_dict: dict, trip_time_offsets) -> dict:
+    """
+    Converts the TBTR trip-transfer dict to CSR arrays indexed by (integer trip id, stop index) slots. Slot of stop index i of
+    trip t is trip_time_offsets[t] + i (same as its arrival time in stop_times). Transfers from the slot are
+    transfer_trip[transfer_offsets[slot]: transfer_offsets[slot + 1]] with matching transfer_stop_idx.
+
+    Args:
+        trip_transfer_dict (nested dict): Format {integer trip id: {stop index: [(to integer trip id, to stop index)]}}.
+        trip_time_offsets (numpy.ndarray): see build_trip_index.
+
+    Returns:
+        arrays (dict): keys: transfer_offsets, transfer_trip, transfer_stop_idx.
+    """
+    slot_count = int(trip_time_offsets[-1])
+    transfer_count = np.zeros(slot_count + 1, dtype=np.int64)
+    from_slot, to_trip, to_stop_idx = [], [], []
+    for tid, stop_transfers in tqdm(trip_transfer_dict.items()):
+        base = int(trip_time_offsets[tid])
+        for s_idx in sorted(stop_transfers.keys()):
+            for to_tid, to_idx in stop_transfers[s_idx]:
+                from_slot.append(base + s_idx)
+                to_trip.append(to_tid)
+                to_stop_idx.append(to_idx)
+    from_slot = np.array(from_slot, dtype=np.int64)
+    order = np.argsort(from_slot, kind="stable")
+    np.add.at(transfer_count, from_slot + 1, 1)
+    return {
+        "transfer_offsets": np.cumsum(transfer_count).astype(np.int64),
+        "transfer_trip": np.array(to_trip, dtype=np.int32)[order],
+        "transfer_stop_idx": np.array(to_stop_idx, dtype=np.int32)[order],
+    }
+
+
+def build_save_trip_transfer_csr(NETWORK_NAME: str, stops_dict: dict, stoptimes_array: dict, trip_transfer_dict: dict) -> dict:
+    """
+    Saves the TBTR trip-transfers in CSR layout to ./Data/TBTR/{NETWORK_NAME}/TBTR_trip_transfer_csr.bin. The file is memory-mapped by
+    load_TBTR (with USE_CSR=1) instead of unpickling TBTR_trip_transfer_dict.pkl.
+
+    Args:
+        NETWORK_NAME (str): name of the network
+        stops_dict (dict): keys: route_id, values: list of stop id in the route_id. Format-> dict[route_id] = [stop_id]
+        stoptimes_array (dict): Format {route_id: numpy.ndarray of shape (trips, stops) and dtype int32}.
+        trip_transfer_dict (nested dict): Format {integer trip id: {stop index: [(to integer trip id, to stop index)]}}.
+
+    Returns:
+        arrays (dict): keys: route_ids, route_trip_offsets, trip_time_offsets, trip_route, trip_idx, transfer_offsets, transfer_trip,
+            transfer_stop_idx. See build_trip_index and build_transfer_csr.
+    """
+    from gtfs_loader import save_array_file
+    print("building trip-transfer CSR")
+    trip_index = build_trip_index(stops_dict, stoptimes_array)
+    arrays = {key: trip_index[key] for key in ["route_ids", "route_trip_offsets", "trip_time_offsets", "trip_route", "trip_idx"]}
+    arrays.update(build_transfer_csr(trip_transfer_dict, arrays["trip_time_offsets"]))
+    save_array_file(f'./Data/TBTR/{NETWORK_NAME}/TBTR_trip_transfer_csr.bin', arrays, {"network": NETWORK_NAME})
+    print("trip-transfer CSR done")
+    return arrays
+
+
+def build_save_network_snapshot(NETWORK_NAME: str, stops_dict: dict, stoptimes_array: dict, service_day, footpath_dict: dict,
+                                trip_transfer_dict: dict = None) -> dict:
+    """
+    Saves a single versioned snapshot of the network (routes, stops, trips, stop times, footpaths and optionally TBTR
+    trip-transfers) as flat numpy arrays. The file can be memory-mapped (see gtfs_loader.load_network_snapshot), so loading
+    takes milliseconds and processes on one host share the page cache. Times are int32 seconds since service_day.
+
+    Args:
+        NETWORK_NAME (str): name of the network
+        stops_dict (dict): keys: route_id, values: list of stop id in the route_id. Format-> dict[route_id] = [stop_id]
+        stoptimes_array (dict): Format {route_id: numpy.ndarray of shape (trips, stops) and dtype int32}.
+        service_day (pandas.datetime): midnight of the service day.
+        footpath_dict (dict): keys: from stop_id, values: list of tuples of form (to stop id, footpath duration).
+        trip_transfer_dict (nested dict): TBTR trip-transfers. Format {integer trip id: {stop index: [(to integer trip id, to stop index)]}}.
+
+    Returns:
+        arrays (dict): arrays of build_trip_index, build_stop_route_index, build_transfer_csr (if trip_transfer_dict is given) and
+            footpath_offsets, footpath_to, footpath_time (CSR indexed by stop id).
+    """
+    from gtfs_loader import save_array_file, duration_seconds
+    print("building network snapshot")
+    arrays = build_trip_index(stops_dict, stoptimes_array)
+    max_stop = int(max(int(arrays["route_stops"].max()), max([max([from_stop] + [to_stop for to_stop, _ in footpaths]) for from_stop, footpaths in footpath_dict.items()],
+                                                              default=0)))
+    footpath_count = np.zeros(max_stop + 2, dtype=np.int64)
+    footpath_to, footpath_time = [], []
+    for from_stop in sorted(footpath_dict.keys()):
+        footpath_count[int(from_stop) + 1] = len(footpath_dict[from_stop])
+        for to_stop, duration in footpath_dict[from_stop]:
+            footpath_to.append(to_stop)
+            # rounded up as in gtfs_loader.build_int_footpath_dict, so a walk never looks shorter than in the pandas timetable
+            footpath_time.append(math.ceil(duration_seconds(duration)))
+    arrays["footpath_offsets"] = np.cumsum(footpath_count).astype(np.int64)
+    arrays["footpath_to"] = np.array(footpath_to, dtype=np.int32)
+    arrays["footpath_time"] = np.array(footpath_time, dtype=np.int32)
+    arrays.update(build_stop_route_index(arrays, max_stop))
+    if trip_transfer_dict is not None:
+        arrays.update(build_transfer_csr(trip_transfer_dict, arrays["trip_time_offsets"]))
+    save_array_file(f'./dict_builder/{NETWORK_NAME}/network_snapshot.bin', arrays, {"network": NETWORK_NAME, "service_day": str(service_day)})
+    print("network snapshot done")
+    return arrays
+
+
 def build_save_footpath_dict(transfers_file, NETWORK_NAME: str) -> dict:
     """
     This function saves a dictionary to provide easy access to all the footpaths through a stop id.
@@ -1,12 +1,22 @@
 """
-Module contains functions to load the GTFS data.
+Module contains functions to load the GTFS data, the network snapshot and to switch between the pandas and integer-seconds time representation.
 """
+import math
+from collections.abc import Mapping, Sequence
 
+INF_SECONDS = 10 ** 9  # "infinite" time used when the timetable is stored as seconds since the service day
+SNAPSHOT_MAGIC = b"TRSNAP\x00\x00"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_ALIGN = 64  # byte alignment of every array in a snapshot file
 
-def load_all_dict(NETWORK_NAME: str):
+
+def load_all_dict(NETWORK_NAME: str, INT_TIMETABLE: int = 0):
     """
     Args:
         NETWORK_NAME (str): network NETWORK_NAME.
+        INT_TIMETABLE (int): 1 or 0. 1 means stoptimes_dict and footpath_dict are returned with integer seconds (since the service day)
+            instead of pandas.datetime/pandas.timedelta. If the network snapshot exists, all dicts are views on it (see
+            load_dicts_from_snapshot). Else, the integer timetable is built from the columnar stoptimes array.
 
     Returns:
         stops_dict (dict): preprocessed dict. Format {route_id: [ids of stops in the route]}.
@@ -18,9 +28,15 @@ def load_all_dict(NETWORK_NAME: str):
 
     Examples:
         >>> stops_dict, stoptimes_dict, footpath_dict, routes_by_stop_dict, idx_by_route_stop_dict, routesindx_by_stop_dict = load_all_dict('anaheim')
+        >>> stops_dict, stoptimes_dict, footpath_dict, routes_by_stop_dict, idx_by_route_stop_dict, routesindx_by_stop_dict = load_all_dict('anaheim', 1)
 
     """
     import pickle
+    if INT_TIMETABLE == 1:
+        try:
+            return load_dicts_from_snapshot(load_network_snapshot(NETWORK_NAME)[0])
+        except (FileNotFoundError, ValueError):
+            pass
     with open(f'./dict_builder/{NETWORK_NAME}/stops_dict_pkl.pkl', 'rb') as file:
         stops_dict = pickle.load(file)
     with open(f'./dict_builder/{NETWORK_NAME}/stoptimes_dict_pkl.pkl', 'rb') as file:
@@ -33,13 +49,414 @@ def load_all_dict(NETWORK_NAME: str):
         idx_by_route_stop_dict = pickle.load(file)
     with open(f'./dict_builder/{NETWORK_NAME}/routesindx_by_stop.pkl', 'rb') as file:
         routesindx_by_stop_dict = pickle.load(file)
+    if INT_TIMETABLE == 1:
+        stoptimes_array, _ = load_stoptimes_array(NETWORK_NAME)
+        stoptimes_dict = build_int_stoptimes_dict(stoptimes_array, stops_dict)
+        footpath_dict = build_int_footpath_dict(footpath_dict)
+    return stops_dict, stoptimes_dict, footpath_dict, routes_by_stop_dict, idx_by_route_stop_dict, routesindx_by_stop_dict
+
+
+def load_stoptimes_array(NETWORK_NAME: str) -> tuple:
+    """
+    Loads the columnar timetable built by dict_builder_functions.build_save_stoptimes_array.
+
+    Args:
+        NETWORK_NAME (str): network NETWORK_NAME.
+
+    Returns:
+        stoptimes_array (dict): Format {route_id: numpy.ndarray of shape (trips, stops) and dtype int32}. Entry [i, j] is the arrival time
+            (in seconds since service_day) of i-th trip of the route at j-th stop of the route.
+        service_day (pandas.datetime): midnight of the service day. All integer times are relative to it.
+
+    Examples:
+        >>> stoptimes_array, service_day = load_stoptimes_array('anaheim')
+    """
+    import pickle
+    with open(f'./dict_builder/{NETWORK_NAME}/stoptimes_array_pkl.pkl', 'rb') as file:
+        timetable = pickle.load(file)
+    return timetable["stoptimes_array"], timetable["service_day"]
+
+
+def build_int_stoptimes_dict(stoptimes_array: dict, stops_dict: dict) -> dict:
+    """
+    Builds stoptimes_dict (same layout as the pickled one) with integer seconds in place of pandas.datetime.
+
+    Args:
+        stoptimes_array (dict): Format {route_id: numpy.ndarray of shape (trips, stops)}.
+        stops_dict (dict): preprocessed dict. Format {route_id: [ids of stops in the route]}.
+
+    Returns:
+        stoptimes_dict (dict): Format-> dict[route_ID] = [trip_1, trip_2] where trip_1 = [(stop id, arrival time in seconds), ...]
+
+    Examples:
+        >>> stoptimes_dict = build_int_stoptimes_dict(stoptimes_array, stops_dict)
+    """
+    return {r_id: [list(zip(stops_dict[r_id], trip)) for trip in route_array.tolist()] for r_id, route_array in stoptimes_array.items()}
+
+
+def build_int_footpath_dict(footpath_dict: dict) -> dict:
+    """
+    Converts footpath durations from pandas.timedelta to integer seconds. Durations are rounded up, so a walk never looks shorter
+    than in the pandas timetable (a connection that cannot be caught stays uncatchable). Stop ids are cast to int.
+
+    Args:
+        footpath_dict (dict): preprocessed dict. Format {from_stop_id: [(to_stop_id, footpath_time)]}.
+
+    Returns:
+        footpath_dict (dict): Format {from_stop_id: [(to_stop_id, footpath_time in seconds)]}.
+
+    Examples:
+        >>> footpath_dict = build_int_footpath_dict(footpath_dict)
+    """
+    return {from_stop: [(int(to_stop), math.ceil(duration.total_seconds())) for to_stop, duration in footpaths]
+            for from_stop, footpaths in footpath_dict.items()}
+
+
+def build_departures_dict(stoptimes_dict: dict) -> dict:
+    """
+    Builds a per-route, per-stop departure index. Since trips along a route are FIFO (see GTFS_wrapper.remove_overlapping_trips),
+    departure times of the trips at every stop are already sorted and can be binary searched.
+
+    Args:
+        stoptimes_dict (dict): preprocessed dict. Format {route_id: [[trip_1], [trip_2]]}. Times can be pandas.datetime or int.
+
+    Returns:
+        departures_dict (dict): Format {route_id: [[departure time of trip_1, trip_2, ... at stop index 0], [... at stop index 1], ...]}.
+            If stoptimes_dict is a snapshot view, columns are read from the snapshot on access.
+
+    Examples:
+        >>> departures_dict = build_departures_dict(stoptimes_dict)
+    """
+    if isinstance(stoptimes_dict, SnapshotStoptimes):
+        return {r_id: _RouteDepartures(stoptimes_dict.route_times(r_id)) for r_id in stoptimes_dict}
+    return {r_id: [list(stop_departures) for stop_departures in zip(*[[arrival_time for _, arrival_time in trip] for trip in trips])]
+            for r_id, trips in stoptimes_dict.items()}
+
+
+def build_trip_offsets(stoptimes_dict: dict) -> tuple:
+    """
+    Builds a dense integer numbering of trips. Routes are taken in increasing order of route id and trips of a route are
+    numbered consecutively (same order as in stoptimes_dict). Hence, trips of a route form the range
+    [route_first_trip[route], route_last_trip[route]). The numbering is same as in dict_builder_functions.build_trip_index.
+
+    Args:
+        stoptimes_dict (dict): preprocessed dict. Format {route_id: [[trip_1], [trip_2]]}.
+
+    Returns:
+        trip_offsets (tuple): (route_first_trip, route_last_trip, trip_route, trip_idx) where
+            route_first_trip (dict): Format {route_id: integer id of first trip of the route}.
+            route_last_trip (dict): Format {route_id: integer id of last trip of the route + 1}.
+            trip_route (list): route id of every integer trip id.
+            trip_idx (list): index (in stoptimes_dict[route]) of every integer trip id.
+
+    Examples:
+        >>> trip_offsets = build_trip_offsets(stoptimes_dict)
+    """
+    route_first_trip, route_last_trip, trip_route, trip_idx = {}, {}, [], []
+    for r_id in sorted(stoptimes_dict.keys()):
+        route_first_trip[r_id] = len(trip_route)
+        trip_route.extend([r_id] * len(stoptimes_dict[r_id]))
+        trip_idx.extend(range(len(stoptimes_dict[r_id])))
+        route_last_trip[r_id] = len(trip_route)
+    return route_first_trip, route_last_trip, trip_route, trip_idx
+
+
+def save_array_file(path: str, arrays: dict, meta: dict = None) -> None:
+    """
+    Saves numpy arrays to a single binary file that can be memory-mapped. Layout: SNAPSHOT_MAGIC (8 bytes), version (uint32),
+    header length (uint32), json header, followed by the raw arrays. The header stores meta and, for every array, its
+    dtype, shape and byte offset. Offsets are aligned to SNAPSHOT_ALIGN bytes.
+
+    Args:
+        path (str): path of the file.
+        arrays (dict): Format {name: numpy.ndarray}.
+        meta (dict): json serializable information saved in the header.
+
+    Returns:
+        None
+
+    Examples:
+        >>> save_array_file('./dict_builder/anaheim/network_snapshot.bin', arrays, {"service_day": "2022-06-30"})
+    """
+    import json
+    import struct
+    import numpy as np
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    toc = {name: {"dtype": array.dtype.str, "shape": list(array.shape), "offset": 0} for name, array in arrays.items()}
+    # Offsets depend on the header length, which depends on the offsets. Reserve room for the largest possible offsets first.
+    header_len = len(json.dumps({"meta": meta or {}, "arrays": {name: dict(entry, offset=2 ** 62) for name, entry in toc.items()}}).encode())
+    offset = -(-(16 + header_len) // SNAPSHOT_ALIGN) * SNAPSHOT_ALIGN
+    for name, array in arrays.items():
+        toc[name]["offset"] = offset
+        offset = offset + -(-array.nbytes // SNAPSHOT_ALIGN) * SNAPSHOT_ALIGN
+    header = json.dumps({"meta": meta or {}, "arrays": toc}).encode().ljust(header_len)
+    with open(path, "wb") as file:
+        file.write(SNAPSHOT_MAGIC + struct.pack("<II", SNAPSHOT_VERSION, header_len) + header)
+        for name, array in arrays.items():
+            file.seek(toc[name]["offset"])
+            file.write(array.tobytes())
+        file.truncate(offset)
+    return None
+
+
+def load_array_file(path: str) -> tuple:
+    """
+    Memory-maps all arrays of a file written by save_array_file. Nothing is copied: arrays are read-only views on the page
+    cache, so processes loading the same file share memory.
+
+    Args:
+        path (str): path of the file.
+
+    Returns:
+        arrays (dict): Format {name: numpy.memmap}.
+        meta (dict): information saved in the header.
+
+    Examples:
+        >>> arrays, meta = load_array_file('./dict_builder/anaheim/network_snapshot.bin')
+    """
+    import json
+    import struct
+    import numpy as np
+    with open(path, "rb") as file:
+        if file.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a snapshot file")
+        version, header_len = struct.unpack("<II", file.read(8))
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"{path} has snapshot version {version}. Expected {SNAPSHOT_VERSION}. Rebuild the snapshot.")
+        header = json.loads(file.read(header_len))
+    arrays = {}
+    for name, entry in header["arrays"].items():
+        if 0 in entry["shape"]:
+            arrays[name] = np.empty(entry["shape"], dtype=entry["dtype"])
+        else:
+            arrays[name] = np.memmap(path, dtype=entry["dtype"], mode="r", offset=entry["offset"], shape=tuple(entry["shape"]))
+    return arrays, header["meta"]
+
+
+def load_network_snapshot(NETWORK_NAME: str) -> tuple:
+    """
+    Loads the network snapshot built by dict_builder_functions.build_save_network_snapshot.
+
+    Args:
+        NETWORK_NAME (str): name of the network
+
+    Returns:
+        arrays (dict): Format {name: numpy.memmap}. See dict_builder_functions.build_save_network_snapshot for the layout.
+        service_day (pandas.datetime): midnight of the service day. All integer times are relative to it.
+
+    Examples:
+        >>> arrays, service_day = load_network_snapshot('anaheim')
+    """
+    import pandas as pd
+    arrays, meta = load_array_file(f'./dict_builder/{NETWORK_NAME}/network_snapshot.bin')
+    return arrays, pd.Timestamp(meta["service_day"])
+
+
+def load_dicts_from_snapshot(arrays: dict) -> tuple:
+    """
+    Returns the preprocessed dicts (same format as load_all_dict with INT_TIMETABLE=1) as read-only views on the snapshot arrays.
+    Nothing is copied when loading: every lookup reads the memory-mapped arrays, so processes on one host share the timetable.
+
+    Args:
+        arrays (dict): snapshot arrays. See load_network_snapshot.
+
+    Returns:
+        stops_dict, stoptimes_dict, footpath_dict, routes_by_stop_dict, idx_by_route_stop_dict, routesindx_by_stop_dict. See load_all_dict.
+
+    Examples:
+        >>> arrays, service_day = load_network_snapshot('anaheim')
+        >>> stops_dict, stoptimes_dict, footpath_dict, routes_by_stop_dict, idx_by_route_stop_dict, routesindx_by_stop_dict = load_dicts_from_snapshot(arrays)
+    """
+    if "stop_route_offsets" not in arrays:
+        raise ValueError("network snapshot has no stop-route index. Rebuild the snapshot.")
+    route_pos = {r_id: r_pos for r_pos, r_id in enumerate(arrays["route_ids"].tolist())}
+    stops_dict = SnapshotRoutes(arrays, route_pos)
+    stoptimes_dict = SnapshotStoptimes(arrays, route_pos)
+    footpath_dict = StopCSRView(arrays["footpath_offsets"], arrays["footpath_to"], arrays["footpath_time"])
+    routes_by_stop_dict = StopCSRView(arrays["stop_route_offsets"], arrays["stop_route_ids"])
+    idx_by_route_stop_dict = SnapshotRouteStopIndex(arrays)
+    routesindx_by_stop_dict = StopCSRView(arrays["stop_route_offsets"], arrays["stop_route_ids"], arrays["stop_route_idx"])
     return stops_dict, stoptimes_dict, footpath_dict, routes_by_stop_dict, idx_by_route_stop_dict, routesindx_by_stop_dict
 
 
-def load_all_db(NETWORK_NAME: str):
+def build_stop_times_from_snapshot(arrays: dict):
+    """
+    Builds stop_times_file (columns trip_id, stop_sequence, stop_id, arrival_time, route_id) from the snapshot arrays. arrival_time is in
+    integer seconds since the service day, so no GTFS time string is parsed.
+
+    Args:
+        arrays (dict): snapshot arrays. See load_network_snapshot.
+
+    Returns:
+        stop_times_file (pandas.dataframe)
+    """
+    import numpy as np
+    import pandas as pd
+    trip_length = np.diff(arrays["trip_time_offsets"])
+    row_trip = np.repeat(np.arange(len(trip_length)), trip_length)
+    stop_sequence = np.arange(len(arrays["stop_times"])) - np.repeat(arrays["trip_time_offsets"][:-1], trip_length)
+    trip_route_pos = np.repeat(np.arange(len(arrays["route_ids"])), np.diff(arrays["route_trip_offsets"]))
+    row_route = np.asarray(arrays["trip_route"])[row_trip]
+    return pd.DataFrame({
+        "trip_id": pd.Series(row_route).astype(str) + "_" + pd.Series(np.asarray(arrays["trip_idx"])[row_trip]).astype(str),
+        "stop_sequence": stop_sequence,
+        "stop_id": np.asarray(arrays["route_stops"])[arrays["route_stop_offsets"][trip_route_pos[row_trip]] + stop_sequence],
+        "arrival_time": np.asarray(arrays["stop_times"], dtype=np.int64),
+        "route_id": row_route,
+    })
+
+
+class SnapshotRoutes(Mapping):
+    """
+    Read-only view on the routes of a network snapshot. Behaves like stops_dict, i.e., {route_id: [ids of stops in the route]}.
+
+    Args:
+        arrays (dict): snapshot arrays. See load_network_snapshot.
+        route_pos (dict): Format {route_id: position of the route in arrays["route_ids"]}.
+    """
+
+    def __init__(self, arrays: dict, route_pos: dict):
+        self.route_pos = route_pos
+        self.route_stop_offsets = arrays["route_stop_offsets"]
+        self.route_stops = arrays["route_stops"]
+
+    def __getitem__(self, r_id: int) -> list:
+        r_pos = self.route_pos[r_id]
+        return self.route_stops[self.route_stop_offsets[r_pos]: self.route_stop_offsets[r_pos + 1]].tolist()
+
+    def __iter__(self):
+        return iter(self.route_pos)
+
+    def __len__(self) -> int:
+        return len(self.route_pos)
+
+
+class SnapshotStoptimes(SnapshotRoutes):
+    """
+    Read-only view on the timetable of a network snapshot. Behaves like stoptimes_dict with integer times, i.e.,
+    {route_id: [trip_1, trip_2]} where trip_1 = [(stop id, arrival time)]. Trips of a route are read one at a time.
+
+    Args:
+        arrays (dict): snapshot arrays. See load_network_snapshot.
+        route_pos (dict): Format {route_id: position of the route in arrays["route_ids"]}.
+    """
+
+    def __init__(self, arrays: dict, route_pos: dict):
+        super().__init__(arrays, route_pos)
+        self.route_trip_offsets = arrays["route_trip_offsets"]
+        self.trip_time_offsets = arrays["trip_time_offsets"]
+        self.stop_times = arrays["stop_times"]
+
+    def route_times(self, r_id: int):
+        """
+        Returns the arrival times of all trips of a route as an array of shape (trips, stops) (a view, nothing is copied).
+        """
+        r_pos = self.route_pos[r_id]
+        start, end = self.trip_time_offsets[self.route_trip_offsets[r_pos]], self.trip_time_offsets[self.route_trip_offsets[r_pos + 1]]
+        return self.stop_times[start: end].reshape(-1, int(self.route_stop_offsets[r_pos + 1] - self.route_stop_offsets[r_pos]))
+
+    def __getitem__(self, r_id: int):
+        return _RouteTrips(super().__getitem__(r_id), self.route_times(r_id))
+
+
+class _RouteTrips(Sequence):
+    """
+    Trips of a single route. Behaves like stoptimes_dict[route_id], i.e., [[(stop id, arrival time)]].
+    """
+
+    def __init__(self, stops: list, times):
+        self.stops = stops
+        self.times = times
+
+    def __getitem__(self, trip_idx):
+        if isinstance(trip_idx, slice):
+            return [self[idx] for idx in range(*trip_idx.indices(len(self)))]
+        return list(zip(self.stops, self.times[trip_idx].tolist()))
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+
+class _RouteDepartures(Sequence):
+    """
+    Departures of a single route. Behaves like departures_dict[route_id], i.e., [[departure times of all trips at stop index 0], ...].
+    """
+
+    def __init__(self, times):
+        self.times = times
+
+    def __getitem__(self, stop_idx):
+        if isinstance(stop_idx, slice):
+            return [self[idx] for idx in range(*stop_idx.indices(len(self)))]
+        return self.times[:, stop_idx].tolist()
+
+    def __len__(self) -> int:
+        return self.times.shape[1]
+
+
+class StopCSRView(Mapping):
+    """
+    Read-only view on arrays in CSR layout indexed by stop id. Entries of stop s are column[offsets[s]: offsets[s + 1]]. With one
+    column, behaves like {stop id: [value]} (e.g., routes_by_stop_dict). With more columns, behaves like {stop id: [(value, value)]}
+    (e.g., footpath_dict). Stops without entries are not keys.
+
+    Args:
+        offsets (numpy.ndarray): CSR offsets (one more than the number of stops).
+        *columns (numpy.ndarray): value arrays.
+    """
+
+    def __init__(self, offsets, *columns):
+        self.offsets = offsets
+        self.columns = columns
+
+    def __getitem__(self, stop: int) -> list:
+        if not 0 <= stop < len(self.offsets) - 1 or self.offsets[stop] == self.offsets[stop + 1]:
+            raise KeyError(stop)
+        start, end = self.offsets[stop], self.offsets[stop + 1]
+        if len(self.columns) == 1:
+            return self.columns[0][start: end].tolist()
+        return list(zip(*[column[start: end].tolist() for column in self.columns]))
+
+    def __iter__(self):
+        import numpy as np
+        return iter(np.flatnonzero(np.diff(self.offsets)).tolist())
+
+    def __len__(self) -> int:
+        import numpy as np
+        return int(np.count_nonzero(np.diff(self.offsets)))
+
+
+class SnapshotRouteStopIndex(Mapping):
+    """
+    Read-only view on the stop-route index of a network snapshot. Behaves like idx_by_route_stop_dict, i.e., {(route id, stop id): stop index in route}.
+
+    Args:
+        arrays (dict): snapshot arrays. See load_network_snapshot.
+    """
+
+    def __init__(self, arrays: dict):
+        self.routes_at_stop = StopCSRView(arrays["stop_route_offsets"], arrays["stop_route_ids"], arrays["stop_route_idx"])
+
+    def __getitem__(self, route_stop: tuple) -> int:
+        r_id, stop = route_stop
+        for route, stop_idx in self.routes_at_stop.get(stop, []):
+            if route == r_id:
+                return stop_idx
+        raise KeyError(route_stop)
+
+    def __iter__(self):
+        return ((route, stop) for stop, routes in self.routes_at_stop.items() for route, _ in routes)
+
+    def __len__(self) -> int:
+        return len(self.routes_at_stop.columns[0])
+
+
+def load_all_db(NETWORK_NAME: str, snapshot_arrays: dict = None):
     """
     Args:
         NETWORK_NAME (str): name of the network
+        snapshot_arrays (dict): network snapshot arrays. If given, stop_times_file is built from the snapshot (with integer
+            arrival times, see build_stop_times_from_snapshot) instead of parsing stop_times.txt.
 
     Returns:
         stops_file (pandas.dataframe): dataframe with stop details.
@@ -55,9 +472,114 @@ def load_all_db(NETWORK_NAME: str):
     path = f"./Data/GTFS/{NETWORK_NAME}"
     stops_file = pd.read_csv(f'{path}/stops.txt', sep=',').sort_values(by=['stop_id']).reset_index(drop=True)
     trips_file = pd.read_csv(f'{path}/trips.txt', sep=',')
-    stop_times_file = pd.read_csv(f'{path}/stop_times.txt', sep=',')
-    stop_times_file.arrival_time = pd.to_datetime(stop_times_file.arrival_time)
+    if snapshot_arrays is not None:
+        stop_times_file = build_stop_times_from_snapshot(snapshot_arrays)
+    else:
+        stop_times_file = pd.read_csv(f'{path}/stop_times.txt', sep=',')
+        stop_times_file.arrival_time = pd.to_datetime(stop_times_file.arrival_time)
     if "route_id" not in stop_times_file.columns:
         stop_times_file = pd.merge(stop_times_file, trips_file, on='trip_id')
     transfers_file = pd.read_csv(f'{path}/transfers.txt', sep=',')
     return stops_file, trips_file, stop_times_file, transfers_file
+
+
+def to_service_seconds(timestamp, service_day):
+    """
+    Converts pandas.datetime (or a pandas.Series of it) to integer seconds since service_day.
+
+    Args:
+        timestamp (pandas.datetime or pandas.Series): time(s) to convert.
+        service_day (pandas.datetime): midnight of the service day.
+
+    Returns:
+        int (or pandas.Series of int)
+
+    Examples:
+        >>> D_TIME = to_service_seconds(pd.to_datetime('2022-06-30 05:41:00'), service_day)
+        >>> stop_times_file.arrival_time = to_service_seconds(stop_times_file.arrival_time, service_day)
+    """
+    delta = timestamp - service_day
+    if hasattr(delta, "dt"):
+        return delta.dt.total_seconds().astype(int)
+    return int(delta.total_seconds())
+
+
+def from_service_seconds(seconds: int, service_day):
+    """
+    Converts integer seconds since service_day back to pandas.datetime.
+
+    Args:
+        seconds (int): seconds since service_day.
+        service_day (pandas.datetime): midnight of the service day.
+
+    Returns:
+        pandas.datetime
+
+    Examples:
+        >>> arrival = from_service_seconds(20460, service_day)
+    """
+    import pandas as pd
+    return service_day + pd.to_timedelta(int(seconds), unit='seconds')
+
+
+def get_time_constants(D_TIME=None, CHANGE_TIME_SEC: int = 0) -> tuple:
+    """
+    Returns infinite time and change time in the same representation as D_TIME. This lets query algorithms run
+    unchanged on both the pandas timetable and the integer-seconds timetable.
+
+    Args:
+        D_TIME (pandas.datetime or int): departure time. None is treated as pandas.datetime.
+        CHANGE_TIME_SEC (int): change-time in seconds.
+
+    Returns:
+        inf_time (pandas.datetime or int): Variable indicating infinite time.
+        change_time (pandas.timedelta or int): change time. With CHANGE_TIME_SEC=0 this is the zero duration.
+
+    Examples:
+        >>> inf_time, change_time = get_time_constants(pd.to_datetime('2022-06-30 05:41:00'), 0)
+        >>> inf_time, change_time = get_time_constants(20460, 0)
+    """
+    import pandas as pd
+    if D_TIME is None or isinstance(D_TIME, pd.Timestamp):
+        inf_time = pd.to_datetime("today").round(freq='H') + pd.to_timedelta("365 day")
+        return inf_time, pd.to_timedelta(CHANGE_TIME_SEC, unit='seconds')
+    return INF_SECONDS, int(CHANGE_TIME_SEC)
+
+
+def format_clock(time_value) -> str:
+    """
+    Formats an arrival/departure time for printing itineraries.
+
+    Args:
+        time_value (pandas.datetime or int): time to format.
+
+    Returns:
+        str: time of day. Format HH:MM:SS
+
+    Examples:
+        >>> format_clock(20460)
+        '05:41:00'
+    """
+    if hasattr(time_value, "time"):
+        return str(time_value.time())
+    time_value = int(time_value)
+    return f"{time_value // 3600:02d}:{time_value % 3600 // 60:02d}:{time_value % 60:02d}"
+
+
+def duration_seconds(duration) -> float:
+    """
+    Returns the length of a footpath/duration in seconds.
+
+    Args:
+        duration (pandas.timedelta or int): duration.
+
+    Returns:
+        float: duration in seconds.
+
+    Examples:
+        >>> duration_seconds(pd.to_timedelta(120, unit='seconds'))
+        120.0
+    """
+    if hasattr(duration, "total_seconds"):
+        return duration.total_seconds()
+    return float(duration)
@@ -9,12 +9,16 @@ import networkx as nx
 import pandas as pd
 
 
-def read_testcase(NETWORK_NAME: str) -> tuple:
+def read_testcase(NETWORK_NAME: str, INT_TIMETABLE: int = 0, USE_SNAPSHOT: int = 1) -> tuple:
     """
     Reads the GTFS network and preprocessed dict. If the dicts are not present, dict_builder_functions are called to construct them.
 
     Args:
         NETWORK_NAME (str): name of the network
+        INT_TIMETABLE (int): 1 or 0. 1 means all times (stop_times_file.arrival_time, stoptimes_dict, footpath_dict) are returned as
+            integer seconds since the service day. If the network snapshot exists, the dicts are memory-mapped views on it and
+            stop_times.txt is not parsed (see gtfs_loader.load_dicts_from_snapshot). Else, see gtfs_loader.load_stoptimes_array.
+        USE_SNAPSHOT (int): 1 or 0. 0 means the network snapshot is ignored even if it exists.
 
     Returns:
         stops_file (pandas.dataframe):  stops.txt file in GTFS.
@@ -30,9 +34,17 @@ def read_testcase(NETWORK_NAME: str) -> tuple:
     Examples:
         >>> NETWORK_NAME = './anaheim'
         >>> read_testcase('NETWORK_NAME')
+        >>> read_testcase('NETWORK_NAME', INT_TIMETABLE=1)
     """
     import gtfs_loader
     from dict_builder import dict_builder_functions
+    if INT_TIMETABLE == 1 and USE_SNAPSHOT == 1:
+        try:
+            arrays, _ = gtfs_loader.load_network_snapshot(NETWORK_NAME)
+            network_dicts = gtfs_loader.load_dicts_from_snapshot(arrays)
+            return (*gtfs_loader.load_all_db(NETWORK_NAME, arrays), *network_dicts)
+        except (FileNotFoundError, ValueError):
+            pass
     stops_file, trips_file, stop_times_file, transfers_file = gtfs_loader.load_all_db(NETWORK_NAME)
     if not os.path.exists(f'./dict_builder/{NETWORK_NAME}/'):
         os.makedirs(f'./dict_builder/{NETWORK_NAME}/')
@@ -47,6 +59,16 @@ def read_testcase(NETWORK_NAME: str) -> tuple:
         footpath_dict = dict_builder_functions.build_save_footpath_dict(transfers_file, NETWORK_NAME)
         idx_by_route_stop_dict = dict_builder_functions.build_stop_idx_in_route(stop_times_file, NETWORK_NAME)
         routesindx_by_stop_dict = dict_builder_functions.build_routesindx_by_stop_dict(NETWORK_NAME)
+        stoptimes_array, service_day = dict_builder_functions.build_save_stoptimes_array(stoptimes_dict, NETWORK_NAME)
+        dict_builder_functions.build_save_network_snapshot(NETWORK_NAME, stops_dict, stoptimes_array, service_day, footpath_dict)
+    if INT_TIMETABLE == 1:
+        try:
+            stoptimes_array, service_day = gtfs_loader.load_stoptimes_array(NETWORK_NAME)
+        except FileNotFoundError:
+            stoptimes_array, service_day = dict_builder_functions.build_save_stoptimes_array(stoptimes_dict, NETWORK_NAME)
+        stoptimes_dict = gtfs_loader.build_int_stoptimes_dict(stoptimes_array, stops_dict)
+        footpath_dict = gtfs_loader.build_int_footpath_dict(footpath_dict)
+        stop_times_file.arrival_time = gtfs_loader.to_service_seconds(stop_times_file.arrival_time, service_day)
     return stops_file, trips_file, stop_times_file, transfers_file, stops_dict, stoptimes_dict, footpath_dict, routes_by_stop_dict, idx_by_route_stop_dict, routesindx_by_stop_dict
 
 
@@ -197,6 +219,55 @@ def read_partitions(stop_times_file, NETWORK_NAME: str, no_of_partitions: int, w
     return stop_out, route_groups, cut_trips, trip_groups
 
 
+def read_cut_stops(NETWORK_NAME: str, no_of_partitions: int, weighting_scheme: str) -> set:
+    """
+    Reads the cut stops of the KaHyPar partitions (./kpartitions/).
+
+    Args:
+        NETWORK_NAME (str): name of the network
+        no_of_partitions (int): number of partitions network has been divided into.
+        weighting_scheme (str): which weighing scheme has been used to generate partitions.
+
+    Returns:
+        cut_stops (set): stop ids of the cut stops (stop-cell id -1).
+
+    Examples:
+        >>> cut_stops = read_cut_stops('anaheim', 4, 'S2')
+    """
+    stop_out = pd.read_csv(f'./kpartitions/{NETWORK_NAME}/cutstops_{weighting_scheme}_{no_of_partitions}.csv', usecols=['stop_id', 'g_id']).astype(int)
+    return set(stop_out[stop_out.g_id == -1].stop_id)
+
+
+def read_cluster_info(NETWORK_NAME: str, no_of_partitions: int, weighting_scheme: str) -> dict:
+    """
+    Reads the cells of the KaHyPar partitions (./kpartitions/) for scalable transfer patterns. A cut stop is a border stop of every
+    cell listed in its boundary_g_id column.
+
+    Args:
+        NETWORK_NAME (str): name of the network
+        no_of_partitions (int): number of partitions network has been divided into.
+        weighting_scheme (str): which weighing scheme has been used to generate partitions.
+
+    Returns:
+        cluster_info (dict): Format {cell id: set of stop ids of the cell (including its border stops), -1: set of border stops}
+
+    Examples:
+        >>> cluster_info = read_cluster_info('anaheim', 4, 'S2')
+    """
+    import json
+    stop_out = pd.read_csv(f'./kpartitions/{NETWORK_NAME}/cutstops_{weighting_scheme}_{no_of_partitions}.csv', usecols=['stop_id', 'g_id', 'boundary_g_id'])
+    cluster_info = {cid: set() for cid in range(no_of_partitions)}
+    cluster_info[-1] = set()
+    for stop_id, g_id, boundary_g_id in zip(stop_out.stop_id.astype(int), stop_out.g_id.astype(int), stop_out.boundary_g_id):
+        if g_id == -1:
+            cluster_info[-1].add(stop_id)
+            for cid in json.loads(boundary_g_id):
+                cluster_info[cid].add(stop_id)
+        else:
+            cluster_info[g_id].add(stop_id)
+    return cluster_info
+
+
 def read_nested_partitions(stop_times_file, NETWORK_NAME: str, no_of_partitions: int, weighting_scheme: str) -> tuple:
     """
     Read fill-ins in case of nested partitioning.
@@ -422,73 +493,134 @@ def get_random_od(routes_by_stop_dict: dict, NETWORK_NAME: str) -> None:
     print(f"{NETWORK_NAME} random OD saved")
     return None
 
-def load_TE_graph(NETWORK_NAME: str, stop_times_file)-> tuple:
+def build_stop_events(events) -> dict:
+    """
+    Builds per-stop sorted event arrays of the Time expanded graph. Events of stop s are
+    event_node[stop_offsets[s]: stop_offsets[s + 1]] (node ids) and event_time[...] (arrival times in nanoseconds since epoch),
+    sorted by arrival time.
+
+    Args:
+        events (pandas.dataframe): stop events with node ids. Columns: stop_id, arrival_time, node.
+
+    Returns:
+        stop_events (dict): Format {"stop_offsets": numpy.ndarray, "event_node": numpy.ndarray, "event_time": numpy.ndarray}
+
+    Examples:
+        >>> stop_events = build_stop_events(events)
     """
-    Loads the Time expanded Graph
+    import numpy as np
+    events = events.sort_values(by=['stop_id', 'arrival_time'])
+    stop_ids = events.stop_id.to_numpy(dtype=np.int64)
+    stop_offsets = np.zeros(int(stop_ids.max()) + 2, dtype=np.int64)
+    np.cumsum(np.bincount(stop_ids, minlength=len(stop_offsets) - 1), out=stop_offsets[1:])
+    return {"stop_offsets": stop_offsets, "event_node": events.node.to_numpy(dtype=np.int32),
+            "event_time": events.arrival_time.to_numpy(dtype='datetime64[ns]').view(np.int64)}
+
+
+def load_TE_graph(NETWORK_NAME: str, stop_times_file, USE_CSR: int = 1)-> tuple:
+    """
+    Loads the Time expanded Graph and the per-stop event arrays (TE_events.bin, see build_stop_events).
 
     Args:
         NETWORK_NAME (str): name of the network
-        stop_times_file (pandas.dataframe): stop_times.txt file in GTFS.
+        stop_times_file (pandas.dataframe): stop_times.txt file in GTFS. Only used if TE_events.bin is missing.
+        USE_CSR (int): 1 or 0. 1 means the CSR graph (TE_csr.bin, memory-mapped) is loaded. If it is missing or USE_CSR=0,
+            the pickled networkx graph is loaded.
 
     Returns:
-        G: NetworkX graph object. Time exapnded graph
-        stops_group: pandas.groupby object.
-        stopevent_mapping (dict): mapping dictionary. Format: {(stop id, arrival time): new node id}
+        G: Time exapnded graph. dict of CSR arrays (indptr, indices, weights) or NetworkX graph object.
+        stop_events (dict): per-stop sorted event arrays. See build_stop_events.
 
     Examples:
-        >>> G, stops_group, stopevent_mapping = load_TE_graph('anaheim', stop_times_file)
+        >>> G, stop_events = load_TE_graph('anaheim', stop_times_file)
 
     """
     try:
-        with open(f"./Data/time_expanded/graph_{NETWORK_NAME[2:]}", 'rb') as file:
-            G = pickle.load(file)
-        stops_group = stop_times_file.groupby('stop_id')
-        temp = stop_times_file[['stop_id', 'arrival_time']].drop_duplicates().reset_index(drop=True)
-        stopevent_mapping = {x[1]: x[0] for x in enumerate(list(zip(temp['stop_id'], temp['arrival_time'])), 1)}
-
-        return G, stops_group, stopevent_mapping
+        from gtfs_loader import load_array_file
+        csr_path = f"./Data/time_expanded/{NETWORK_NAME}/TE_csr.bin"
+        if USE_CSR == 1 and os.path.exists(csr_path):
+            G, _ = load_array_file(csr_path)
+        else:
+            with open(f"./Data/time_expanded/graph_{NETWORK_NAME[2:]}", 'rb') as file:
+                G = pickle.load(file)
+        events_path = f"./Data/time_expanded/{NETWORK_NAME}/TE_events.bin"
+        if os.path.exists(events_path):
+            stop_events, _ = load_array_file(events_path)
+        else:
+            events = stop_times_file[['stop_id', 'arrival_time']].drop_duplicates().reset_index(drop=True)
+            events['node'] = events.index + 1
+            stop_events = build_stop_events(events)
+
+        return G, stop_events
     except FileNotFoundError:
         print("Time expanded files missing")
 
 
-def load_CSA(NETWORK_NAME: str):
+def load_CSA(NETWORK_NAME: str, USE_ARRAY: int = 0):
     """
     Loads the connection list for CSA
 
     Args:
         NETWORK_NAME (str): name of the network
+        USE_ARRAY (int): 1 or 0. 1 means the connection array (connections_array.npy, see build_CSA.build_save_connection_array) is
+            memory-mapped instead of unpickling the connection list.
 
     Returns:
         connections_list (list): list of tuples. format: [(from stop, to stop, from time, to time, trip id)].
+            If USE_ARRAY=1, numpy.ndarray with dtype csa_functions.CONNECTION_DTYPE.
 
     Examples:
         >>> connections_list = load_CSA('anaheim')
+        >>> connection_array = load_CSA('anaheim', USE_ARRAY=1)
     """
     try:
+        if USE_ARRAY == 1:
+            import numpy as np
+            return np.load(f'./Data/CSA/{NETWORK_NAME}/connections_array.npy', mmap_mode="r")
         with open(f'./Data/CSA/{NETWORK_NAME}/connections_list_pkl.pkl', 'rb') as file:
             connections_list = pickle.load(file)
         return connections_list
     except FileNotFoundError:
         print("CSA preprocessing missing")
 
-def load_TBTR(NETWORK_NAME: str)-> tuple:
+def load_TBTR(NETWORK_NAME: str, USE_CSR: int = 0)-> tuple:
     """
-    Loads the trip-transfer dict for TBTR
+    Loads the trip-transfer dict for TBTR. Pickles saved with trip ids of format "route_trip" are converted to integer trip ids.
 
     Args:
         NETWORK_NAME (str): name of the network
+        USE_CSR (int): 1 or 0. 1 means the memory-mapped CSR file (TBTR_trip_transfer_csr.bin) is loaded instead of the pickle.
+            In this case, both outputs are the same TripTransferCSR object.
 
     Returns:
-        trip_transfer_dict (nested dict): keys: id of trip we are transferring from, value: {stop number: list of tuples
-        trip_set (set): set of trip ids from which trip-transfers are available.
+        trip_transfer_dict (nested dict): keys: integer id of trip we are transferring from (see gtfs_loader.build_trip_offsets),
+            value: {stop number: list of tuples of form (integer id of trip we are transferring to, stop number)}
+        trip_set (set): set of integer trip ids from which trip-transfers are available.
 
     Examples:
         >>> trip_transfer_dict, trip_set = load_TBTR('anaheim')
+        >>> trip_transfer_dict, trip_set = load_TBTR('anaheim', USE_CSR=1)
 
     """
     try:
+        if USE_CSR == 1:
+            from Algorithms.TBTR.trip_transfer_csr import TripTransferCSR
+            from gtfs_loader import load_array_file
+            arrays, _ = load_array_file(f'./Data/TBTR/{NETWORK_NAME}/TBTR_trip_transfer_csr.bin')
+            trip_transfer_csr = TripTransferCSR(arrays)
+            return trip_transfer_csr, trip_transfer_csr
         with open(f'./Data/TBTR/{NETWORK_NAME}/TBTR_trip_transfer_dict.pkl', 'rb') as file:
             trip_transfer_dict = pickle.load(file)
+        if any(isinstance(tid, str) for tid in trip_transfer_dict):
+            # Built before trip ids became integers. Trip numbering only depends on stoptimes_dict, so the keys can be converted.
+            from Algorithms.TBTR.TBTR_functions import int_trip_transfer_dict
+            from gtfs_loader import build_trip_offsets
+            with open(f'./dict_builder/{NETWORK_NAME}/stoptimes_dict_pkl.pkl', 'rb') as file:
+                trip_offsets = build_trip_offsets(pickle.load(file))
+            try:
+                trip_transfer_dict = int_trip_transfer_dict(trip_transfer_dict, trip_offsets)
+            except (KeyError, ValueError, IndexError):
+                raise ValueError(f"TBTR_trip_transfer_dict.pkl of {NETWORK_NAME} does not match the network. Rebuild TBTR.")
         trip_set = set(trip_transfer_dict.keys())
         return trip_transfer_dict, trip_set
     except FileNotFoundError:
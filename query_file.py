@@ -13,6 +13,8 @@ from Algorithms.TBTR.rtbtr import rtbtr
 from Algorithms.TBTR.tbtr import tbtr
 from Algorithms.TIME_EXPANDED_DIJKSTRA.TE_DIJ import custom_dij
 from Algorithms.TRANSFER_PATTERNS.transferpattens import std_tp
+from Algorithms.TRANSFER_PATTERNS.transferpattern_func import build_direct_connection_table
+from gtfs_loader import build_departures_dict, build_trip_offsets
 from miscellaneous_func import *
 
 print_logo()
@@ -62,11 +64,11 @@ def main() -> None:
     if algorithm == 0:
         if variant == 0:
             output = raptor(SOURCE, DESTINATION, D_TIME, MAX_TRANSFER, WALKING_FROM_SOURCE, CHANGE_TIME_SEC, PRINT_ITINERARY,
-                            routes_by_stop_dict, stops_dict, stoptimes_dict, footpath_dict, idx_by_route_stop_dict)
+                            routes_by_stop_dict, stops_dict, stoptimes_dict, footpath_dict, idx_by_route_stop_dict, departures_dict)
             print(f"Optimal arrival time are: {output}")
         elif variant == 1:
             output = rraptor(SOURCE, DESTINATION, d_time_groups, MAX_TRANSFER, WALKING_FROM_SOURCE, CHANGE_TIME_SEC, PRINT_ITINERARY,
-                             OPTIMIZED, routes_by_stop_dict, stops_dict, stoptimes_dict, footpath_dict, idx_by_route_stop_dict)
+                             OPTIMIZED, routes_by_stop_dict, stops_dict, stoptimes_dict, footpath_dict, idx_by_route_stop_dict, departures_dict)
             if OPTIMIZED == 1:
                 print(f"Trips required to cover optimal journeys are {output}")
             else:
@@ -80,20 +82,20 @@ def main() -> None:
             #     print(f"Routes required to cover optimal journeys are {output}")
         elif variant == 3:
             output = hypraptor(SOURCE, DESTINATION, D_TIME, MAX_TRANSFER, WALKING_FROM_SOURCE, CHANGE_TIME_SEC, PRINT_ITINERARY,
-                               stop_out, route_groups, routes_by_stop_dict, stops_dict, stoptimes_dict, footpath_dict, idx_by_route_stop_dict)
+                               stop_out, route_groups, routes_by_stop_dict, stops_dict, stoptimes_dict, footpath_dict, idx_by_route_stop_dict, departures_dict)
             print(f"Optimal arrival time are: {output}")
         elif variant == 4:
             output = hypraptor(SOURCE, DESTINATION, D_TIME, MAX_TRANSFER, WALKING_FROM_SOURCE, CHANGE_TIME_SEC, PRINT_ITINERARY,
-                               nested_stop_out, nested_route_groups, routes_by_stop_dict, stops_dict, stoptimes_dict, footpath_dict, idx_by_route_stop_dict)
+                               nested_stop_out, nested_route_groups, routes_by_stop_dict, stops_dict, stoptimes_dict, footpath_dict, idx_by_route_stop_dict, departures_dict)
             print(f"Optimal arrival time are: {output}")
     if algorithm == 1:
         if variant == 0:
             output = tbtr(SOURCE, DESTINATION, D_TIME, MAX_TRANSFER, WALKING_FROM_SOURCE, PRINT_ITINERARY, routes_by_stop_dict, stops_dict, stoptimes_dict,
-                          footpath_dict, idx_by_route_stop_dict, trip_transfer_dict, trip_set)
+                          footpath_dict, idx_by_route_stop_dict, trip_transfer_dict, trip_set, trip_offsets)
             print(f"Optimal arrival times are: {output[0]}")
         elif variant == 1:
             output = rtbtr(SOURCE, DESTINATION, d_time_groups, MAX_TRANSFER, WALKING_FROM_SOURCE, PRINT_ITINERARY, OPTIMIZED,
-                           routes_by_stop_dict, stops_dict, stoptimes_dict, footpath_dict, idx_by_route_stop_dict, trip_transfer_dict, trip_set)
+                           routes_by_stop_dict, stops_dict, stoptimes_dict, footpath_dict, idx_by_route_stop_dict, trip_transfer_dict, trip_set, trip_offsets)
             if OPTIMIZED == 1:
                 print(f"Trips required to cover optimal journeys are {output}")
             else:
@@ -101,22 +103,23 @@ def main() -> None:
         elif variant == 2:
             output = onetomany_rtbtr(SOURCE, DESTINATION_LIST, d_time_groups, MAX_TRANSFER, WALKING_FROM_SOURCE, PRINT_ITINERARY,
                                      OPTIMIZED, routes_by_stop_dict, stops_dict, stoptimes_dict, footpath_dict, idx_by_route_stop_dict, trip_transfer_dict,
-                                     trip_set)
+                                     trip_set, trip_offsets)
             if OPTIMIZED == 1:
                 print(f"Trips required to cover optimal journeys are {output}")
             else:
                 print(f"Routes required to cover optimal journeys are {output}")
         elif variant == 3:
             output = hyptbtr(SOURCE, DESTINATION, D_TIME, MAX_TRANSFER, WALKING_FROM_SOURCE, PRINT_ITINERARY, stop_out, trip_groups,
-                             routes_by_stop_dict, stops_dict, stoptimes_dict, footpath_dict, idx_by_route_stop_dict, trip_transfer_dict, trip_set)
+                             routes_by_stop_dict, stops_dict, stoptimes_dict, footpath_dict, idx_by_route_stop_dict, trip_transfer_dict, trip_set, trip_offsets)
             print(f"Optimal arrival times are: {output[0]}")
         elif variant == 4:
             output = hyptbtr(SOURCE, DESTINATION, D_TIME, MAX_TRANSFER, WALKING_FROM_SOURCE, PRINT_ITINERARY, nested_stop_out, nested_trip_groups,
-                             routes_by_stop_dict, stops_dict, stoptimes_dict, footpath_dict, idx_by_route_stop_dict, trip_transfer_dict, trip_set)
+                             routes_by_stop_dict, stops_dict, stoptimes_dict, footpath_dict, idx_by_route_stop_dict, trip_transfer_dict, trip_set, trip_offsets)
             print(f"Optimal arrival times are: {output[0]}")
     if algorithm == 2:
         if variant == 0:
-            output = std_tp(SOURCE, DESTINATION, D_TIME, footpath_dict, NETWORK_NAME, routesindx_by_stop_dict, stoptimes_dict, hub_count, hubstops)
+            output = std_tp(SOURCE, DESTINATION, D_TIME, footpath_dict, NETWORK_NAME, routesindx_by_stop_dict, stoptimes_dict, hub_count, hubstops,
+                            direct_connection_table)
             print(f"Optimal arrival times are: {output}")
     if algorithm == 3:
         if variant == 0:
@@ -124,7 +127,7 @@ def main() -> None:
             print(f"Optimal arrival times is: {output}")
     if algorithm == 4:
         if variant == 0:
-            output = custom_dij(SOURCE, D_TIME, DESTINATION, G, stops_group, stopevent_mapping, stop_times_file)
+            output = custom_dij(SOURCE, DESTINATION, D_TIME, G, stop_events)
             print(f"Optimal arrival times is: {output}")
     return None
 
@@ -140,7 +143,7 @@ if __name__ == "__main__":
 
         trip_transfer_dict, trip_set = load_TBTR(NETWORK_NAME)
         connections_list = load_CSA(NETWORK_NAME)
-        G, stops_group, stopevent_mapping = load_TE_graph(NETWORK_NAME, stop_times_file)
+        G, stop_events = load_TE_graph(NETWORK_NAME, stop_times_file)
 
         print_network_details(transfers_file, trips_file, stops_file)
 
@@ -164,7 +167,7 @@ if __name__ == "__main__":
 
         trip_transfer_dict, trip_set = load_TBTR(NETWORK_NAME)
         connections_list = load_CSA(NETWORK_NAME)
-        G, stops_group, stopevent_mapping = load_TE_graph(NETWORK_NAME, stop_times_file)
+        G, stop_events = load_TE_graph(NETWORK_NAME, stop_times_file)
 
         print_network_details(transfers_file, trips_file, stops_file)
 
@@ -188,4 +191,7 @@ if __name__ == "__main__":
 
     # main function
     d_time_groups = stop_times_file.groupby("stop_id")
+    departures_dict = build_departures_dict(stoptimes_dict)
+    trip_offsets = build_trip_offsets(stoptimes_dict)
+    direct_connection_table = build_direct_connection_table(stoptimes_dict)
     main()
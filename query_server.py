@@ -0,0 +1,588 @@
+"""
+Persistent query engine. The network and the preprocessed files are loaded once and queries are answered from memory, either
+from a batch (jsonl) file or through a local HTTP/JSON server.
+"""
+import json
+import math
+import multiprocessing
+import os
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from random import Random
+from time import time
+
+from Algorithms.CSA.array_csa import array_csa
+from Algorithms.CSA.csa_functions import build_connection_array, get_stop_count
+from Algorithms.CSA.one_many_csa import onetomany_csa
+from Algorithms.CSA.profile_csa import profile_csa
+from Algorithms.CSA.std_csa import std_csa
+from Algorithms.RAPTOR.hypraptor import hypraptor
+from Algorithms.RAPTOR.raptor_workspace import RaptorWorkspace
+from Algorithms.RAPTOR.rraptor import rraptor
+from Algorithms.RAPTOR.std_raptor import raptor
+from Algorithms.TBTR.hyptbtr import hyptbtr
+from Algorithms.TBTR.one_many_tbtr import onetomany_rtbtr
+from Algorithms.TBTR.rtbtr import rtbtr
+from Algorithms.TBTR.tbtr import tbtr
+from Algorithms.TBTR.trip_transfer_csr import TripTransferCSR
+from Algorithms.TIME_EXPANDED_DIJKSTRA.TE_DIJ import custom_dij
+from Algorithms.TRANSFER_PATTERNS.transferpattens import std_stp, std_tp
+from Algorithms.TRANSFER_PATTERNS.transferpattern_func import build_direct_connection_table, get_tp_store_name, load_hub_dict, load_stp_store, \
+    load_transfer_pattern_store
+from gtfs_loader import INF_SECONDS, build_departures_dict, build_trip_offsets, load_network_snapshot, load_stoptimes_array, to_service_seconds
+from miscellaneous_func import *
+
+
+class QueryEngine:
+    """
+    Holds all the preprocessed structures of a network in memory and answers queries. Algorithm and variant codes are same as
+    in query_file.py:
+        algorithm: 0 for RAPTOR, 1 for TBTR, 2 for Transfer Patterns, 3 for CSA, 4 for Time Expanded Dijkstra
+        variant: 0 for normal version, 1 for range version, 2 for One-To-Many version, 3 for Hyper version, 4 for Nested Hyper version
+
+    Args:
+        NETWORK_NAME (str): name of the network
+        INT_TIMETABLE (int): 1 or 0. 1 means RAPTOR and TBTR run on the integer-seconds timetable and RAPTOR reuses a RaptorWorkspace
+            across queries. If the network snapshot exists, the timetable and TBTR trip-transfers are memory-mapped from it. CSA runs on the connection array (see csa_functions.build_connection_array). Time Expanded Dijkstra (whose
+            preprocessed files store pandas.datetime) is not loaded in this case.
+        MAX_TRANSFER (int): largest transfer limit accepted by the engine.
+        HUB_COUNT (int): number of hub stops used by Transfer Patterns.
+        HUB_METHOD (str): hub selection method used by Transfer Patterns preprocessing (brute or sampled).
+        NO_OF_PARTITION (int): number of partitions for HypRAPTOR, HypTBTR and Scalable Transfer Patterns (algorithm 2, variant 3).
+            If None, variants 3 and 4 are not available.
+        WEIGHING_SCHEME (str): weighing scheme of the partitions [S1, S2, S3 S4 S5 S6].
+        USE_SNAPSHOT (int): 1 or 0. 0 means the network snapshot is ignored even if it exists (see miscellaneous_func.read_testcase).
+
+    Examples:
+        >>> engine = QueryEngine('anaheim')
+        >>> engine.query(0, 0, 36, 52, '2022-06-30 05:41:00')
+    """
+
+    def __init__(self, NETWORK_NAME: str, INT_TIMETABLE: int = 0, MAX_TRANSFER: int = 4, HUB_COUNT: int = 0, NO_OF_PARTITION: int = None,
+                 WEIGHING_SCHEME: str = None, HUB_METHOD: str = "brute", USE_SNAPSHOT: int = 1):
+        self.NETWORK_NAME = NETWORK_NAME
+        self.INT_TIMETABLE = INT_TIMETABLE
+        self.MAX_TRANSFER = MAX_TRANSFER
+        self.HUB_COUNT = HUB_COUNT
+        self.HUB_METHOD = HUB_METHOD
+        self.stops_file, self.trips_file, self.stop_times_file, self.transfers_file, self.stops_dict, self.stoptimes_dict, self.footpath_dict, \
+            self.routes_by_stop_dict, self.idx_by_route_stop_dict, self.routesindx_by_stop_dict = read_testcase(NETWORK_NAME, INT_TIMETABLE, USE_SNAPSHOT)
+        self.d_time_groups = self.stop_times_file.groupby("stop_id")
+        self.departures_dict = build_departures_dict(self.stoptimes_dict)
+        self.trip_offsets = build_trip_offsets(self.stoptimes_dict)
+        self.direct_connection_table = build_direct_connection_table(self.stoptimes_dict)
+
+        self.snapshot_arrays, self.service_day = None, None
+        if INT_TIMETABLE == 1 and USE_SNAPSHOT == 1 and os.path.exists(f'./dict_builder/{NETWORK_NAME}/network_snapshot.bin'):
+            self.snapshot_arrays, self.service_day = load_network_snapshot(NETWORK_NAME)
+        if self.snapshot_arrays is not None and "transfer_offsets" in self.snapshot_arrays:
+            self.trip_transfer_dict = self.trip_set = TripTransferCSR(self.snapshot_arrays)
+        else:
+            self.trip_transfer_dict, self.trip_set = load_TBTR(NETWORK_NAME) or (None, None)
+        self.hubstops, hub_params = set(), None
+        if HUB_COUNT != 0:
+            hubs_dict, hub_params = load_hub_dict(NETWORK_NAME, HUB_METHOD)
+            self.hubstops = hubs_dict[HUB_COUNT]
+        self.tp_store = None
+        tp_folder = get_tp_store_name(NETWORK_NAME, HUB_COUNT, HUB_METHOD)
+        if os.path.exists(f'{tp_folder}.bin') or os.path.isdir(tp_folder):
+            self.tp_store = load_transfer_pattern_store(NETWORK_NAME, HUB_COUNT, HUB_METHOD, hub_params)
+
+        self.workspace = None
+        self.connections_list, self.G, self.stop_events = None, None, None
+        self.connection_array, self.stop_count = None, None
+        if INT_TIMETABLE == 1:
+            self.workspace = RaptorWorkspace(self.routes_by_stop_dict, MAX_TRANSFER)
+            if self.service_day is None:
+                _, self.service_day = load_stoptimes_array(NETWORK_NAME)
+            self.connection_array = load_CSA(NETWORK_NAME, USE_ARRAY=1)
+            if self.connection_array is None:
+                connections_list = load_CSA(NETWORK_NAME)
+                if connections_list is not None:
+                    self.connection_array = build_connection_array(connections_list, self.trip_offsets, self.service_day)
+            if self.connection_array is not None:
+                self.stop_count = get_stop_count(self.connection_array, self.footpath_dict, *self.routes_by_stop_dict.keys())
+        else:
+            self.connections_list = load_CSA(NETWORK_NAME)
+            self.G, self.stop_events = load_TE_graph(NETWORK_NAME, self.stop_times_file) or (None, None)
+
+        self.partitions = {}
+        if NO_OF_PARTITION is not None:
+            stop_out, route_groups, _, trip_groups = read_partitions(self.stop_times_file, NETWORK_NAME, no_of_partitions=NO_OF_PARTITION,
+                                                                     weighting_scheme=WEIGHING_SCHEME, partitioning_algorithm="kahypar")
+            self.partitions[3] = (stop_out, route_groups, trip_groups)
+            nested_stop_out, nested_route_groups, _, nested_trip_groups = read_nested_partitions(self.stop_times_file, NETWORK_NAME,
+                                                                                                 no_of_partitions=NO_OF_PARTITION,
+                                                                                                 weighting_scheme=WEIGHING_SCHEME)
+            self.partitions[4] = (nested_stop_out, nested_route_groups, nested_trip_groups)
+            if os.path.exists(f'./Data/Transfer_Patterns/stp/{NETWORK_NAME}_{WEIGHING_SCHEME}_{NO_OF_PARTITION}.bin'):
+                self.partitions["stp"] = (read_cluster_info(NETWORK_NAME, NO_OF_PARTITION, WEIGHING_SCHEME),
+                                          load_stp_store(NETWORK_NAME, NO_OF_PARTITION, WEIGHING_SCHEME))
+
+    def parse_time(self, D_TIME):
+        """
+        Converts the departure time of a request to the time representation of the loaded timetable.
+
+        Args:
+            D_TIME (str/int): departure time. Format: YYYY-MM-DD HH:MM:SS. int means seconds since the service day.
+
+        Returns:
+            D_TIME (pandas.datetime or int)
+        """
+        if isinstance(D_TIME, int):
+            return D_TIME
+        D_TIME = pd.to_datetime(D_TIME)
+        if self.INT_TIMETABLE == 1:
+            return to_service_seconds(D_TIME, self.service_day)
+        return D_TIME
+
+    def query(self, algorithm: int, variant: int, SOURCE: int, DESTINATION, D_TIME=None, MAX_TRANSFER: int = None, WALKING_FROM_SOURCE: int = 1,
+              CHANGE_TIME_SEC: int = 0, OPTIMIZED: int = 0):
+        """
+        Answers a single query. Arguments have the same meaning as in query_file.py. Itineraries are never printed.
+
+        Args:
+            algorithm (int): algorithm type. See QueryEngine.
+            variant (int): variant of the algorithm. See QueryEngine.
+            SOURCE (int): stop id of source stop.
+            DESTINATION (int/list): stop id of destination stop. For One-To-Many variants, this is a list (None means all stops for CSA).
+            D_TIME (str/int): departure time. Not used by range variants. See QueryEngine.parse_time.
+            MAX_TRANSFER (int): maximum transfer limit. Defaults to the engine limit.
+            WALKING_FROM_SOURCE (int): 1 or 0. 1 indicates walking from SOURCE is allowed.
+            CHANGE_TIME_SEC (int): change-time in seconds.
+            OPTIMIZED (int): 1 or 0. 1 means collect trips and 0 means collect routes (range variants only).
+
+        Returns:
+            output of the selected algorithm
+
+        Examples:
+            >>> output = engine.query(1, 1, 36, 52)
+        """
+        PRINT_ITINERARY = 0
+        if MAX_TRANSFER is None:
+            MAX_TRANSFER = self.MAX_TRANSFER
+        if D_TIME is not None:
+            D_TIME = self.parse_time(D_TIME)
+        if algorithm in (0, 1) and variant in (3, 4):
+            try:
+                stop_out, route_groups, trip_groups = self.partitions[variant]
+            except KeyError:
+                raise ValueError("Partitions not loaded. Initialize QueryEngine with NO_OF_PARTITION")
+        if algorithm == 0:
+            if MAX_TRANSFER > self.MAX_TRANSFER:
+                raise ValueError(f"MAX_TRANSFER larger than the engine limit ({self.MAX_TRANSFER})")
+            if variant == 0:
+                return raptor(SOURCE, DESTINATION, D_TIME, MAX_TRANSFER, WALKING_FROM_SOURCE, CHANGE_TIME_SEC, PRINT_ITINERARY, self.routes_by_stop_dict,
+                              self.stops_dict, self.stoptimes_dict, self.footpath_dict, self.idx_by_route_stop_dict, self.departures_dict, self.workspace)
+            elif variant == 1:
+                return rraptor(SOURCE, DESTINATION, self.d_time_groups, MAX_TRANSFER, WALKING_FROM_SOURCE, CHANGE_TIME_SEC, PRINT_ITINERARY, OPTIMIZED,
+                               self.routes_by_stop_dict, self.stops_dict, self.stoptimes_dict, self.footpath_dict, self.idx_by_route_stop_dict,
+                               self.departures_dict, self.workspace)
+            elif variant in (3, 4):
+                return hypraptor(SOURCE, DESTINATION, D_TIME, MAX_TRANSFER, WALKING_FROM_SOURCE, CHANGE_TIME_SEC, PRINT_ITINERARY, stop_out, route_groups,
+                                 self.routes_by_stop_dict, self.stops_dict, self.stoptimes_dict, self.footpath_dict, self.idx_by_route_stop_dict,
+                                 self.departures_dict)
+        elif algorithm == 1:
+            if self.trip_transfer_dict is None:
+                raise ValueError("TBTR preprocessing missing")
+            if variant == 0:
+                return tbtr(SOURCE, DESTINATION, D_TIME, MAX_TRANSFER, WALKING_FROM_SOURCE, PRINT_ITINERARY, self.routes_by_stop_dict, self.stops_dict,
+                            self.stoptimes_dict, self.footpath_dict, self.idx_by_route_stop_dict, self.trip_transfer_dict, self.trip_set, self.trip_offsets)
+            elif variant == 1:
+                return rtbtr(SOURCE, DESTINATION, self.d_time_groups, MAX_TRANSFER, WALKING_FROM_SOURCE, PRINT_ITINERARY, OPTIMIZED,
+                             self.routes_by_stop_dict, self.stops_dict, self.stoptimes_dict, self.footpath_dict, self.idx_by_route_stop_dict,
+                             self.trip_transfer_dict, self.trip_set, self.trip_offsets)
+            elif variant == 2:
+                return onetomany_rtbtr(SOURCE, DESTINATION, self.d_time_groups, MAX_TRANSFER, WALKING_FROM_SOURCE, PRINT_ITINERARY, OPTIMIZED,
+                                       self.routes_by_stop_dict, self.stops_dict, self.stoptimes_dict, self.footpath_dict, self.idx_by_route_stop_dict,
+                                       self.trip_transfer_dict, self.trip_set, self.trip_offsets)
+            elif variant in (3, 4):
+                return hyptbtr(SOURCE, DESTINATION, D_TIME, MAX_TRANSFER, WALKING_FROM_SOURCE, PRINT_ITINERARY, stop_out, trip_groups,
+                               self.routes_by_stop_dict, self.stops_dict, self.stoptimes_dict, self.footpath_dict, self.idx_by_route_stop_dict,
+                               self.trip_transfer_dict, self.trip_set, self.trip_offsets)
+        elif algorithm == 2 and variant == 0:
+            return std_tp(SOURCE, DESTINATION, D_TIME, self.footpath_dict, self.NETWORK_NAME, self.routesindx_by_stop_dict, self.stoptimes_dict,
+                          self.HUB_COUNT, self.hubstops, self.direct_connection_table, self.tp_store, self.HUB_METHOD)
+        elif algorithm == 2 and variant == 3:
+            if "stp" not in self.partitions:
+                raise ValueError("Scalable Transfer Patterns not loaded. Initialize QueryEngine with NO_OF_PARTITION")
+            cluster_info, stp_store = self.partitions["stp"]
+            return std_stp(SOURCE, DESTINATION, D_TIME, self.footpath_dict, self.NETWORK_NAME, self.routesindx_by_stop_dict, self.stoptimes_dict,
+                           cluster_info, self.direct_connection_table, stp_store)
+        elif algorithm == 3 and variant == 1:
+            if self.connection_array is None:
+                raise ValueError("Profile CSA needs INT_TIMETABLE=1 and CSA preprocessing")
+            return profile_csa(DESTINATION, self.connection_array, self.footpath_dict, MAX_TRANSFER, D_TIME or 0).get(SOURCE, [])
+        elif algorithm == 3 and variant == 2:
+            if self.connection_array is None:
+                raise ValueError("One-To-Many CSA needs INT_TIMETABLE=1 and CSA preprocessing")
+            stop_label = onetomany_csa(SOURCE, DESTINATION, D_TIME, self.connection_array, WALKING_FROM_SOURCE, self.footpath_dict, self.stop_count)
+            if DESTINATION is None:
+                return stop_label.tolist()
+            return {desti: stop_label[desti].item() for desti in DESTINATION}
+        elif algorithm == 3 and variant == 0:
+            if self.connection_array is not None:
+                return array_csa(SOURCE, DESTINATION, D_TIME, self.connection_array, WALKING_FROM_SOURCE, self.footpath_dict, PRINT_ITINERARY,
+                                 self.stop_count)
+            if self.connections_list is None:
+                raise ValueError("CSA preprocessing not loaded")
+            return std_csa(SOURCE, DESTINATION, D_TIME, self.connections_list, WALKING_FROM_SOURCE, self.footpath_dict, PRINT_ITINERARY)
+        elif algorithm == 4 and variant == 0:
+            if self.G is None:
+                raise ValueError("Time expanded graph not loaded")
+            return custom_dij(SOURCE, DESTINATION, D_TIME, self.G, self.stop_events)
+        raise ValueError(f"Unsupported algorithm/variant: {algorithm}/{variant}")
+
+    def query_request(self, request: dict) -> dict:
+        """
+        Answers a query given as a dict (one line of a batch file or the body of an HTTP request). Errors are returned
+        in the response instead of being raised so that one bad request does not stop a batch.
+
+        Args:
+            request (dict): Format {"algorithm": 0, "variant": 0, "source": 36, "destination": 52, "time": "2022-06-30 05:41:00"}.
+                Optional keys: "max_transfer", "walking_from_source", "change_time_sec", "optimized", "request_id".
+
+        Returns:
+            response (dict): Format {"request_id": .., "output": ..} or {"request_id": .., "error": ..}
+        """
+        response = {"request_id": request.get("request_id")}
+        try:
+            response["output"] = self.query(int(request["algorithm"]), int(request.get("variant", 0)), request["source"], request["destination"],
+                                            request.get("time"), request.get("max_transfer"), int(request.get("walking_from_source", 1)),
+                                            int(request.get("change_time_sec", 0)), int(request.get("optimized", 0)))
+        except Exception as error:
+            response["error"] = f"{type(error).__name__}: {error}"
+        return response
+
+    def query_batch(self, request_list: list) -> list:
+        """
+        Answers a list of queries in order.
+
+        Args:
+            request_list (list): list of request dicts. See QueryEngine.query_request.
+
+        Returns:
+            list of response dicts.
+
+        Examples:
+            >>> responses = engine.query_batch([{"algorithm": 0, "variant": 0, "source": 36, "destination": 52, "time": "2022-06-30 05:41:00"}])
+        """
+        return [self.query_request(request) for request in request_list]
+
+
+def to_json(value):
+    """
+    json.dumps hook for values returned by the algorithms (pandas.datetime, numpy integers, sets).
+    """
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def to_service_time(value, service_day):
+    """
+    Converts the times of an algorithm output (pandas.datetime and pandas.timedelta, also inside lists, tuples, sets and dicts) to
+    integer seconds since service_day. Seconds are rounded up, as footpaths are in the integer timetable (see
+    gtfs_loader.build_int_footpath_dict). Used to compare outputs of the pandas and the integer timetable.
+
+    Args:
+        value: output of an algorithm.
+        service_day (pandas.datetime): midnight of the service day.
+
+    Returns:
+        value with int in place of times.
+    """
+    if isinstance(value, pd.Timestamp):
+        return math.ceil((value - service_day).total_seconds())
+    if isinstance(value, pd.Timedelta):
+        return math.ceil(value.total_seconds())
+    if isinstance(value, dict):
+        return {key: to_service_time(item, service_day) for key, item in value.items()}
+    if isinstance(value, set):
+        return sorted((to_service_time(item, service_day) for item in value), key=str)
+    if isinstance(value, (list, tuple)):
+        return [to_service_time(item, service_day) for item in value]
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def sample_requests(engine: QueryEngine, algorithm: int, variant: int, QUERY_COUNT: int, seed: int = 0) -> list:
+    """
+    Random requests for consistency checks. Source and destination are distinct stops and the departure time is a departure at
+    the source (from stop_times.txt).
+
+    Args:
+        engine (QueryEngine): loaded query engine.
+        algorithm (int): algorithm type. See QueryEngine.
+        variant (int): variant of the algorithm. See QueryEngine.
+        QUERY_COUNT (int): number of requests.
+        seed (int): seed of the random generator. Same seed gives the same requests.
+
+    Returns:
+        request_list (list): list of request dicts. See QueryEngine.query_request.
+
+    Examples:
+        >>> request_list = sample_requests(engine, 0, 0, 200)
+    """
+    rng = Random(seed)
+    stop_list = sorted(engine.routes_by_stop_dict.keys())
+    request_list = []
+    for request_id in range(QUERY_COUNT):
+        SOURCE, DESTINATION = rng.sample(stop_list, 2)
+        D_TIME = rng.choice(engine.d_time_groups.get_group(SOURCE)["arrival_time"].tolist())
+        request_list.append({"algorithm": algorithm, "variant": variant, "source": SOURCE, "destination": DESTINATION,
+                             "time": D_TIME if isinstance(D_TIME, int) else str(D_TIME), "request_id": request_id})
+    return request_list
+
+
+def check_int_timetable(NETWORK_NAME: str, QUERY_COUNT: int = 200, algorithms: tuple = ((0, 0), (0, 1), (3, 0)), seed: int = 0) -> list:
+    """
+    Consistency check of the integer-seconds timetable (INT_TIMETABLE=1). QUERY_COUNT random requests (see sample_requests) of every
+    (algorithm, variant) in algorithms are answered with the pandas and the integer timetable. Outputs must be equal once pandas
+    times are converted with to_service_time. The integer timetable is always checked without the network snapshot (dicts built
+    from the pickles) and, if the snapshot exists, also with it.
+
+    Args:
+        NETWORK_NAME (str): name of the network
+        QUERY_COUNT (int): number of requests per (algorithm, variant).
+        algorithms (tuple): (algorithm, variant) pairs to check. See QueryEngine.
+        seed (int): seed of the random generator.
+
+    Returns:
+        mismatches (list): list of tuples of format: (request, pandas response, integer response)
+
+    Examples:
+        >>> mismatches = check_int_timetable('anaheim', 200)
+    """
+    pandas_engine = QueryEngine(NETWORK_NAME)
+    int_engines = {"without snapshot": QueryEngine(NETWORK_NAME, INT_TIMETABLE=1, USE_SNAPSHOT=0)}
+    if os.path.exists(f'./dict_builder/{NETWORK_NAME}/network_snapshot.bin'):
+        int_engines["with snapshot"] = QueryEngine(NETWORK_NAME, INT_TIMETABLE=1)
+    mismatches = []
+    for algorithm, variant in algorithms:
+        request_list = sample_requests(pandas_engine, algorithm, variant, QUERY_COUNT, seed)
+        pandas_responses = [pandas_engine.query_request(request) for request in request_list]
+        for name, int_engine in int_engines.items():
+            failed, errors = 0, sum("error" in response for response in pandas_responses)
+            for request, pandas_response in zip(request_list, pandas_responses):
+                int_response = int_engine.query_request(request)
+                errors = errors + ("error" in int_response)
+                if to_service_time(pandas_response, int_engine.service_day) != to_service_time(int_response, int_engine.service_day):
+                    mismatches.append((request, pandas_response, int_response))
+                    failed = failed + 1
+            print(f"Algorithm {algorithm}/{variant} ({name}): {len(request_list) - failed}/{len(request_list)} outputs match "
+                  f"({errors} error responses)")
+    return mismatches
+
+
+def check_onetomany_csa(NETWORK_NAME: str, QUERY_COUNT: int = 200, seed: int = 0) -> list:
+    """
+    Consistency check of One-To-Many and One-To-All CSA (algorithm 3, variant 2). For QUERY_COUNT random requests (see
+    sample_requests), the label of the destination must equal the arrival time of CSA (algorithm 3, variant 0), both with the
+    destination as the only target and without targets. Runs on the integer timetable without the network snapshot.
+
+    Args:
+        NETWORK_NAME (str): name of the network
+        QUERY_COUNT (int): number of requests.
+        seed (int): seed of the random generator.
+
+    Returns:
+        mismatches (list): list of tuples of format: (request, CSA response, One-To-Many response, One-To-All response)
+
+    Examples:
+        >>> mismatches = check_onetomany_csa('anaheim', 200)
+    """
+    engine = QueryEngine(NETWORK_NAME, INT_TIMETABLE=1, USE_SNAPSHOT=0)
+    mismatches = []
+    for request in sample_requests(engine, 3, 0, QUERY_COUNT, seed):
+        DESTINATION = request["destination"]
+        csa_response = engine.query_request(request)
+        onetomany_response = engine.query_request({**request, "variant": 2, "destination": [DESTINATION]})
+        onetoall_response = engine.query_request({**request, "variant": 2, "destination": None})
+        responses = (csa_response, onetomany_response, onetoall_response)
+        if any("error" in response for response in responses):
+            mismatches.append((request, *responses))
+            continue
+        labels = (onetomany_response["output"][DESTINATION], onetoall_response["output"][DESTINATION])
+        if any((None if label >= INF_SECONDS else label) != csa_response["output"] for label in labels):
+            mismatches.append((request, *responses))
+    print(f"One-To-Many CSA: {QUERY_COUNT - len(mismatches)}/{QUERY_COUNT} outputs match CSA")
+    return mismatches
+
+
+def read_batch(path: str) -> list:
+    """
+    Reads a jsonl file with one request per line. Blank lines are skipped.
+
+    Args:
+        path (str): path of the jsonl file.
+
+    Returns:
+        request_list (list): list of request dicts.
+    """
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def run_batch(engine: QueryEngine, input_path: str, output_path: str) -> None:
+    """
+    Answers all requests in a jsonl file and saves the responses (one per line, same order) to output_path.
+
+    Args:
+        engine (QueryEngine): loaded query engine.
+        input_path (str): path of the jsonl file with requests.
+        output_path (str): path of the jsonl file with responses.
+
+    Returns:
+        None
+
+    Examples:
+        >>> run_batch(engine, './queries.jsonl', './responses.jsonl')
+    """
+    responses = engine.query_batch(read_batch(input_path))
+    with open(output_path, "w") as file:
+        for response in responses:
+            file.write(json.dumps(response, default=to_json) + "\n")
+    return None
+
+
+_engine = None
+
+
+def _run_request(request: dict) -> tuple:
+    """
+    Worker function for run_parallel_batch. Uses the engine inherited from the parent process.
+
+    Args:
+        request (dict): request dict. See QueryEngine.query_request.
+
+    Returns:
+        response (dict), worker pid (int), time taken in seconds (float)
+    """
+    start_time = time()
+    response = _engine.query_request(request)
+    return response, os.getpid(), time() - start_time
+
+
+def run_parallel_batch(engine: QueryEngine, request_list: list, output_path: str, CORES: int, chunksize: int = 64) -> dict:
+    """
+    Answers a list of requests on CORES worker processes. Workers are forked after the engine is loaded so that the read-only
+    timetable structures are shared copy-on-write instead of being pickled to (or reloaded by) every worker. Responses are
+    streamed to output_path (jsonl) in the same order as request_list.
+
+    Args:
+        engine (QueryEngine): loaded query engine.
+        request_list (list): list of request dicts. See QueryEngine.query_request.
+        output_path (str): path of the jsonl file with responses.
+        CORES (int): number of worker processes.
+        chunksize (int): number of requests sent to a worker at once.
+
+    Returns:
+        worker_stats (dict): Format {worker pid: (queries answered, busy time in seconds, queries per second)}
+
+    Warnings:
+        Requires the fork start method (Linux, macOS with fork).
+
+    Examples:
+        >>> worker_stats = run_parallel_batch(engine, read_batch('./queries.jsonl'), './responses.jsonl', 8)
+    """
+    global _engine
+    _engine = engine
+    worker_count, worker_time = {}, {}
+    start_time = time()
+    with multiprocessing.get_context("fork").Pool(CORES) as pool, open(output_path, "w") as file:
+        for response, pid, elapsed in pool.imap(_run_request, request_list, chunksize=chunksize):
+            file.write(json.dumps(response, default=to_json) + "\n")
+            worker_count[pid] = worker_count.get(pid, 0) + 1
+            worker_time[pid] = worker_time.get(pid, 0) + elapsed
+    runtime = time() - start_time
+    _engine = None
+    worker_stats = {pid: (count, round(worker_time[pid], 2), round(count / worker_time[pid], 2) if worker_time[pid] > 0 else None)
+                    for pid, count in worker_count.items()}
+    print(f"Queries answered: {len(request_list)} in {round(runtime, 2)} seconds ({round(len(request_list) / runtime, 2) if runtime > 0 else None} queries/sec)")
+    for pid, (count, busy_time, throughput) in worker_stats.items():
+        print(f"Worker {pid}: {count} queries, busy {busy_time} seconds, {throughput} queries/sec")
+    return worker_stats
+
+
+def serve(engine: QueryEngine, host: str = "127.0.0.1", port: int = 8000) -> None:
+    """
+    Starts a local HTTP/JSON server. POST /query with a request dict (or a list of request dicts) returns the response(s).
+    GET /health returns the network name. Requests are handled one at a time since the engine (and its workspace) is shared.
+
+    Args:
+        engine (QueryEngine): loaded query engine.
+        host (str): host address.
+        port (int): port number.
+
+    Returns:
+        None
+
+    Examples:
+        >>> serve(engine, "127.0.0.1", 8000)
+        $ curl -X POST localhost:8000/query -d '{"algorithm": 0, "variant": 0, "source": 36, "destination": 52, "time": "2022-06-30 05:41:00"}'
+    """
+
+    class QueryHandler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, body) -> None:
+            payload = json.dumps(body, default=to_json).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._reply(200, {"network": engine.NETWORK_NAME})
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/query":
+                self._reply(404, {"error": "not found"})
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            except ValueError as error:
+                self._reply(400, {"error": f"invalid json: {error}"})
+                return
+            if isinstance(request, list):
+                self._reply(200, engine.query_batch(request))
+            else:
+                self._reply(200, engine.query_request(request))
+
+    with HTTPServer((host, port), QueryHandler) as server:
+        print(f"Serving {engine.NETWORK_NAME} on http://{host}:{port}")
+        server.serve_forever()
+    return None
+
+
+if __name__ == "__main__":
+    print_logo()
+    NETWORK_NAME = input("Enter Network name in small case. Example: anaheim\n: ")
+    INT_TIMETABLE = int(input("Press 1 to use integer-seconds timetable (RAPTOR and TBTR only). Else press 0. Example: 0\n: "))
+    engine = QueryEngine(NETWORK_NAME, INT_TIMETABLE)
+    print_network_details(engine.transfers_file, engine.trips_file, engine.stops_file)
+    MODE = int(input("Press 1 to start HTTP server. Press 2 to answer a batch (jsonl) file. Press 3 to answer a batch file in parallel\n"
+                     "Press 4 to check the integer timetable against the pandas timetable on random queries\n: "))
+    if MODE == 4:
+        QUERY_COUNT = int(input("Enter number of random queries per algorithm. Example: 200\n: "))
+        mismatches = check_int_timetable(NETWORK_NAME, QUERY_COUNT)
+        for request, pandas_response, int_response in mismatches[:10]:
+            print(f"Request {request}: pandas {pandas_response}, integer {int_response}")
+        for request, *responses in check_onetomany_csa(NETWORK_NAME, QUERY_COUNT)[:10]:
+            print(f"Request {request}: CSA, One-To-Many, One-To-All {responses}")
+    elif MODE == 1:
+        port = int(input("Enter port. Example: 8000\n: "))
+        serve(engine, port=port)
+    else:
+        input_path = input("Enter path of the request file. Example: ./queries.jsonl\n: ")
+        output_path = input("Enter path of the response file. Example: ./responses.jsonl\n: ")
+        if MODE == 3:
+            CORES = int(input(f"Enter number of CORES (>=1). \nAvailable CORES (logical and physical):  {multiprocessing.cpu_count()}\n: "))
+            run_parallel_batch(engine, read_batch(input_path), output_path, CORES)
+        else:
+            run_batch(engine, input_path, output_path)